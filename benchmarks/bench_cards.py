@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Card benchmark: rendering product cards and rating summaries from the stored summary vs from the ratings.
+
+Renders pages of product cards with an empty card cache, and the rating
+summary (average, count, star histogram) of each product on them, counting
+the queries of each. The stored summary path must not touch the ratings
+table at all; the benchmark exits with status 1 if it does. For contrast the
+same summaries are also computed from ProductRating, one aggregate per card.
+
+Runs against a throwaway test database, never the project database.
+
+    python benchmarks/bench_cards.py --products 20000 --pages 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #Makes the project importable
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'revforge.settings') #Sets Django settings module
+
+import django
+django.setup()
+
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test.utils import CaptureQueriesContext
+from fixture import bench_database, grow_catalog
+from products.card_cache import card_cache, render_card
+from products.models import Product, ProductRating
+
+PER_PAGE = 12 #Products per page, as in the views
+RATING_TABLE = ProductRating._meta.db_table
+
+
+def pages(count):
+    """The first pages of the rating sort, where the rated products are"""
+    ids = list(Product.objects.filter(is_active=True).order_by('-rating_avg', 'id').values_list('id', flat=True)[:count * PER_PAGE])
+    return [ids[start:start + PER_PAGE] for start in range(0, len(ids), PER_PAGE)]
+
+
+def stored(page):
+    # What the views do: one query for the page, the summary read from its columns
+    products = list(Product.objects.filter(id__in=page).for_cards())
+    for product in products:
+        render_card(product)
+    detail = Product.objects.get(pk=page[0])
+    return detail.rating_summary
+
+
+def from_ratings(page):
+    # Summaries computed from the ratings, as a card without stored columns would need
+    products = list(Product.objects.filter(id__in=page).for_cards())
+    for product in products:
+        product.ratings.aggregate(average=Avg('rating'), count=Count('id'))
+        dict(product.ratings.values_list('rating').annotate(count=Count('id')).order_by())
+
+
+def measure(function, page_ids, repeat):
+    """Median milliseconds per page, and the queries of one pass: (total, touching the ratings table)"""
+    timings = []
+    for _ in range(repeat):
+        card_cache().clear() #Cold cards every time
+        started = time.perf_counter()
+        for page in page_ids:
+            function(page)
+        timings.append((time.perf_counter() - started) * 1000 / len(page_ids))
+    card_cache().clear()
+    with CaptureQueriesContext(connection) as queries:
+        for page in page_ids:
+            function(page)
+    rating_queries = sum(RATING_TABLE in query['sql'] for query in queries.captured_queries)
+    return statistics.median(timings), len(queries.captured_queries), rating_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000, help='Catalog size')
+    parser.add_argument('--pages', type=int, default=20, help='Pages of cards rendered per pass')
+    parser.add_argument('--repeat', type=int, default=5, help='Passes per measurement')
+    args = parser.parse_args()
+
+    with bench_database():
+        grow_catalog(args.products)
+        page_ids = pages(args.pages)
+        results = {
+            'stored summary': measure(stored, page_ids, args.repeat),
+            'from ratings': measure(from_ratings, page_ids, args.repeat),
+        }
+
+    print(f'{len(page_ids)} pages of {PER_PAGE} cards, card cache cleared before each pass')
+    print(f"{'path':<16} {'per page':>10} {'queries':>8} {'rating queries':>15}")
+    for name, (ms, total, rating_queries) in results.items():
+        print(f'{name:<16} {ms:>8.2f}ms {total:>8} {rating_queries:>15}')
+    if results['stored summary'][2]:
+        print('FAIL: rendering cards from the stored summary queried the ratings table')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Index benchmark: query plans and timings of the listing access paths, with and without the listing indexes.
+
+Seeds a throwaway database (see fixture.py), then runs each access path the
+views use twice: once with the indexes from products 0022 and 0023, orders
+0006 and users 0009 dropped, once with them in place. Prints the EXPLAIN QUERY PLAN
+of each, so a SCAN turning into a SEARCH ... USING INDEX shows directly.
+
+    python benchmarks/bench_indexes.py --products 50000
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #Makes the project importable
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'revforge.settings') #Sets Django settings module
+
+import django
+django.setup()
+
+from django.db import connection
+from django.db.models import Count
+from fixture import bench_database, grow_catalog
+from orders.models import Order
+from products.models import Brand, Category, Product, SubCategory
+from users.models import RecentlyViewed, Wishlist
+
+INDEXES = { #Indexes under test, by model
+    Product: [
+        'product_active_category_idx', 'product_active_subcat_idx', 'product_active_brand_idx',
+        'product_featured_idx', 'product_bestseller_idx', 'product_active_price_idx',
+    ],
+    Order: ['order_user_created_idx'],
+    Wishlist: ['wishlist_user_added_idx'],
+    RecentlyViewed: ['viewed_user_viewed_idx'],
+}
+PAGE = 13 #The keyset paginator reads one row past the page
+
+
+def access_paths():
+    """Querysets shaped like the ones the views run, against the busiest rows"""
+    category = Category.objects.annotate(products_count=Count('products')).order_by('-products_count').first()
+    subcategory = SubCategory.objects.annotate(products_count=Count('products')).order_by('-products_count').first()
+    brand = Brand.objects.annotate(products_count=Count('products')).order_by('-products_count').first()
+    buyer = Order.objects.values('user').annotate(orders=Count('id')).order_by('-orders').first()['user']
+    wisher = Wishlist.objects.values('user').annotate(items=Count('id')).order_by('-items').first()['user']
+    active = Product.objects.filter(is_active=True).for_cards()
+    return {
+        'category page': active.filter(category=category).order_by('name', 'id')[:PAGE],
+        'subcategory page': active.filter(subcategory=subcategory).order_by('name', 'id')[:PAGE],
+        'brand page': active.filter(brand=brand).order_by('name', 'id')[:PAGE],
+        'price order': active.order_by('effective_price', 'id')[:PAGE],
+        'price range': active.filter(effective_price__range=(100, 200)).order_by('effective_price', 'id')[:PAGE],
+        'home featured': active.filter(is_featured=True)[:6],
+        'home bestsellers': active.filter(is_bestseller=True)[:6],
+        'order history': Order.objects.filter(user_id=buyer)[:20],
+        'wishlist': Wishlist.objects.filter(user_id=wisher)[:20],
+        'recently viewed': RecentlyViewed.objects.filter(user_id=wisher)[:6],
+    }
+
+
+def set_indexes(present):
+    """Create or drop the indexes under test"""
+    with connection.schema_editor() as editor:
+        for model, names in INDEXES.items():
+            existing = connection.introspection.get_constraints(connection.cursor(), model._meta.db_table)
+            for index in model._meta.indexes:
+                if index.name not in names:
+                    continue
+                if present and index.name not in existing:
+                    editor.add_index(model, index)
+                elif not present and index.name in existing:
+                    editor.remove_index(model, index)
+    if connection.vendor == 'sqlite':
+        connection.cursor().execute('ANALYZE') #Fresh statistics for the planner
+
+
+def measure(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset._chain()) #A fresh clone, so the result cache is not reused
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def plan(queryset):
+    # SQLite prefixes each plan line with its node ids
+    return [re.sub(r'^\d+ \d+ \d+ ', '', line.strip()) for line in queryset.explain().splitlines()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=50000, help='Catalog size')
+    parser.add_argument('--repeat', type=int, default=15, help='Runs per measurement')
+    args = parser.parse_args()
+
+    with bench_database():
+        grow_catalog(args.products)
+        paths = access_paths()
+        results = {}
+        for present in (False, True):
+            set_indexes(present)
+            for name, queryset in paths.items():
+                results[name, present] = (measure(queryset, args.repeat), plan(queryset))
+
+        print(f"{'access path':<18} {'without':>10} {'with':>10} {'speedup':>8}")
+        for name in paths:
+            without, with_index = results[name, False][0], results[name, True][0]
+            print(f'{name:<18} {without:>8.2f}ms {with_index:>8.2f}ms {without / with_index:>7.1f}x')
+        for name in paths:
+            print(f'\n{name}')
+            for label, present in (('without', False), ('with', True)):
+                for line in results[name, present][1]:
+                    print(f'  {label:<8} {line}')
+
+
+if __name__ == '__main__':
+    main()
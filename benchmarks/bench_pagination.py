@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Pagination benchmark: OFFSET pages vs keyset (cursor) pages, shallow and deep.
+
+Runs against a throwaway test database, never the project database.
+
+    python benchmarks/bench_pagination.py --products 60000 --pages 1 100 1000 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #Makes the project importable
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'revforge.settings') #Sets Django settings module
+
+import django
+django.setup()
+
+from django.core.paginator import Paginator
+from fixture import bench_database, grow_catalog
+from products.models import Product
+from products.pagination import KeysetPaginator
+from products.views import sort_products
+
+PER_PAGE = 12 #Products per page, as in the views
+
+
+def offset_page(products, keys, number):
+    # What the views did before: COUNT(*) plus LIMIT/OFFSET
+    paginator = Paginator(products.order_by(*[('-' if d else '') + f for f, d in keys]), PER_PAGE)
+    return list(paginator.get_page(number))
+
+
+def keyset_page(products, keys, cursor):
+    # What the views do now when following a next link
+    return list(KeysetPaginator(products, PER_PAGE, keys).get_page(cursor))
+
+
+def cursor_for(products, keys, number):
+    # The next link of the page before the requested one
+    return KeysetPaginator(products, PER_PAGE, keys).get_page(number=number - 1).next_cursor if number > 1 else None
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=60000, help='Catalog size')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 1000, 5000], help='Page numbers to fetch')
+    parser.add_argument('--sorts', nargs='+', default=['name', 'newest', 'Rating', 'price'], help='sort_by values to benchmark')
+    parser.add_argument('--repeat', type=int, default=7, help='Fetches per measurement')
+    args = parser.parse_args()
+
+    with bench_database():
+        grow_catalog(args.products)
+        products = Product.objects.filter(is_active=True)
+        print(f"{'sort':>8} {'page':>6} {'offset':>10} {'keyset':>10} {'speedup':>8}")
+        for sort_by in args.sorts:
+            sorted_products, keys = sort_products(products, sort_by, 'asc')
+            for number in args.pages:
+                cursor = cursor_for(sorted_products, keys, number)
+                offset_ms = measure(lambda: offset_page(sorted_products, keys, number), args.repeat)
+                keyset_ms = measure(lambda: keyset_page(sorted_products, keys, cursor), args.repeat)
+                print(f'{sort_by:>8} {number:>6} {offset_ms:>8.2f}ms {keyset_ms:>8.2f}ms {offset_ms / keyset_ms:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
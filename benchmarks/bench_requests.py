@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Request benchmark: every storefront route, end to end through the test Client.
+
+Drives each route of products/urls.py, orders/urls.py and users/urls.py
+against a seeded throwaway database (see fixture.py) and records, per
+route, p50/p95 latency, queries per request, SQL time, template render
+time (without the SQL run from templates) and response bytes. Results are
+written as JSON with stable key order, so two runs can be diffed, or
+compared with --compare, which exits non-zero on a regression:
+
+    python benchmarks/bench_requests.py --products 20000 --output before.json
+    python benchmarks/bench_requests.py --products 20000 --output after.json --compare before.json
+
+Requests that write (POSTs and the GET links that change a wishlist or
+remove a saved cart line) run inside a transaction that is rolled back,
+and with the client's cookies restored, so every repeat sees the same data
+and the same guest cart; the SAVEPOINTs of their own atomic blocks show up
+in their query counts.
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #Makes the project importable
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'revforge.settings') #Sets Django settings module
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count
+from django.template import base as template_base
+from django.http import HttpResponse
+from django.test import Client, override_settings
+from django.urls import get_resolver, resolve, reverse
+from fixture import bench_database, grow_catalog
+from orders.guest_cart import GuestCart
+from orders.models import Cart, CartItem, Order, PaymentMethod, ShippingMethod
+from products.models import Product
+from products.seed import PASSWORD
+
+APPS = ('products', 'orders', 'users') #URL namespaces that must all be covered
+
+# One request to benchmark; key is the route name, plus a label for extra variants of a route
+Scenario = namedtuple('Scenario', ['key', 'route', 'args', 'method', 'query', 'data', 'user', 'writes', 'ajax'])
+
+
+def scenario(key, args=(), method='GET', query=None, data=None, user='anonymous', writes=False, ajax=False):
+    return Scenario(key, key.split('?')[0], args, method, query or {}, data, user, writes or method == 'POST', ajax)
+
+
+class Probe:
+    """Times the SQL and template rendering of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.sql_in_templates = 0.0
+        self.templates = 0.0
+        self.depth = 0 #Nesting of Template.render calls; only the outermost one is timed
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql += elapsed
+            if self.depth:
+                self.sql_in_templates += elapsed #Lazy querysets evaluated while rendering
+
+    def render(self, render, template, context):
+        self.depth += 1
+        started = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            self.depth -= 1
+            if not self.depth:
+                self.templates += time.perf_counter() - started
+
+
+class Recorder:
+    """Installs a Probe on the connection and on Template.render for each request"""
+
+    def __init__(self):
+        self.probe = None
+        self.original_render = template_base.Template.render
+        recorder = self
+
+        def render(template, context):
+            if recorder.probe is None:
+                return recorder.original_render(template, context)
+            return recorder.probe.render(recorder.original_render, template, context)
+        template_base.Template.render = render
+
+    def close(self):
+        template_base.Template.render = self.original_render
+
+    def request(self, client, path, scenario):
+        self.probe = probe = Probe()
+        send = client.post if scenario.method == 'POST' else client.get
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if scenario.ajax else {}
+        if scenario.data is not None and scenario.data.get('json') is not None:
+            request = lambda: send(path, json.dumps(scenario.data['json']), content_type='application/json', **headers)
+        else:
+            request = lambda: send(path, scenario.data or scenario.query, **headers)
+        try:
+            with connection.execute_wrapper(probe):
+                started = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - started
+        finally:
+            self.probe = None
+        size = len(b''.join(response.streaming_content) if response.streaming else response.content)
+        return response.status_code, elapsed, probe, size
+
+
+def bench_fixture():
+    """The users, products and orders the scenarios point at"""
+    product = Product.objects.filter(is_active=True, stock_quantity__gt=5).order_by('-rating_count', 'pk').select_related('category', 'subcategory', 'brand').first()
+    buyer = User.objects.get(pk=(
+        Order.objects.filter(user__username__startswith='bench-user-', user__profile__is_vendor=False)
+        .values('user').annotate(orders=Count('id')).order_by('-orders', 'user').first()['user']
+    )) #The busiest buyer
+    vendor_product = Product.objects.filter(vendor__vendor_status='approved').select_related('vendor__user').order_by('pk').first()
+    vendor = vendor_product.vendor.user
+    order = Order.objects.filter(user=buyer).order_by('-created_at').first()
+    Order.objects.filter(pk=order.pk).update(order_status='pending') #Cancellable
+
+    # A cart the checkout can always be placed from
+    cart, _ = Cart.objects.get_or_create(user=buyer)
+    cart.items.all().delete()
+    for line in Product.objects.filter(is_active=True, stock_quantity__gt=5).exclude(pk=product.pk).order_by('pk')[:2]:
+        CartItem.objects.create(cart=cart, product=line, quantity=1)
+    payment, _ = PaymentMethod.objects.get_or_create(name='Card')
+    shipping, _ = ShippingMethod.objects.get_or_create(name='Standard', defaults={'cost': 10, 'estimated_days': 3})
+    return {
+        'product': product,
+        'buyer': buyer,
+        'vendor': vendor,
+        'vendor_product': vendor_product,
+        'order': order,
+        'cart_item': cart.items.order_by('pk').first(),
+        'guest_cart': guest_cart_cookies(cart.items.values_list('product_id', flat=True)),
+        'payment': payment,
+        'shipping': shipping,
+    }
+
+
+def guest_cart_cookies(product_ids):
+    """The signed cookie of a guest cart holding one of each product"""
+    cart = GuestCart()
+    cart.quantities = {product_id: 1 for product_id in product_ids}
+    response = HttpResponse()
+    cart.save(response)
+    return response.cookies
+
+
+def scenarios(fixture):
+    product = fixture['product']
+    vendor_product = fixture['vendor_product']
+    order_number = fixture['order'].order_number
+    cart_item = fixture['cart_item'].pk
+    guest_product = fixture['cart_item'].product_id #In the guest cart cookie too
+    shipping_details = {
+        'shipping_address': '1 Bench Street', 'shipping_city': 'Monza', 'shipping_state': 'MB',
+        'shipping_postal_code': '20900', 'shipping_country': 'Italy', 'shipping_phone': '+390000000000',
+    }
+    word = product.name.split()[0].lower()
+    return [
+        # products
+        scenario('products:home'),
+        scenario('products:product_list'),
+        scenario('products:product_list?category', query={'category': product.category.slug}),
+        scenario('products:product_list?price', query={'sort_by': 'price', 'sort_order': 'desc'}),
+        scenario('products:product_list?page-50', query={'page': 50}),
+        scenario('products:product_detail', args=[product.slug]),
+        scenario('products:product_detail?buyer', args=[product.slug], user='buyer'),
+        scenario('products:category_detail', args=[product.category.slug]),
+        scenario('products:subcategory_detail', args=[product.category.slug, product.subcategory.slug]),
+        scenario('products:brand_detail', args=[product.brand.slug]),
+        scenario('products:search', query={'q': word}),
+        scenario('products:search?phrase', query={'q': ' '.join(product.name.split()[:2]).lower()}),
+        scenario('products:about'),
+        scenario('products:contact'),
+        scenario('products:contact?post', method='POST', data={'name': 'Bench', 'email': 'bench@example.com', 'message': 'A benchmark message'}),
+        scenario('products:recently_viewed', method='POST', data={'json': {'viewed': [product.pk, vendor_product.pk]}}),
+        scenario('products:get_subcategories', query={'category': product.category.slug}),
+        scenario('products:autocomplete', query={'q': word[:3]}),
+        # orders
+        scenario('orders:cart', user='buyer'),
+        scenario('orders:cart?guest', user='guest'),
+        scenario('orders:add_to_cart', args=[product.pk], method='POST', user='buyer'),
+        scenario('orders:add_to_cart?guest', args=[product.pk], method='POST', user='guest'),
+        scenario('orders:remove_from_guest_cart', args=[guest_product], method='POST', user='guest'),
+        scenario('orders:update_guest_cart_item', args=[guest_product], method='POST', data={'quantity': 2}, user='guest', ajax=True),
+        scenario('orders:remove_from_cart', args=[cart_item], user='buyer', writes=True),
+        scenario('orders:update_cart_item', args=[cart_item], method='POST', data={'quantity': 2}, user='buyer', ajax=True),
+        scenario('orders:checkout', user='buyer'),
+        scenario('orders:checkout?post', method='POST', user='buyer', data={
+            'payment_method': fixture['payment'].pk, 'shipping_method': fixture['shipping'].pk, **shipping_details,
+        }),
+        scenario('orders:order_detail', args=[order_number], user='buyer'),
+        scenario('orders:order_history', user='buyer'),
+        scenario('orders:cancel_order', args=[order_number], user='buyer'),
+        scenario('orders:download_invoice', args=[order_number], user='buyer'),
+        scenario('orders:track_order', args=[order_number], user='buyer', ajax=True),
+        # users
+        scenario('users:register'),
+        scenario('users:register?post', method='POST', data={
+            'username': 'bench_new_user', 'email': 'new@example.com', 'first_name': 'Bench', 'last_name': 'User',
+            'password1': 'Sl0w-and-steady!', 'password2': 'Sl0w-and-steady!',
+        }),
+        scenario('users:login'),
+        scenario('users:login?post', method='POST', data={'username': fixture['buyer'].username, 'password': PASSWORD}),
+        scenario('users:logout', method='POST', user='buyer'),
+        scenario('users:profile', user='buyer'),
+        scenario('users:edit_profile', user='buyer'),
+        scenario('users:edit_profile?post', method='POST', data={'first_name': 'Bench', 'last_name': 'Buyer', 'email': 'buyer@example.com', 'phone_number': '390000000'}, user='buyer'),
+        scenario('users:change_password', user='buyer'),
+        scenario('users:change_password?post', method='POST', data={
+            'old_password': PASSWORD, 'new_password1': 'Sl0w-and-steady!', 'new_password2': 'Sl0w-and-steady!',
+        }, user='buyer'),
+        scenario('users:wishlist', user='buyer'),
+        scenario('users:add_to_wishlist', args=[product.pk], user='buyer', writes=True),
+        scenario('users:remove_from_wishlist', args=[product.pk], user='buyer', writes=True),
+        scenario('users:vendor_dashboard', user='vendor'),
+        scenario('users:vendor_product_create', user='vendor'),
+        scenario('users:vendor_product_edit', args=[vendor_product.pk], user='vendor'),
+        scenario('users:vendor_product_delete', args=[vendor_product.pk], user='vendor'),
+    ]
+
+
+def uncovered_routes(scenario_list):
+    """Names of routes in APPS that no scenario requests"""
+    routes = set()
+    for pattern in get_resolver().url_patterns:
+        namespace = getattr(pattern, 'namespace', None)
+        if namespace in APPS:
+            routes.update(f'{namespace}:{child.name}' for child in pattern.url_patterns if child.name)
+    return sorted(routes - {scenario.route for scenario in scenario_list})
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(recorder, client, scenario, warmup, repeat):
+    path = reverse(scenario.route, args=scenario.args)
+    samples = []
+    for run in range(warmup + repeat):
+        if scenario.writes:
+            cookies = copy.deepcopy(client.cookies) #A login or logout must not stick to the client
+            with transaction.atomic():
+                sample = recorder.request(client, path, scenario)
+                transaction.set_rollback(True)
+            client.cookies = cookies
+        else:
+            sample = recorder.request(client, path, scenario)
+        if run >= warmup:
+            samples.append(sample)
+
+    status, _, _, size = samples[-1]
+    latencies = [elapsed * 1000 for _, elapsed, _, _ in samples]
+    return {
+        'path': path,
+        'method': scenario.method,
+        'user': scenario.user,
+        'status': status,
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'queries': max(probe.queries for _, _, probe, _ in samples),
+        'query_budget': getattr(resolve(path).func, 'query_budget', None),
+        'sql_ms': round(statistics.median(probe.sql * 1000 for _, _, probe, _ in samples), 2),
+        'template_ms': round(statistics.median((probe.templates - probe.sql_in_templates) * 1000 for _, _, probe, _ in samples), 2),
+        'bytes': size,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, tolerance):
+    """Print the change of every route against a baseline run; returns the keys that regressed"""
+    regressions = []
+    print(f"\n{'route':<42} {'p50 before':>11} {'p50 after':>10} {'queries':>9} {'bytes':>14}")
+    for key, result in results['routes'].items():
+        before = baseline['routes'].get(key)
+        if before is None:
+            print(f'{key:<42} {"new":>11}')
+            continue
+        slower = result['p50_ms'] > before['p50_ms'] * (1 + tolerance) and result['p50_ms'] - before['p50_ms'] > 1
+        more_queries = result['queries'] > before['queries']
+        flag = ' <-' if slower or more_queries else ''
+        if flag:
+            regressions.append(key)
+        print(
+            f"{key:<42} {before['p50_ms']:>9.2f}ms {result['p50_ms']:>8.2f}ms "
+            f"{before['queries']:>4}->{result['queries']:<4} {before['bytes']:>7}->{result['bytes']:<6}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000, help='Catalog size to seed')
+    parser.add_argument('--repeat', type=int, default=20, help='Measured requests per route')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per route first (fills caches)')
+    parser.add_argument('--only', nargs='+', default=[], help='Benchmark only routes whose key starts with one of these')
+    parser.add_argument('--output', default='bench_requests.json', help="JSON results file ('-' for stdout)")
+    parser.add_argument('--compare', help='Earlier results file to compare with; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Slowdown of p50 counted as a regression (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    # Production-like settings: no debug toolbar work, no query budget checks (the tests enforce those)
+    with bench_database(), override_settings(DEBUG=False, QUERY_BUDGET_CHECKS=False, ALLOWED_HOSTS=['testserver']):
+        grow_catalog(args.products)
+        fixture = bench_fixture()
+        scenario_list = scenarios(fixture)
+        missing = uncovered_routes(scenario_list)
+        if missing:
+            sys.exit(f"No scenario for: {', '.join(missing)}")
+
+        clients = {'anonymous': Client(), 'guest': Client(), 'buyer': Client(), 'vendor': Client()}
+        clients['guest'].cookies.update(fixture['guest_cart']) #Logged out, with a cart in its cookie
+        clients['buyer'].force_login(fixture['buyer'])
+        clients['vendor'].force_login(fixture['vendor'])
+        recorder = Recorder()
+        routes = {}
+        try:
+            for scenario in scenario_list:
+                if args.only and not scenario.key.startswith(tuple(args.only)):
+                    continue
+                routes[scenario.key] = result = run_scenario(recorder, clients[scenario.user], scenario, args.warmup, args.repeat)
+                print(
+                    f"{scenario.key:<42} {result['status']:>3} {result['p50_ms']:>8.2f}ms {result['p95_ms']:>8.2f}ms "
+                    f"{result['queries']:>3}q {result['sql_ms']:>7.2f}ms sql {result['template_ms']:>7.2f}ms tpl {result['bytes']:>7}B",
+                    file=sys.stderr,
+                )
+        finally:
+            recorder.close()
+
+    results = {
+        'meta': {
+            'products': args.products,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'revision': git_revision(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': sys.version.split()[0],
+        },
+        'routes': routes,
+    }
+    text = json.dumps(results, indent=2, sort_keys=True) + '\n'
+    if args.output == '-':
+        sys.stdout.write(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(json.load(file), results, args.tolerance)
+        if regressions:
+            sys.exit(f"Regressed: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Search latency benchmark: original icontains ORM query vs the full-text index.
+
+Runs against a throwaway test database, never the project database.
+
+    python benchmarks/bench_search.py --sizes 10000 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #Makes the project importable
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'revforge.settings') #Sets Django settings module
+
+import django
+django.setup()
+
+from django.db.models import Q
+from products import search
+from fixture import bench_database, grow_catalog
+from products.models import Product
+
+QUERIES = ['carbon', 'titanium exhaust', 'brake', 'cool', 'forged clutch', '"racing spoiler"', 'brembo', 'inter']
+
+
+def orm_search(query):
+    # The query products.views.search ran before the full-text index
+    products = Product.objects.filter(is_active=True).filter(
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(brand__name__icontains=query) |
+        Q(category__name__icontains=query) |
+        Q(subcategory__name__icontains=query) |
+        Q(keywords__icontains=query)
+    ).distinct()
+    total = products.count() #Paginator count
+    page = list(products[:12]) #First page
+    return total, page
+
+
+def index_search(query):
+    # The ranked id lookup plus the single page fetch the view does now
+    ids = search.search_product_ids(query)
+    page = list(Product.objects.filter(id__in=ids[:12]))
+    return len(ids), page
+
+
+def measure(function, repeat):
+    # Median and p95 latency in milliseconds over all queries
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            started = time.perf_counter()
+            function(query)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Catalog sizes to benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of the query set per measurement')
+    args = parser.parse_args()
+
+    with bench_database():
+        if search.get_backend() is None:
+            sys.exit('No full-text index on this database (SQLite needs FTS5).')
+        print(f"{'products':>10} {'orm p50':>10} {'orm p95':>10} {'fts p50':>10} {'fts p95':>10} {'speedup':>8}")
+        for size in sorted(args.sizes):
+            grow_catalog(size)
+            orm_p50, orm_p95 = measure(orm_search, args.repeat)
+            fts_p50, fts_p95 = measure(index_search, args.repeat)
+            print(f'{size:>10} {orm_p50:>8.2f}ms {orm_p95:>8.2f}ms {fts_p50:>8.2f}ms {fts_p95:>8.2f}ms {orm_p50 / fts_p50:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""
+Shared data for the benchmarks: a throwaway test database filled by products.seed.
+
+Import after django.setup(). Every benchmark sees the same catalog for the
+same sizes, the one seed_bench builds.
+"""
+from contextlib import contextmanager
+from django.db import connection
+from products.models import Product
+from products.seed import seed
+
+
+@contextmanager
+def bench_database():
+    """Run the block against a throwaway test database, never the project database"""
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def grow_catalog(size, **counts):
+    """Seed benchmark data until the catalog holds size products; returns the seeder counts"""
+    missing = size - Product.objects.count()
+    if missing <= 0:
+        return {}
+    return seed(missing, seed=size, **counts) #Seeded by the target size, so each step is reproducible
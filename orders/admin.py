@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db.models import DecimalField, F, Sum
 from django.utils.html import format_html
+from decimal import Decimal
+from . import cart_summary
 from .models import Cart, CartItem, Order, OrderItem, OrderStatusHistory, ShippingMethod, PaymentMethod
 
 
@@ -12,6 +15,10 @@ class CartItemInline(admin.TabularInline):
     readonly_fields = ['added_at', 'updated_at'] #Excludes the fields from the admin interface
     fields = ['product', 'quantity', 'total_price', 'added_at'] #Includes the fields in the admin interface
 
+    def get_queryset(self, request):
+        """Load the products with the items, for their totals"""
+        return super().get_queryset(request).select_related('product') #Select the related fields
+
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin): 
@@ -24,14 +31,28 @@ class CartAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at'] #Excludes the fields from the admin interface
     inlines = [CartItemInline] #Includes the inline admin for cart items
 
+    def get_queryset(self, request):
+        """Annotate the totals of every listed cart in the list query itself"""
+        return super().get_queryset(request).select_related('user').annotate(
+            items_count=Sum('items__quantity'),
+            subtotal_amount=Sum(
+                F('items__quantity') * F('items__product__effective_price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        cart_summary.forget([form.instance.user_id]) #Inline deletes send no cart summary signal
+
     def total_items(self, obj): 
         """Display total items in cart"""
-        return obj.total_items #Returns the total items in the cart
+        return obj.items_count or 0 #Returns the total items in the cart
     total_items.short_description = 'Items' #Sets the short description for the total items field
 
     def total_price(self, obj):
         """Display total price"""
-        return format_html('<span style="font-weight: bold;">${}</span>', obj.total_price)
+        return format_html('<span style="font-weight: bold;">${}</span>', obj.subtotal_amount or Decimal('0.00'))
     total_price.short_description = 'Total' #Sets the short description for the total price field
 
 
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField' #Sets the default auto field for the app
-    name = 'orders' #Sets the name of the app
\ No newline at end of file
+    name = 'orders' #Sets the name of the app
+
+    def ready(self):
+        from . import cart_summary, guest_cart  # noqa: F401 - connects the cart summary and guest cart merge signals
@@ -0,0 +1,72 @@
+"""
+Cached cart summaries for the navbar badge.
+
+Every page shows the size of the visitor's cart. Instead of loading the
+cart and summing its lines on each request, the CartSummary of each user
+is kept under cart-summary:<user id>, and the next page after a change
+computes it again with one aggregate query.
+
+Saved cart lines drop it through post_save. Deletes call forget()
+themselves: a post_delete receiver would stop Django from deleting a
+cart's lines with a single statement at checkout. CART_SUMMARY_TIMEOUT
+bounds how long a summary can outlive a change made any other way, and
+how long its subtotal can lag a price change.
+
+Pages that show or charge the totals (cart, checkout) read them from the
+Cart itself, never from here.
+
+The cache alias is CART_SUMMARY_CACHE_ALIAS ('cart-summaries'). Local
+memory is fine for tests and a single process; with several workers it
+must be a shared backend (FileBasedCache or RedisCache), or forget() only
+reaches the worker that handled the change and the others show a stale
+badge for up to CART_SUMMARY_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Cart, CartItem, CartSummary, summarize
+
+
+def summary_cache():
+    """Return the cache backend that holds cart summaries"""
+    alias = getattr(settings, 'CART_SUMMARY_CACHE_ALIAS', 'cart-summaries')
+    return caches[alias if alias in settings.CACHES else 'default']
+
+
+def summary_key(user_id):
+    return f'cart-summary:{user_id}'
+
+
+def cached_summary(user_id):
+    """The CartSummary of a user's cart, computed and cached on a miss"""
+    key = summary_key(user_id)
+    summary = summary_cache().get(key)
+    if summary is None:
+        summary = summarize(CartItem.objects.filter(cart__user_id=user_id))
+        summary_cache().set(key, tuple(summary), getattr(settings, 'CART_SUMMARY_TIMEOUT', 300))
+        return summary
+    return CartSummary(*summary)
+
+
+def forget(user_ids):
+    """Drop the cached summaries of some users"""
+    keys = [summary_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    summary_cache().delete_many(keys)
+    if connection.in_atomic_block:
+        # Drop again on commit, so a summary read from the old rows meanwhile is not kept
+        transaction.on_commit(lambda: summary_cache().delete_many(keys))
+
+
+# Drop summaries when a cart line is added or changed
+@receiver(post_save, sender=CartItem)
+def forget_cart_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if CartItem.cart.is_cached(instance):
+        forget([instance.cart.user_id])
+    else:
+        forget(Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True))
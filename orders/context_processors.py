@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+from .cart_summary import cached_summary
+from .models import CartSummary
+
+
+def cart(request):
+    """cart_summary for the navbar badge, read from the cache (or a guest's cookie); only computed when a template uses it"""
+    if not request.user.is_authenticated:
+        guest_cart = getattr(request, 'guest_cart', None)
+        return {'cart_summary': CartSummary(guest_cart.total_items if guest_cart else 0, None, None, None)} #Only the count; prices would need the products
+    user_id = request.user.pk
+    return {'cart_summary': SimpleLazyObject(lambda: cached_summary(user_id))}
@@ -0,0 +1,175 @@
+"""
+Cart of a visitor who is not logged in, kept in a signed cookie.
+
+Browsing and adding to the cart anonymously never writes to the database:
+the cart is a {product id: quantity} map in the GUEST_CART_COOKIE cookie,
+signed so it cannot be edited by hand. GuestCartMiddleware gives every
+request a request.guest_cart and writes the cookie back when the cart
+changed. On login the cart is merged into the user's Cart with one bulk
+upsert of its lines, and the cookie is cleared; most visitors never check
+out, so their carts never become rows.
+"""
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import TAX_RATE, Cart, CartItem, CartSummary
+
+COOKIE_SALT = 'orders.guest_cart'
+
+
+class GuestCart:
+    """A visitor's cart read from (and written back to) the signed cookie"""
+
+    def __init__(self, request=None):
+        self.quantities = self.read(request) if request is not None else {} #Product id -> quantity
+        self.modified = False
+
+    @staticmethod
+    def read(request):
+        """The {product id: quantity} map of the request's cookie; empty when missing, tampered with or malformed"""
+        try:
+            data = json.loads(request.get_signed_cookie(settings.GUEST_CART_COOKIE, default='{}', salt=COOKIE_SALT))
+            quantities = {int(product_id): int(quantity) for product_id, quantity in data.items()}
+        except (ValueError, TypeError, AttributeError):
+            return {}
+        return {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+
+    def __bool__(self):
+        return bool(self.quantities)
+
+    @property
+    def total_items(self):
+        # From the cookie alone, for the navbar badge
+        return sum(self.quantities.values())
+
+    @cached_property
+    def items(self):
+        """Unsaved CartItems of the active products in the cart, loaded in one query, quantities capped to the stock"""
+        from products.models import Product
+        products = Product.objects.filter(id__in=self.quantities, is_active=True).select_related('brand').order_by('name', 'id')
+        return [
+            CartItem(product=product, quantity=min(self.quantities[product.id], product.stock_quantity))
+            for product in products if product.stock_quantity > 0
+        ]
+
+    @cached_property
+    def summary(self):
+        """CartSummary of the loaded items; no query beyond items"""
+        subtotal = sum((item.total_price for item in self.items), Decimal('0'))
+        tax = subtotal * TAX_RATE
+        return CartSummary(sum(item.quantity for item in self.items), subtotal, tax, subtotal + tax)
+
+    @property
+    def total_price(self):
+        return self.summary.subtotal
+
+    @property
+    def total_price_with_tax(self):
+        return self.summary.total
+
+    def _changed(self):
+        self.modified = True
+        self.__dict__.pop('items', None)
+        self.__dict__.pop('summary', None)
+
+    def add(self, product, quantity=1):
+        """Add units of a product, capped to its stock; False when the cart has no room for another product"""
+        if product.id not in self.quantities and len(self.quantities) >= settings.GUEST_CART_MAX_LINES:
+            return False
+        self.quantities[product.id] = min(self.quantities.get(product.id, 0) + quantity, product.stock_quantity)
+        if self.quantities[product.id] <= 0:
+            del self.quantities[product.id]
+        self._changed()
+        return True
+
+    def update(self, product_id, quantity):
+        """Set the quantity of a product already in the cart; 0 or less removes it"""
+        if product_id not in self.quantities:
+            return
+        if quantity > 0:
+            self.quantities[product_id] = quantity
+        else:
+            del self.quantities[product_id]
+        self._changed()
+
+    def remove(self, product_id):
+        self.update(product_id, 0)
+
+    def clear(self):
+        if self.quantities:
+            self.quantities = {}
+            self._changed()
+
+    def save(self, response):
+        """Write the cart back to the response's cookie, or delete the cookie when the cart is empty"""
+        if not self.quantities:
+            response.delete_cookie(settings.GUEST_CART_COOKIE, samesite='Lax')
+            return
+        response.set_signed_cookie(
+            settings.GUEST_CART_COOKIE,
+            json.dumps(self.quantities, separators=(',', ':')),
+            salt=COOKIE_SALT,
+            max_age=settings.GUEST_CART_MAX_AGE,
+            httponly=True,
+            samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+    def merge_into(self, user):
+        """
+        Add the cart's lines to the user's Cart and empty this one.
+
+        Quantities already in the user's cart are added to, capped to the
+        stock. All lines are written with one INSERT ... ON CONFLICT DO
+        UPDATE; returns the number of lines written.
+        """
+        from . import cart_summary
+        from products.models import Product
+        if not self.quantities:
+            return 0
+        stock = dict(Product.objects.filter(id__in=self.quantities, is_active=True).values_list('id', 'stock_quantity'))
+        cart, _ = Cart.objects.get_or_create(user=user)
+        existing = dict(CartItem.objects.filter(cart=cart, product_id__in=stock).values_list('product_id', 'quantity'))
+        now = timezone.now()
+        lines = [
+            CartItem(
+                cart=cart, product_id=product_id, added_at=now, updated_at=now, #bulk_create skips auto_now
+                quantity=min(existing.get(product_id, 0) + self.quantities[product_id], stock[product_id]),
+            )
+            for product_id in sorted(stock) if stock[product_id] > 0
+        ]
+        CartItem.objects.bulk_create( #bulk_create skips CartItem.save(), so the stock cap is applied above
+            lines,
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+        cart_summary.forget([user.pk]) #bulk_create sends no post_save
+        self.clear()
+        return len(lines)
+
+
+class GuestCartMiddleware:
+    """Give each request its guest_cart and write the cookie back when the cart changed"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.guest_cart = GuestCart(request)
+        response = self.get_response(request)
+        if request.guest_cart.modified:
+            request.guest_cart.save(response)
+        return response
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    # Move what the visitor added before logging in into their cart
+    guest_cart = getattr(request, 'guest_cart', None)
+    if guest_cart:
+        guest_cart.merge_into(user)
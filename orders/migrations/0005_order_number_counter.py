@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:23
+
+import datetime
+from django.db import migrations, models
+
+
+def backfill_order_number_counters(apps, schema_editor):
+    # Start every day's counter after the highest number already used that day
+    Order = apps.get_model('orders', 'Order')
+    OrderNumberCounter = apps.get_model('orders', 'OrderNumberCounter')
+    last_numbers = {}
+    for order_number in Order.objects.filter(order_number__startswith='RF-').values_list('order_number', flat=True).iterator():
+        try:
+            _, day, number = order_number.split('-')
+            day, number = datetime.datetime.strptime(day, '%Y%m%d').date(), int(number)
+        except ValueError:
+            continue #Not a generated number
+        last_numbers[day] = max(number, last_numbers.get(day, 0))
+    OrderNumberCounter.objects.bulk_create(
+        [OrderNumberCounter(day=day, last_number=number) for day, number in last_numbers.items()], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_alter_order_shipping_address_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_order_number_counters, migrations.RunPython.noop),
+    ]
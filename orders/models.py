@@ -1,10 +1,29 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Sum
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 from decimal import Decimal
+from django.utils import timezone
+from django.utils.functional import cached_property
+from collections import namedtuple
 import re
 
+TAX_RATE = Decimal('0.24') #24% tax rate, used for carts and orders
+
+CartSummary = namedtuple('CartSummary', ['items', 'subtotal', 'tax', 'total']) #Totals of a cart
+
+
+def summarize(items):
+    """CartSummary of a CartItem queryset, from one aggregate query joined to the products"""
+    totals = items.order_by().aggregate(
+        items=Sum('quantity'),
+        subtotal=Sum(F('quantity') * F('product__effective_price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+    )
+    subtotal = (totals['subtotal'] or Decimal('0')).quantize(Decimal('0.01')) #Prices are in cents; SQLite returns the sum without its scale
+    tax = subtotal * TAX_RATE
+    return CartSummary(totals['items'] or 0, subtotal, tax, subtotal + tax)
+
 
 class Cart(models.Model):
     # Shopping cart
@@ -15,22 +34,29 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}" #Returns the username of the user
 
+    @cached_property
+    def summary(self):
+        """Item count, subtotal and tax of the cart from one aggregate query, kept for the life of this instance (a request)"""
+        return summarize(self.items.all())
+
     @property
     def total_items(self):
         # Get total number of items in cart
-        return sum(item.quantity for item in self.items.all()) #Returns the total number of items in the cart
+        return self.summary.items #Returns the total number of items in the cart
 
     @property
     def total_price(self):
         # Calculate total price
-        return sum(item.total_price for item in self.items.all()) #Returns the total price of the items in the cart
+        return self.summary.subtotal #Returns the total price of the items in the cart
 
     @property
     def total_price_with_tax(self):
         # Calculate total price with tax
-        tax_rate = Decimal('0.24')  # 24% tax rate to match Order model
-        return self.total_price + (self.total_price * tax_rate) #Returns the total price of the items in the cart with tax
+        return self.summary.total #Returns the total price of the items in the cart with tax
 
+    def refresh_summary(self):
+        """Forget the memoized summary after changing the cart's items"""
+        self.__dict__.pop('summary', None)
 
 
 class CartItem(models.Model):
@@ -59,6 +85,36 @@ class CartItem(models.Model):
         super().save(*args, **kwargs) #Saves the object
 
 
+class OrderNumberCounter(models.Model):
+    # Last order number handed out on each day
+    day = models.DateField(unique=True) #Day the numbers belong to
+    last_number = models.PositiveIntegerField(default=0) #Last number used on that day
+
+    def __str__(self):
+        return f"{self.day}: {self.last_number}" #Returns the day and the last number
+
+    @classmethod
+    def next_order_number(cls, day=None):
+        """
+        Return the next RF-YYYYMMDD-NNNN number of the day.
+
+        The counter row is bumped with an UPDATE, which locks it until the
+        surrounding transaction ends, so concurrent orders queue up on it
+        instead of racing for the same number. Numbers past 9999 simply get
+        more digits.
+        """
+        day = day or timezone.localdate()
+        with transaction.atomic(savepoint=False): #Order.save() already provides the savepoint
+            if not cls.objects.filter(day=day).update(last_number=F('last_number') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(day=day, last_number=1) #First order of the day
+                except IntegrityError:
+                    cls.objects.filter(day=day).update(last_number=F('last_number') + 1) #Another order created the row first
+            number = cls.objects.filter(day=day).values_list('last_number', flat=True).get()
+        return f"RF-{day:%Y%m%d}-{number:04d}"
+
+
 class Order(models.Model):
     # Order model
     ORDER_STATUS_CHOICES = [ #Choices for the order status
@@ -134,26 +190,19 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at'] #Orders the objects by the created at field
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'), #A customer's orders, newest first
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} - {self.user.username}" #Returns the order number and username of the user
 
     def save(self, *args, **kwargs): #Saves the object
-        if not self.order_number:
-            # Generate order number: RF-YYYYMMDD-XXXX
-            from datetime import datetime #Imports the datetime module
-            date_str = datetime.now().strftime('%Y%m%d') #Formats the date as YYYYMMDD
-            last_order = Order.objects.filter(order_number__startswith=f'RF-{date_str}').order_by('-order_number').first() #Filters the objects by the order number
-
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1]) #Splits the order number and gets the last number
-                new_number = last_number + 1 #Adds 1 to the last number
-            else:
-                new_number = 1 #Sets the new number to 1
-
-            self.order_number = f"RF-{date_str}-{new_number:04d}" #Formats the order number as RF-YYYYMMDD-XXXX
-
-        super().save(*args, **kwargs) #Saves the object
+        if self.order_number:
+            return super().save(*args, **kwargs) #Saves the object
+        with transaction.atomic(): #The number is only used if the order is saved
+            self.order_number = OrderNumberCounter.next_order_number() #Formats the order number as RF-YYYYMMDD-XXXX
+            super().save(*args, **kwargs) #Saves the object
 
     @property
     def is_paid(self):
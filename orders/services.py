@@ -0,0 +1,132 @@
+"""
+Checkout: turn a cart into an order in one transaction.
+
+Stock is taken with a single conditional UPDATE that only succeeds for
+rows still holding enough stock, so two checkouts racing for the last
+units cannot both win. On databases with row locks the cart lines and
+their products are also locked with SELECT ... FOR UPDATE, so the stock
+check happens on rows nobody else can change. SQLite has no row locks
+(Django drops FOR UPDATE there) and serializes writers instead; a
+checkout that finds the database locked is retried for up to LOCK_TIMEOUT
+seconds.
+"""
+import random
+import time
+from decimal import Decimal
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from products import card_cache
+from products.facets import facet_index
+from products.models import Product
+from . import cart_summary
+from .models import TAX_RATE, CartItem, Order, OrderItem, OrderStatusHistory
+
+LOCK_TIMEOUT = 10 #Seconds to keep retrying while SQLite reports the database as locked
+LOCK_BACKOFF = 0.02 #Seconds to wait before the first retry, doubled after each one up to LOCK_BACKOFF_MAX
+LOCK_BACKOFF_MAX = 0.5
+
+
+class CheckoutError(Exception):
+    """The cart cannot be turned into an order"""
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class InsufficientStock(CheckoutError):
+    """Some cart lines ask for more than is in stock"""
+
+    def __init__(self, products):
+        self.products = products #Names of the products that ran short
+        super().__init__(f"Not enough stock for: {', '.join(products)}")
+
+
+def _is_sqlite_lock(error):
+    return connection.vendor == 'sqlite' and 'locked' in str(error)
+
+
+def retry_on_lock(function, *args, **kwargs):
+    """Call function, again and again for up to LOCK_TIMEOUT seconds while SQLite reports the database as locked"""
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    backoff = LOCK_BACKOFF
+    while True:
+        try:
+            return function(*args, **kwargs)
+        except OperationalError as error:
+            if not _is_sqlite_lock(error) or time.monotonic() > deadline:
+                raise
+        time.sleep(random.uniform(0, backoff)) #Another transaction holds the lock; jitter keeps retries apart
+        backoff = min(backoff * 2, LOCK_BACKOFF_MAX)
+
+
+def place_order(user, shipping_details, payment_method=None, shipping_method=None):
+    """Create an order from the user's cart, take the stock and empty the cart; returns the order"""
+    return retry_on_lock(_place_order, user, shipping_details, payment_method, shipping_method)
+
+
+@transaction.atomic
+def _place_order(user, shipping_details, payment_method, shipping_method):
+    lines = list(
+        CartItem.objects.filter(cart__user=user)
+        .select_related('product')
+        .select_for_update()
+        .order_by('product_id') #Same lock order in every checkout, so they cannot deadlock
+    )
+    if not lines:
+        raise EmptyCart('Your cart is empty!')
+    short = [line.product.name for line in lines if line.quantity > line.product.stock_quantity]
+    if short:
+        raise InsufficientStock(short)
+
+    subtotal = sum((line.total_price for line in lines), Decimal('0'))
+    tax_amount = subtotal * TAX_RATE
+    shipping_cost = shipping_method.cost if shipping_method else 0
+    order = Order.objects.create(
+        user=user,
+        subtotal=subtotal,
+        tax_amount=tax_amount,
+        shipping_cost=shipping_cost,
+        total_amount=subtotal + tax_amount + shipping_cost,
+        payment_method=payment_method.name if payment_method else '',
+        **shipping_details,
+    )
+
+    # Take the stock of every line in one statement; a row without enough stock left is not updated
+    quantities = {line.product_id: line.quantity for line in lines}
+    wanted = Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    updated = Product.objects.filter(id__in=quantities, stock_quantity__gte=wanted).update(
+        stock_quantity=F('stock_quantity') - wanted,
+    )
+    if updated != len(quantities):
+        # A concurrent checkout got there first; find out which products ran short and roll everything back
+        left = dict(Product.objects.filter(id__in=quantities).values_list('id', 'stock_quantity'))
+        raise InsufficientStock([line.product.name for line in lines if line.quantity > left.get(line.product_id, 0)])
+    for product_id in quantities:
+        card_cache.invalidate('product', product_id) #update() sends no post_save
+    transaction.on_commit(lambda: facet_index.refresh(list(quantities))) #Stock levels of this worker's facet counts
+
+    OrderItem.objects.bulk_create([
+        OrderItem( #bulk_create skips OrderItem.save(), so the snapshots are filled in here
+            order=order,
+            product=line.product,
+            product_name=line.product.name,
+            product_sku=line.product.sku,
+            quantity=line.quantity,
+            unit_price=line.product.current_price,
+            total_price=line.total_price,
+        )
+        for line in lines
+    ])
+    OrderStatusHistory.objects.create(
+        order=order,
+        status='pending',
+        notes='Order placed successfully',
+        changed_by=user,
+    )
+    CartItem.objects.filter(id__in=[line.id for line in lines]).delete() #Empties the cart
+    cart_summary.forget([user.pk]) #The navbar badge goes back to 0
+    return order
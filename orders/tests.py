@@ -1,3 +1,339 @@
-from django.test import TestCase
+import datetime
+import threading
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from products.models import Brand, Category, Product, SubCategory
+from .cart_summary import summary_cache, summary_key
+from .models import Cart, CartItem, Order, OrderItem, OrderNumberCounter
+from .services import InsufficientStock, place_order, retry_on_lock
 
-# Create your tests here.
+SHIPPING = {
+    'shipping_address': '1 Pit Lane',
+    'shipping_city': 'Monza',
+    'shipping_state': 'MB',
+    'shipping_postal_code': '20900',
+    'shipping_country': 'Italy',
+    'shipping_phone': '+39000000000',
+}
+
+
+def make_product(name, stock, price='100.00'):
+    category, _ = Category.objects.get_or_create(name='Brakes') #Creates a test category
+    subcategory, _ = SubCategory.objects.get_or_create(name='Pads', category=category) #Creates a test subcategory
+    brand, _ = Brand.objects.get_or_create(name='Brembo') #Creates a test brand
+    return Product.objects.create(
+        name=name,
+        category=category,
+        subcategory=subcategory,
+        brand=brand,
+        price=price,
+        stock_quantity=stock,
+        description='Test description for a brake part',
+    )
+
+
+def fill_cart(user, *lines):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    for product, quantity in lines:
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    return cart
+
+
+class CheckoutTest(TestCase):
+    """Checkout creates the order, takes the stock and empties the cart, or does nothing at all"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver', password='testpass123') #Creates a test user
+        self.pads = make_product('Carbon Pads', stock=5)
+        self.discs = make_product('Carbon Discs', stock=2, price='400.00')
+
+    def test_places_order(self):
+        fill_cart(self.user, (self.pads, 2), (self.discs, 1))
+        order = place_order(self.user, SHIPPING)
+        self.pads.refresh_from_db()
+        self.discs.refresh_from_db()
+        self.assertEqual((self.pads.stock_quantity, self.discs.stock_quantity), (3, 1))
+        self.assertEqual(order.subtotal, 600)
+        self.assertEqual(order.total_amount, 744)
+        items = {item.product_name: item for item in order.items.all()}
+        self.assertEqual(items['Carbon Pads'].quantity, 2)
+        self.assertEqual(items['Carbon Discs'].total_price, 400)
+        self.assertEqual(items['Carbon Discs'].product_sku, self.discs.sku)
+        self.assertEqual(order.status_history.count(), 1)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        OrderNumberCounter.objects.create(day=timezone.localdate()) #Today's first order makes one more query
+        fill_cart(self.user, (self.pads, 1))
+        with self.assertNumQueries(12): #Eight statements inside the checkout and order savepoints
+            place_order(self.user, SHIPPING)
+        other = User.objects.create_user(username='other', password='testpass123') #Creates a second user
+        fill_cart(other, (self.pads, 1), (self.discs, 1), (make_product('Brake Fluid', stock=9), 1))
+        with self.assertNumQueries(12):
+            place_order(other, SHIPPING)
+
+    def test_short_stock_changes_nothing(self):
+        cart = fill_cart(self.user, (self.pads, 2), (self.discs, 2))
+        Product.objects.filter(pk=self.discs.pk).update(stock_quantity=1) #Sold elsewhere after it was added to the cart
+        with self.assertRaises(InsufficientStock) as raised:
+            place_order(self.user, SHIPPING)
+        self.assertEqual(raised.exception.products, ['Carbon Discs'])
+        self.pads.refresh_from_db()
+        self.assertEqual(self.pads.stock_quantity, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cart.items.count(), 2)
+
+    def test_view_reports_short_stock(self):
+        fill_cart(self.user, (self.discs, 2))
+        Product.objects.filter(pk=self.discs.pk).update(stock_quantity=1)
+        self.client.login(username='driver', password='testpass123')
+        response = self.client.post(reverse('orders:checkout'), SHIPPING, follow=True)
+        self.assertRedirects(response, reverse('orders:cart'))
+        self.assertContains(response, 'Not enough stock for: Carbon Discs')
+        self.assertFalse(Order.objects.exists())
+
+
+class CartSummaryTest(TestCase):
+    """Cart totals come from one aggregate query; the navbar badge reads a cached summary"""
+
+    def setUp(self):
+        summary_cache().clear() #Summaries are cached by user id, which later tests reuse
+        self.user = User.objects.create_user(username='driver', password='testpass123') #Creates a test user
+        self.pads = make_product('Carbon Pads', stock=5)
+        self.discs = make_product('Carbon Discs', stock=5, price='400.00')
+        self.discs.refresh_from_db()
+        self.discs.discount_percentage = 10
+        self.discs.save() #On sale for 360.00
+
+    def cart_queries(self, function):
+        # Number of queries touching the cart tables
+        with CaptureQueriesContext(connection) as ctx:
+            function()
+        return len([q for q in ctx.captured_queries if 'orders_cart' in q['sql']])
+
+    def test_totals_from_one_query(self):
+        cart = fill_cart(self.user, (self.pads, 2), (self.discs, 1))
+        cart = Cart.objects.get(pk=cart.pk)
+        with self.assertNumQueries(1):
+            totals = (cart.total_items, cart.total_price, cart.total_price_with_tax) #Memoized after the first
+        self.assertEqual(totals, (3, Decimal('560.00'), Decimal('694.40')))
+        self.assertEqual(cart.total_price, sum(item.total_price for item in cart.items.all()))
+        cart.refresh_summary()
+        self.assertEqual(Cart.objects.create(user=User.objects.create_user(username='empty')).total_price_with_tax, 0)
+
+    def test_navbar_badge_reads_the_cache(self):
+        fill_cart(self.user, (self.pads, 2))
+        self.client.login(username='driver', password='testpass123')
+        url = reverse('products:product_list')
+        self.assertContains(self.client.get(url), '<span class="badge bg-danger">2</span>', html=True)
+        self.assertEqual(self.cart_queries(lambda: self.client.get(url)), 0)
+        self.client.post(reverse('orders:add_to_cart', args=[self.discs.id]))
+        self.assertContains(self.client.get(url), '<span class="badge bg-danger">3</span>', html=True)
+        item = CartItem.objects.get(product=self.pads)
+        self.client.post(reverse('orders:remove_from_cart', args=[item.id]))
+        self.assertContains(self.client.get(url), '<span class="badge bg-danger">1</span>', html=True)
+
+    def test_summaries_live_in_their_own_cache(self):
+        fill_cart(self.user, (self.pads, 2))
+        self.client.login(username='driver', password='testpass123')
+        self.client.get(reverse('products:product_list'))
+        self.assertIs(summary_cache(), caches[settings.CART_SUMMARY_CACHE_ALIAS]) #Shared between workers when configured so
+        self.assertEqual(summary_cache().get(summary_key(self.user.pk))[0], 2)
+        self.assertIsNone(caches['default'].get(summary_key(self.user.pk)))
+
+    def test_checkout_empties_the_badge(self):
+        fill_cart(self.user, (self.pads, 1))
+        self.client.login(username='driver', password='testpass123')
+        url = reverse('products:product_list')
+        self.assertContains(self.client.get(url), '<span class="badge bg-danger">1</span>', html=True)
+        place_order(self.user, SHIPPING)
+        self.assertContains(self.client.get(url), '<span class="badge bg-danger">0</span>', html=True)
+
+    def test_update_returns_totals(self):
+        cart = fill_cart(self.user, (self.pads, 1), (self.discs, 1))
+        self.client.login(username='driver', password='testpass123')
+        item = cart.items.get(product=self.pads)
+        response = self.client.post(
+            reverse('orders:update_cart_item', args=[item.id]), {'quantity': 3}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json(), {'success': True, 'total_price': '660.00', 'total_items': 4})
+
+
+class GuestCartTest(TestCase):
+    """Logged-out carts live in a signed cookie and merge into the user's cart on login"""
+
+    def setUp(self):
+        summary_cache().clear()
+        self.user = User.objects.create_user(username='driver', password='testpass123') #Creates a test user
+        self.pads = make_product('Carbon Pads', stock=5)
+        self.discs = make_product('Carbon Discs', stock=2, price='400.00')
+
+    def add(self, product):
+        return self.client.post(reverse('orders:add_to_cart', args=[product.id]))
+
+    def test_adding_writes_nothing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.add(self.pads)
+            self.add(self.pads)
+        self.assertFalse([q for q in ctx.captured_queries if not q['sql'].startswith('SELECT')])
+        self.assertFalse(Cart.objects.exists())
+        self.assertIn(settings.GUEST_CART_COOKIE, self.client.cookies)
+        response = self.client.get(reverse('orders:cart'))
+        self.assertContains(response, 'Carbon Pads')
+        self.assertContains(response, '$200.00')
+        self.assertContains(response, '<span class="badge bg-danger">2</span>', html=True)
+
+    def test_adding_needs_a_post(self):
+        response = self.client.get(reverse('orders:add_to_cart', args=[self.pads.id])) #Links, prefetchers and crawlers
+        self.assertEqual(response.status_code, 405)
+        self.assertNotIn(settings.GUEST_CART_COOKIE, self.client.cookies)
+
+    def test_update_and_remove(self):
+        self.add(self.pads)
+        self.add(self.discs)
+        response = self.client.post(
+            reverse('orders:update_guest_cart_item', args=[self.pads.id]), {'quantity': 3}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json(), {'success': True, 'total_price': '700.00', 'total_items': 4})
+        self.client.post(reverse('orders:remove_from_guest_cart', args=[self.discs.id]))
+        self.assertEqual(self.client.get(reverse('orders:cart')).context['cart'].total_items, 3)
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies[settings.GUEST_CART_COOKIE] = '{"%d":9}' % self.pads.id #Not signed
+        response = self.client.get(reverse('orders:cart'))
+        self.assertContains(response, 'Your cart is empty.')
+
+    @override_settings(GUEST_CART_MAX_LINES=1)
+    def test_full_cart(self):
+        self.add(self.pads)
+        response = self.add(self.discs)
+        self.assertEqual(len(response.wsgi_request.guest_cart.quantities), 1)
+
+    def test_login_merges_with_one_upsert(self):
+        fill_cart(self.user, (self.pads, 4))
+        self.add(self.pads)
+        self.add(self.pads) #4 + 2 is capped to the 5 in stock
+        self.add(self.discs)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('users:login'), {'username': 'driver', 'password': 'testpass123'})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "orders_cartitem"')]), 1)
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user=self.user).values_list('product__name', 'quantity')),
+            {'Carbon Pads': 5, 'Carbon Discs': 1},
+        )
+        self.assertEqual(self.client.cookies[settings.GUEST_CART_COOKIE].value, '') #Cleared
+        response = self.client.get(reverse('products:product_list'))
+        self.assertContains(response, '<span class="badge bg-danger">6</span>', html=True)
+
+
+class OrderNumberTest(TestCase):
+    """Order numbers come from a per-day counter"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver', password='testpass123') #Creates a test user
+
+    def create_order(self):
+        return Order.objects.create(user=self.user, subtotal=10, total_amount=10, **SHIPPING)
+
+    def test_numbers_follow_the_daily_counter(self):
+        day = f'{timezone.localdate():%Y%m%d}'
+        with self.assertNumQueries(2 + 2 + 3 + 1): #Savepoint pair, counter row created in its own savepoint and read, the order
+            first = self.create_order()
+        with self.assertNumQueries(2 + 2 + 1): #Savepoint pair, counter bumped and read, the order
+            second = self.create_order()
+        self.assertEqual(first.order_number, f'RF-{day}-0001')
+        self.assertEqual(second.order_number, f'RF-{day}-0002')
+
+    def test_days_are_counted_separately(self):
+        day = datetime.date(2026, 1, 2)
+        OrderNumberCounter.objects.create(day=day, last_number=41)
+        self.assertEqual(OrderNumberCounter.next_order_number(day), 'RF-20260102-0042')
+        self.assertEqual(OrderNumberCounter.next_order_number(datetime.date(2026, 1, 3)), 'RF-20260103-0001')
+
+    def test_more_than_9999_orders_a_day(self):
+        OrderNumberCounter.objects.create(day=timezone.localdate(), last_number=9999)
+        self.assertTrue(self.create_order().order_number.endswith('-10000'))
+
+    def test_failed_order_does_not_use_up_a_number(self):
+        with self.assertRaises(Exception):
+            Order.objects.create(user=None, subtotal=10, total_amount=10, **SHIPPING) #No user, the insert fails
+        self.assertTrue(self.create_order().order_number.endswith('-0001'))
+
+
+class ConcurrentOrderNumberTest(TransactionTestCase):
+    """Orders created in parallel never get the same number"""
+
+    workers = 8
+    orders_per_worker = 10
+
+    def test_parallel_inserts_get_unique_numbers(self):
+        user = User.objects.create_user(username='driver', password='testpass123') #Creates a test user
+        barrier = threading.Barrier(self.workers)
+        errors = []
+
+        def create_orders():
+            try:
+                barrier.wait() #Start every worker at the same moment
+                for _ in range(self.orders_per_worker):
+                    retry_on_lock(Order.objects.create, user=user, subtotal=10, total_amount=10, **SHIPPING)
+            except Exception as error:
+                errors.append(error) #A duplicate number would show up here as an IntegrityError
+            finally:
+                connection.close() #Each thread has its own connection
+
+        threads = [threading.Thread(target=create_orders) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        numbers = sorted(int(number.split('-')[-1]) for number in Order.objects.values_list('order_number', flat=True))
+        self.assertEqual(numbers, list(range(1, self.workers * self.orders_per_worker + 1))) #Unique and without gaps
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    """Parallel checkouts for the last units of a product never sell more than is in stock"""
+
+    buyers = 8
+    stock = 3
+
+    def test_no_oversell(self):
+        product = make_product('Titanium Caliper', stock=self.stock)
+        users = [User.objects.create_user(username=f'buyer{i}', password='testpass123') for i in range(self.buyers)]
+        for user in users:
+            fill_cart(user, (product, 1))
+
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def buy(user):
+            try:
+                barrier.wait() #Start every checkout at the same moment
+                place_order(user, SHIPPING)
+                results.append('ok')
+            except InsufficientStock:
+                results.append('short')
+            except Exception as error:
+                results.append(error)
+            finally:
+                connection.close() #Each thread has its own connection
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.stock, results)
+        self.assertEqual(results.count('short'), self.buyers - self.stock, results)
+        self.assertEqual(product.stock_quantity, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
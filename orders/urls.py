@@ -8,6 +8,8 @@ urlpatterns = [
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'), 
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
+    path('cart/guest/remove/<int:product_id>/', views.remove_from_guest_cart, name='remove_from_guest_cart'),
+    path('cart/guest/update/<int:product_id>/', views.update_guest_cart_item, name='update_guest_cart_item'),
     path('checkout/', views.checkout, name='checkout'),
     path('order/<str:order_number>/', views.order_detail, name='order_detail'),
     path('orders/', views.order_history, name='order_history'),
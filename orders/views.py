@@ -1,17 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
-from .models import Cart, CartItem, Order, OrderItem, OrderStatusHistory, ShippingMethod, PaymentMethod
+from .models import Cart, CartItem, Order, OrderStatusHistory, ShippingMethod, PaymentMethod
+from . import cart_summary
+from .services import CheckoutError, place_order
 from products.models import Product
-from decimal import Decimal
 
 
-@login_required
 def cart_view(request):
+    if not request.user.is_authenticated: #Guests' carts live in a cookie
+        context = {
+            'cart': request.guest_cart,
+            'cart_items': request.guest_cart.items, #Loads the products in one query
+        }
+        return render(request, 'orders/cart.html', context) #Renders the cart template
+
     cart, created = Cart.objects.get_or_create(user=request.user) #Gets or creates the cart for the user
-    cart_items = cart.items.all() #Gets all the items in the cart
+    cart_items = cart.items.select_related('product__brand') #Gets all the items in the cart with their products in one query
 
     context = {
         'cart': cart,
@@ -20,9 +28,17 @@ def cart_view(request):
     return render(request, 'orders/cart.html', context) #Renders the cart template
 
 
-@login_required
+@require_POST
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id) #Gets the product
+    product = get_object_or_404(Product, id=product_id, is_active=True) #Gets the product
+
+    if not request.user.is_authenticated: #Kept in the guest cart cookie, no database write
+        if not request.guest_cart.add(product):
+            messages.warning(request, 'Your cart is full. Log in to add more products.') #Displays the message
+            return redirect('orders:cart') #Redirects to the cart view
+        messages.success(request, f'{product.name} added to cart!') #Displays the message
+        return redirect('orders:cart') #Redirects to the cart view
+
     cart, created = Cart.objects.get_or_create(user=request.user) #Gets or creates the cart for the user
 
     cart_item, created = CartItem.objects.get_or_create( #Gets or creates the cart item
@@ -41,17 +57,42 @@ def add_to_cart(request, product_id):
 
 @login_required
 def remove_from_cart(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user) #Gets the cart item
+    cart_item = get_object_or_404(CartItem.objects.select_related('product', 'cart'), id=item_id, cart__user=request.user) #Gets the cart item with its product and cart
     product_name = cart_item.product.name #Gets the product name
     cart_item.delete() #Deletes the cart item
+    cart_summary.forget([request.user.pk]) #Deletes send no cart summary signal
 
     messages.success(request, f'{product_name} removed from cart!') #Displays the message
     return redirect('orders:cart') #Redirects to the cart view
 
 
+@require_POST
+def remove_from_guest_cart(request, product_id):
+    request.guest_cart.remove(product_id) #Removes the product from the cookie
+    messages.success(request, 'Product removed from cart!') #Displays the message
+    return redirect('orders:cart') #Redirects to the cart view
+
+
+@require_POST
+def update_guest_cart_item(request, product_id):
+    try:
+        quantity = int(request.POST.get('quantity', 1)) #Gets the quantity
+    except ValueError:
+        quantity = 1
+    request.guest_cart.update(product_id, quantity) #Capped to the stock when the cart is shown
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        summary = request.guest_cart.summary #Loads the products in one query
+        return JsonResponse({
+            'success': True, #Sets the success to true
+            'total_price': summary.subtotal, #Gets the total price
+            'total_items': summary.items, #Gets the total items
+        })
+    return redirect('orders:cart') #Redirects to the cart view
+
+
 @login_required
 def update_cart_item(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user) #Gets the cart item
+    cart_item = get_object_or_404(CartItem.objects.select_related('product', 'cart'), id=item_id, cart__user=request.user) #Gets the cart item with its product and cart
     if request.method == 'POST':
         quantity = int(request.POST.get('quantity', 1)) #Gets the quantity
         if quantity > 0:
@@ -59,11 +100,13 @@ def update_cart_item(request, item_id):
             cart_item.save() #Saves the cart item
         else:
             cart_item.delete() #Deletes the cart item
+            cart_summary.forget([request.user.pk]) #Deletes send no cart summary signal
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            summary = cart_item.cart.summary #One aggregate query for both totals
             return JsonResponse({
                 'success': True, #Sets the success to true
-                'total_price': cart_item.cart.total_price if cart_item.cart else 0, #Gets the total price
-                'total_items': cart_item.cart.total_items if cart_item.cart else 0 #Gets the total items
+                'total_price': summary.subtotal, #Gets the total price
+                'total_items': summary.items, #Gets the total items
             })
         else:
             return redirect('orders:cart') #Redirects to the cart view
@@ -73,7 +116,7 @@ def update_cart_item(request, item_id):
 @login_required
 def checkout(request):
     cart, created = Cart.objects.get_or_create(user=request.user) #Gets or creates the cart for the user
-    cart_items = cart.items.all() #Gets all the items in the cart
+    cart_items = cart.items.select_related('product') #Gets all the items in the cart with their products in one query
     payment_methods = PaymentMethod.objects.filter(is_active=True) #Gets all the active payment methods
     shipping_methods = ShippingMethod.objects.filter(is_active=True)
 
@@ -87,55 +130,27 @@ def checkout(request):
             selected_shipping_method_id = request.POST.get('shipping_method') #Gets the shipping method
             payment_method = PaymentMethod.objects.get(id=selected_payment_method_id) if selected_payment_method_id else None #Gets the payment method
             shipping_method = ShippingMethod.objects.get(id=selected_shipping_method_id) if selected_shipping_method_id else None #Gets the shipping method
-            shipping_cost = shipping_method.cost if shipping_method else 0 #Gets the shipping cost
-            subtotal = cart.total_price #Gets the subtotal
-            tax_amount = subtotal * Decimal('0.24')  # 24% tax rate to match Cart model
-            total_with_tax = subtotal + tax_amount #Gets the total with tax
-            total_amount = total_with_tax + shipping_cost #Gets the total amount
-
-            order = Order.objects.create( #Creates the order
-                user=request.user,
-                subtotal=subtotal,
-                tax_amount=tax_amount,
-                shipping_cost=shipping_cost,
-                total_amount=total_amount,
-                shipping_address=request.POST.get('shipping_address', ''), #Gets the shipping address
-                shipping_city=request.POST.get('shipping_city', ''), #Gets the shipping city
-                shipping_state=request.POST.get('shipping_state', ''), #Gets the shipping state
-                shipping_postal_code=request.POST.get('shipping_postal_code', ''),
-                shipping_country=request.POST.get('shipping_country', ''),
-                shipping_phone=request.POST.get('shipping_phone', ''),
-                customer_notes=request.POST.get('customer_notes', ''),
-                payment_method=payment_method.name if payment_method else '', #Gets the payment method
+            order = place_order( #Creates the order, takes the stock and empties the cart in one transaction
+                request.user,
+                {
+                    'shipping_address': request.POST.get('shipping_address', ''), #Gets the shipping address
+                    'shipping_city': request.POST.get('shipping_city', ''), #Gets the shipping city
+                    'shipping_state': request.POST.get('shipping_state', ''), #Gets the shipping state
+                    'shipping_postal_code': request.POST.get('shipping_postal_code', ''),
+                    'shipping_country': request.POST.get('shipping_country', ''),
+                    'shipping_phone': request.POST.get('shipping_phone', ''),
+                    'customer_notes': request.POST.get('customer_notes', ''),
+                },
+                payment_method=payment_method,
+                shipping_method=shipping_method,
             )
 
-            # Create order items
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order, #Sets the order
-                    product=cart_item.product, #Sets the product
-                    quantity=cart_item.quantity, #Sets the quantity
-                    unit_price=cart_item.product.current_price, #Sets the unit price
-                    total_price=cart_item.total_price #Sets the total price
-                )
-                # Decrement product stock
-                cart_item.product.stock_quantity = max(0, cart_item.product.stock_quantity - cart_item.quantity) 
-                cart_item.product.save()
-
-            # Create initial status history
-            OrderStatusHistory.objects.create(
-                order=order, #Sets the order
-                status='pending', #Sets the status
-                notes='Order placed successfully', #Sets the notes
-                changed_by=request.user #Sets the changed by
-            )
-
-            # Clear cart
-            cart.items.all().delete() #Deletes all the items in the cart
-
             messages.success(request, f'Order {order.order_number} placed successfully!') #Displays the message
             return redirect('orders:order_detail', order_number=order.order_number) #Redirects to the order detail view
 
+        except CheckoutError as e:
+            messages.error(request, str(e)) #Empty cart or not enough stock left
+            return redirect('orders:cart') #Redirects to the cart view
         except Exception as e:
             messages.error(request, f'Error creating order: {str(e)}') #Displays the message
             return redirect('orders:cart') #Redirects to the cart view
@@ -1,8 +1,11 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import Category, SubCategory, Brand, Product
+from .search import index_products
+from .facets import facet_index
+from .autocomplete import suggestion_index
 
 
 @admin.register(Category)
@@ -105,7 +108,7 @@ class ProductAdmin(admin.ModelAdmin):
     ] #Filter the fields in the admin interface
     search_fields = ['name', 'sku', 'description', 'brand__name', 'category__name'] #Search the fields in the admin interface
     prepopulated_fields = {'slug': ('name',)} #Pre-populate the slug field with the name field
-    readonly_fields = ['created_at', 'updated_at', 'discount_percentage_display', 'sale_price', 'sku_display'] #Exclude the fields from the admin interface
+    readonly_fields = ['created_at', 'updated_at', 'discount_percentage_display', 'sale_price', 'sku_display', 'rating_count', 'rating_avg', 'rating_score', 'rating_histogram_display'] #Exclude the fields from the admin interface
     
     fieldsets = ( #Organize the fields in the admin interface
         ('Basic Information', { #Organize the fields in the admin interface
@@ -126,6 +129,10 @@ class ProductAdmin(admin.ModelAdmin):
         ('Status & Visibility', { #Organize the fields in the admin interface
             'fields': ('is_active', 'is_featured', 'is_bestseller') #Include the fields in the admin interface
         }),
+        ('Ratings', { #Organize the fields in the admin interface
+            'fields': ('rating_count', 'rating_avg', 'rating_score', 'rating_histogram_display'), #Include the fields in the admin interface
+            'classes': ('collapse',) #Include the classes in the admin interface
+        }),
         ('SEO & Marketing', { #Organize the fields in the admin interface
             'fields': ('meta_title', 'meta_description', 'keywords'), #Include the fields in the admin interface
             'classes': ('collapse',) #Include the classes in the admin interface
@@ -190,35 +197,62 @@ class ProductAdmin(admin.ModelAdmin):
             )
     sku_display.short_description = 'SKU Status' #Set the short description for the SKU status field
 
+    def rating_histogram_display(self, obj):
+        """Display the star histogram of the stored rating summary"""
+        summary = obj.rating_summary #Read from the stored columns, no rating query
+        return format_html_join(
+            mark_safe('<br>'), '{}&#9733; {} ({}%)', #One line per star value
+            ((stars, count, percent) for stars, count, percent in summary.histogram)
+        )
+    rating_histogram_display.short_description = 'Star histogram' #Set the short description for the histogram field
+
     def get_queryset(self, request):
         """Optimize queryset with related fields"""
         return super().get_queryset(request).select_related('brand', 'category', 'subcategory') #Select the related fields
 
-    actions = ['mark_featured', 'mark_bestseller', 'activate_products', 'deactivate_products'] #Display the actions in the admin interface
+    actions = ['mark_featured', 'mark_bestseller', 'activate_products', 'deactivate_products', 'rebuild_ratings'] #Display the actions in the admin interface
+
+    def _refresh_indexes(self, product_ids):
+        # update() sends no post_save; refresh the in-memory indexes the signals would have
+        facet_index.refresh(product_ids) #Facet counts, flags and paging
+        suggestion_index.refresh(product_ids) #Suggestion ranking, and inactive products dropped
 
     def mark_featured(self, request, queryset):
         """Mark selected products as featured"""
+        product_ids = list(queryset.values_list('id', flat=True)) #Get the ids of the products
         updated = queryset.update(is_featured=True) #Update the products
+        self._refresh_indexes(product_ids)
         self.message_user(request, f'{updated} products marked as featured.') #Display the message
     mark_featured.short_description = "Mark selected products as featured" #Set the short description for the mark featured field
 
     def mark_bestseller(self, request, queryset):
         """Mark selected products as bestsellers"""
+        product_ids = list(queryset.values_list('id', flat=True)) #Get the ids of the products
         updated = queryset.update(is_bestseller=True) #Update the products
+        self._refresh_indexes(product_ids)
         self.message_user(request, f'{updated} products marked as bestsellers.') #Display the message
     mark_bestseller.short_description = "Mark selected products as bestsellers" #Set the short description for the mark bestseller field
 
     def activate_products(self, request, queryset):
         """Activate selected products"""
+        product_ids = list(queryset.values_list('id', flat=True)) #Get the ids before the filter may stop matching
         updated = queryset.update(is_active=True) #Update the products
+        index_products(Product.objects.filter(id__in=product_ids)) #Add the products back to the search index
+        self._refresh_indexes(product_ids)
         self.message_user(request, f'{updated} products activated.') #Display the message
     activate_products.short_description = "Activate selected products" #Set the short description for the activate products field
 
     def deactivate_products(self, request, queryset):
         """Deactivate selected products"""
+        product_ids = list(queryset.values_list('id', flat=True)) #Get the ids before the filter may stop matching
         updated = queryset.update(is_active=False) #Update the products
+        index_products(Product.objects.filter(id__in=product_ids)) #Drop the products from the search index
+        self._refresh_indexes(product_ids)
         self.message_user(request, f'{updated} products deactivated.') #Display the message
     deactivate_products.short_description = "Deactivate selected products" #Set the short description for the deactivate products field
 
-
-
+    def rebuild_ratings(self, request, queryset):
+        """Recompute the rating summary of selected products from their ratings"""
+        repaired = queryset.rebuild_ratings() #One grouped query, only drifted products are written
+        self.message_user(request, f'Rating summary repaired for {repaired} products.') #Display the message
+    rebuild_ratings.short_description = "Rebuild rating summary of selected products" #Set the short description for the rebuild ratings field
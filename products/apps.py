@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig): #Configures the products app
     default_auto_field = 'django.db.models.BigAutoField' #Sets the default auto field to BigAutoField
     name = 'products' #Sets the name of the app
+
+    def ready(self):
+        from . import search, autocomplete, facets, card_cache  # noqa: F401 - connects the index and cache signals
+        from revforge import slow_queries
+        slow_queries.install() #Only when SLOW_QUERY_LOG_MS is set
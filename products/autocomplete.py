@@ -0,0 +1,290 @@
+"""
+In-process prefix index for search-as-you-type suggestions.
+
+Every product name, SKU, brand, category and subcategory is stored in a
+sorted list under each of its word starts ("carbon brake pads", "brake
+pads", "pads"), so a prefix lookup is two bisects plus a short scan and
+never touches the database. Model signals keep the index of the current
+process up to date; other worker processes pick changes up when their copy
+is older than AUTOCOMPLETE_MAX_AGE seconds, rebuilt by one thread while the
+rest keep using the old copy.
+"""
+import bisect
+import heapq
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.urls import reverse
+
+MAX_CACHED_PREFIXES = 1024 #Number of prefix results kept between catalog changes
+HIGH_KEY = '\uffff' #Sorts after any real character
+
+
+def normalize(text):
+    # Lowercase and collapse whitespace so keys compare consistently
+    return ' '.join(str(text).lower().split())
+
+
+def word_starts(text):
+    """Return the text keyed from each of its words, e.g. 'a b c' -> ['a b c', 'b c', 'c']"""
+    words = normalize(text).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class SuggestionIndex:
+    """Sorted (key, kind, id) entries with popularity-ranked prefix lookups"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock() #Held by the one thread building a new snapshot
+        self._entries = [] #Sorted (key, kind, id) tuples
+        self._items = {} #(kind, id) -> suggestion details and its keys
+        self._cache = {} #prefix -> ranked suggestions
+        self.built_at = None #Monotonic time of the last full build
+
+    # Building
+
+    def build(self):
+        """Load every active catalog item from the database"""
+        items = {}
+        for item in _catalog_items():
+            items[(item['kind'], item['id'])] = item
+        entries = sorted((key, kind, pk) for (kind, pk), item in items.items() for key in item['keys'])
+        with self._lock:
+            self._items = items
+            self._entries = entries
+            self._cache = {}
+            self.built_at = time.monotonic()
+
+    def clear(self):
+        """Drop everything; the next lookup rebuilds from the database"""
+        with self._lock:
+            self._items = {}
+            self._entries = []
+            self._cache = {}
+            self.built_at = None
+
+    def ensure_fresh(self):
+        """
+        Build on first use and rebuild when older than the configured age.
+
+        Only one thread builds at a time. Before the first build the others
+        wait for it; an old index keeps answering them until the new one is
+        swapped in.
+        """
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None: #Built by the thread waited for
+                    self.build()
+        elif self._stale() and self._build_lock.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self.build()
+            finally:
+                self._build_lock.release()
+
+    def _stale(self):
+        max_age = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 300)
+        built_at = self.built_at #May be cleared meanwhile
+        return bool(max_age) and built_at is not None and time.monotonic() - built_at > max_age
+
+    # Incremental updates
+
+    def remove(self, kind, pk):
+        with self._lock:
+            item = self._items.pop((kind, pk), None)
+            if item is None:
+                return
+            for key in item['keys']:
+                position = bisect.bisect_left(self._entries, (key, kind, pk))
+                if position < len(self._entries) and self._entries[position] == (key, kind, pk):
+                    del self._entries[position]
+            self._cache = {}
+
+    def put(self, item):
+        """Insert or replace one item"""
+        with self._lock:
+            self.remove(item['kind'], item['id'])
+            self._items[(item['kind'], item['id'])] = item
+            for key in item['keys']:
+                bisect.insort(self._entries, (key, item['kind'], item['id']))
+            self._cache = {}
+
+    def refresh(self, pks):
+        """Reload some products from the database, for changes made with update()"""
+        if self.built_at is None:
+            return
+        from orders.models import OrderItem
+        from users.models import Wishlist
+        from .models import Product
+        wishlists = dict(Wishlist.objects.filter(product__in=pks).order_by().values_list('product').annotate(total=Count('id')))
+        sold = dict(OrderItem.objects.filter(product__in=pks).order_by().values_list('product').annotate(total=Sum('quantity')))
+        found = set()
+        for product in Product.objects.filter(id__in=pks).only('id', 'name', 'slug', 'sku', 'rating_count', 'is_active', 'is_bestseller', 'is_featured'):
+            found.add(product.pk)
+            if product.is_active:
+                self.put(_product_item(product, wishlists.get(product.pk, 0), sold.get(product.pk, 0)))
+            else:
+                self.remove('product', product.pk)
+        for pk in set(pks) - found:
+            self.remove('product', pk) #Deleted meanwhile
+
+    # Lookups
+
+    def suggest(self, query, limit=8):
+        """Return up to limit suggestions whose key starts with query, most popular first"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        suggestions = self._cache.get(prefix)
+        if suggestions is None:
+            with self._lock:
+                start = bisect.bisect_left(self._entries, (prefix,))
+                end = bisect.bisect_left(self._entries, (prefix + HIGH_KEY,), lo=start)
+                matches = {(kind, pk) for _, kind, pk in self._entries[start:end]} #One hit per item
+                ranked = heapq.nlargest(
+                    max_results(),
+                    matches,
+                    key=lambda ref: (self._items[ref]['popularity'], -len(self._items[ref]['label'])),
+                )
+                suggestions = [self._as_suggestion(self._items[ref]) for ref in ranked]
+                if len(self._cache) >= MAX_CACHED_PREFIXES:
+                    self._cache.clear()
+                self._cache[prefix] = suggestions
+        return suggestions[:limit]
+
+    def _as_suggestion(self, item):
+        return {
+            'label': item['label'],
+            'type': item['kind'],
+            'url': reverse(item['url_name'], kwargs=item['url_kwargs']),
+        }
+
+    def __len__(self):
+        return len(self._items)
+
+
+def max_results():
+    """Largest number of suggestions a client may ask for"""
+    return getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 20)
+
+
+def _product_item(product, wishlists=0, sold=0):
+    # Products rank by ratings, wishlists, units sold and merchandising flags
+    keys = set(word_starts(product.name))
+    if product.sku:
+        keys.add(normalize(product.sku)) #SKUs match from their first character only
+    return {
+        'kind': 'product',
+        'id': product.id,
+        'label': product.name,
+        'keys': sorted(keys),
+        'popularity': product.rating_count + wishlists + sold + 5 * product.is_bestseller + 3 * product.is_featured,
+        'url_name': 'products:product_detail',
+        'url_kwargs': {'slug': product.slug},
+    }
+
+
+def _group_item(kind, obj, product_count, url_name, url_kwargs):
+    # Brands and categories rank by how many active products they hold
+    return {
+        'kind': kind,
+        'id': obj.id,
+        'label': obj.name,
+        'keys': word_starts(obj.name),
+        'popularity': product_count,
+        'url_name': url_name,
+        'url_kwargs': url_kwargs,
+    }
+
+
+def _catalog_items():
+    # One query per item type plus two grouped popularity queries
+    from orders.models import OrderItem
+    from users.models import Wishlist
+    from .models import Brand, Category, Product, SubCategory
+
+    wishlists = dict(Wishlist.objects.order_by().values_list('product').annotate(total=Count('id'))) #Wishlists per product
+    sold = dict(OrderItem.objects.order_by().values_list('product').annotate(total=Sum('quantity'))) #Units sold per product
+    products = Product.objects.filter(is_active=True).only('id', 'name', 'slug', 'sku', 'rating_count', 'is_bestseller', 'is_featured')
+    for product in products.iterator(chunk_size=2000):
+        yield _product_item(product, wishlists.get(product.id, 0), sold.get(product.id, 0))
+
+    active_products = Count('products', filter=Q(products__is_active=True)) #Counts only active products
+    for brand in Brand.objects.filter(is_active=True).annotate(total=active_products):
+        yield _group_item('brand', brand, brand.total, 'products:brand_detail', {'slug': brand.slug})
+    for category in Category.objects.filter(is_active=True).annotate(total=active_products):
+        yield _group_item('category', category, category.total, 'products:category_detail', {'slug': category.slug})
+    subcategories = SubCategory.objects.filter(is_active=True).select_related('category').annotate(total=active_products)
+    for subcategory in subcategories:
+        yield _group_item('subcategory', subcategory, subcategory.total, 'products:subcategory_detail', {
+            'category_slug': subcategory.category.slug,
+            'subcategory_slug': subcategory.slug,
+        })
+
+
+suggestion_index = SuggestionIndex() #Process-wide index
+
+
+def warm_up():
+    """Build the index at server startup; skipped if the database is not ready yet"""
+    try:
+        suggestion_index.build()
+    except DatabaseError:
+        pass #Built on first use instead
+
+
+# Keep this process's index in step with catalog changes, once they are committed:
+# on_commit() runs the update at once outside a transaction and drops it on a rollback
+@receiver(post_save, sender='products.Product')
+def refresh_product_suggestion(sender, instance, raw=False, **kwargs):
+    if raw or suggestion_index.built_at is None:
+        return #Nothing to refresh until the index is built
+    pk = instance.pk
+    transaction.on_commit(lambda: suggestion_index.refresh([pk])) #Read back as committed, with its wishlist and sales counts
+
+
+@receiver(post_delete, sender='products.Product')
+def drop_product_suggestion(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggestion_index.remove('product', pk))
+
+
+def _refresh_group(model, pk):
+    """Read a brand, category or subcategory back from the database and put or drop its suggestion"""
+    if suggestion_index.built_at is None:
+        return
+    kind = model._meta.model_name
+    group = model.objects.filter(pk=pk).first()
+    if group is None or not group.is_active:
+        suggestion_index.remove(kind, pk)
+        return
+    if kind == 'subcategory':
+        url_name = 'products:subcategory_detail'
+        url_kwargs = {'category_slug': group.category.slug, 'subcategory_slug': group.slug}
+    else:
+        url_name = f'products:{kind}_detail'
+        url_kwargs = {'slug': group.slug}
+    suggestion_index.put(_group_item(kind, group, group.products.filter(is_active=True).count(), url_name, url_kwargs))
+
+
+@receiver(post_save, sender='products.Brand')
+@receiver(post_save, sender='products.Category')
+@receiver(post_save, sender='products.SubCategory')
+def refresh_group_suggestion(sender, instance, raw=False, **kwargs):
+    if raw or suggestion_index.built_at is None:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: _refresh_group(sender, pk))
+
+
+@receiver(post_delete, sender='products.Brand')
+@receiver(post_delete, sender='products.Category')
+@receiver(post_delete, sender='products.SubCategory')
+def drop_group_suggestion(sender, instance, **kwargs):
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: suggestion_index.remove(kind, pk))
@@ -0,0 +1,94 @@
+"""
+Fragment cache for rendered product cards.
+
+The parts of products/_product_card.html that are the same for every
+visitor (image, badges, name, brand, category, rating, price and stock)
+are cached per product. Each cached entry carries the version stamps of
+its product, brand and category; signals replace a stamp whenever one of
+them (or a rating) changes, so stale cards are simply never matched again.
+The wishlist heart and the cart form depend on the visitor and stay out of
+the cache.
+
+The cache alias is CARD_CACHE_ALIAS ('cards'). Local memory is fine for
+tests and a single process; with several workers use a shared backend
+(FileBasedCache or RedisCache) so invalidation reaches all of them.
+"""
+import uuid
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+CARD_TEMPLATES = ('products/_product_card_image.html', 'products/_product_card_info.html')
+
+RenderedCard = namedtuple('RenderedCard', ['image', 'info']) #Cacheable HTML of the two card sections
+
+
+def card_cache():
+    """Return the cache backend that holds rendered cards"""
+    alias = getattr(settings, 'CARD_CACHE_ALIAS', 'cards')
+    return caches[alias if alias in settings.CACHES else 'default']
+
+
+def version_key(kind, pk):
+    return f'card-version:{kind}:{pk}'
+
+
+def invalidate(kind, pk):
+    """Give a product, brand or category a new version stamp, retiring every card that used the old one"""
+    card_cache().set(version_key(kind, pk), uuid.uuid4().hex, None)
+    if connection.in_atomic_block:
+        # Stamp again on commit, so a card rendered from the old rows meanwhile is retired too
+        transaction.on_commit(lambda: card_cache().set(version_key(kind, pk), uuid.uuid4().hex, None))
+
+
+def render_card(product):
+    """Return the cacheable sections of a card, rendering them only when the cache has no current copy"""
+    cache = card_cache()
+    html_key = f'card:{product.pk}'
+    version_keys = [
+        version_key('product', product.pk),
+        version_key('brand', product.brand_id),
+        version_key('category', product.category_id),
+    ]
+    found = cache.get_many([html_key, *version_keys]) #One round trip for the card and its stamps
+
+    new_stamps = {key: uuid.uuid4().hex for key in version_keys if key not in found} #Evicted or never set
+    if new_stamps:
+        cache.set_many(new_stamps, None)
+    stamp = tuple(found.get(key) or new_stamps[key] for key in version_keys)
+
+    cached = found.get(html_key)
+    if cached is not None and cached[0] == stamp:
+        return RenderedCard(*cached[1:])
+    card = RenderedCard(*(render_to_string(template, {'product': product}) for template in CARD_TEMPLATES))
+    cache.set(html_key, (stamp, *card), getattr(settings, 'CARD_CACHE_TIMEOUT', 86400))
+    return card
+
+
+# Retire cached cards when what they show changes
+@receiver(post_save, sender='products.Product')
+@receiver(post_delete, sender='products.Product')
+def invalidate_product_card(sender, instance, **kwargs):
+    invalidate('product', instance.pk)
+
+
+@receiver(post_save, sender='products.Brand')
+@receiver(post_delete, sender='products.Brand')
+def invalidate_brand_cards(sender, instance, **kwargs):
+    invalidate('brand', instance.pk)
+
+
+@receiver(post_save, sender='products.Category')
+@receiver(post_delete, sender='products.Category')
+def invalidate_category_cards(sender, instance, **kwargs):
+    invalidate('category', instance.pk)
+
+
+@receiver(post_save, sender='products.ProductRating')
+@receiver(post_delete, sender='products.ProductRating')
+def invalidate_rated_product_card(sender, instance, **kwargs):
+    invalidate('product', instance.product_id)
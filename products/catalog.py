@@ -0,0 +1,350 @@
+"""
+Streaming catalog import and export in CSV or JSON Lines.
+
+Rows are read and written one at a time, so files of any size run in
+constant memory. The importer works in chunks: every column of a chunk is
+checked with the revforge.validators rules in one pass, brands, categories
+and subcategories are resolved by slug through caches that query only for
+slugs not seen before, and the chunk is written with one bulk_create and
+one bulk_update per set of columns, in its own transaction. Products are
+matched on SKU; rows without one get the next SKU of their prefix.
+
+Bulk writes skip save() and its signals, so the importer refreshes the
+search index and the card cache itself. Vendor, images and ratings are not
+part of the file format.
+"""
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from revforge.validators import (
+    validate_price, validate_product_description, validate_product_name, validate_sku, validate_stock_quantity,
+)
+from . import card_cache, search
+from .autocomplete import suggestion_index
+from .facets import facet_index
+from .models import Brand, Category, Product, SubCategory
+
+FORMATS = ('csv', 'jsonl')
+
+# Columns of the file format. brand, category and subcategory hold slugs; a subcategory that
+# belongs to another category than the product is written as category-slug/subcategory-slug
+COLUMNS = (
+    'sku', 'name', 'brand', 'category', 'subcategory', 'price', 'discount_percentage', 'stock_quantity',
+    'min_stock_level', 'description', 'features', 'is_active', 'is_featured', 'is_bestseller',
+    'is_authentic_f1_part', 'meta_title', 'meta_description', 'keywords',
+)
+REQUIRED_COLUMNS = ('name', 'brand', 'category', 'subcategory', 'price', 'description') #Needed to create a product
+TEXT_COLUMNS = {'features', 'meta_title', 'meta_description', 'keywords'} #An empty cell clears these
+EXPORT_LOOKUPS = {'brand': 'brand__slug', 'category': 'category__slug', 'subcategory': 'subcategory__slug'}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+def detect_format(path, format=None):
+    """Return 'csv' or 'jsonl' from the explicit format or the file extension"""
+    if format:
+        return format
+    if str(path).lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, format):
+    """Yield (line number, row dict) from a CSV or JSON Lines stream"""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            row.pop(None, None) #Cells past the header
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = {'errors': f'invalid JSON: {error}'}
+        yield line_number, row if isinstance(row, dict) else {'errors': 'not a JSON object'}
+
+
+class RowWriter:
+    """Write row dicts as CSV (header taken from the first row unless given) or JSON Lines"""
+
+    def __init__(self, stream, format, fieldnames=None):
+        self.stream = stream
+        self.format = format
+        self.fieldnames = fieldnames
+        self._csv = None
+        self.count = 0
+        if format == 'csv' and fieldnames:
+            self._start(fieldnames) #The header is written even when no row follows
+
+    def _start(self, fieldnames):
+        self._csv = csv.DictWriter(self.stream, fieldnames=fieldnames, extrasaction='ignore')
+        self._csv.writeheader()
+
+    def write(self, row):
+        if self.format == 'jsonl':
+            self.stream.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+        else:
+            if self._csv is None:
+                self._start(list(row))
+            self._csv.writerow(row)
+        self.count += 1
+
+
+# Column checks: each takes the raw cell and returns the clean value or raises
+
+def _text(max_length):
+    def check(value):
+        value = str(value).strip()
+        if len(value) > max_length:
+            raise ValidationError(f'cannot exceed {max_length} characters.')
+        return value
+    return check
+
+
+def _slug(value):
+    return str(value).strip().lower()
+
+
+def _decimal(validator):
+    def check(value):
+        try:
+            return validator(Decimal(str(value).strip()))
+        except InvalidOperation:
+            raise ValidationError(f'{value!r} is not a number.')
+    return check
+
+
+def _integer(minimum, maximum, validator=None):
+    def check(value):
+        try:
+            number = int(str(value).strip())
+        except ValueError:
+            raise ValidationError(f'{value!r} is not a whole number.')
+        if validator:
+            return validator(number)
+        if not minimum <= number <= maximum:
+            raise ValidationError(f'must be between {minimum} and {maximum}.')
+        return number
+    return check
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValidationError(f'{value!r} is not true or false.')
+
+
+CHECKS = {
+    'sku': lambda value: validate_sku(str(value)),
+    'name': validate_product_name,
+    'brand': _slug,
+    'category': _slug,
+    'subcategory': _slug,
+    'price': _decimal(validate_price),
+    'discount_percentage': _integer(0, 100),
+    'stock_quantity': _integer(0, 999999, validate_stock_quantity),
+    'min_stock_level': _integer(1, 1000),
+    'description': validate_product_description,
+    'features': _text(2000),
+    'is_active': _boolean,
+    'is_featured': _boolean,
+    'is_bestseller': _boolean,
+    'is_authentic_f1_part': _boolean,
+    'meta_title': _text(200),
+    'meta_description': _text(1000),
+    'keywords': _text(500),
+}
+
+
+class SlugCache:
+    """Slug -> object lookups that query only for slugs not seen before"""
+
+    def __init__(self, queryset, key_fields=('slug',)):
+        self.queryset = queryset
+        self.key_fields = key_fields #Fields that make up the key, e.g. ('category__slug', 'slug')
+        self.objects = {} #key -> object, or None for a slug that does not exist
+
+    def _key(self, obj):
+        values = []
+        for field in self.key_fields:
+            value = obj
+            for part in field.split('__'): #Follows category__slug through the related object
+                value = getattr(value, part)
+            values.append(value)
+        return tuple(values) if len(values) > 1 else values[0]
+
+    def load(self, keys):
+        """Fetch every key not looked up yet, in one query"""
+        missing = {key for key in keys if key not in self.objects}
+        if not missing:
+            return
+        if len(self.key_fields) == 1:
+            found = self.queryset.filter(**{f'{self.key_fields[0]}__in': missing})
+        else:
+            found = self.queryset.filter(**{
+                f'{field}__in': {key[position] for key in missing} for position, field in enumerate(self.key_fields)
+            })
+        for obj in found:
+            self.objects[self._key(obj)] = obj
+        for key in missing:
+            self.objects.setdefault(key, None)
+
+    def get(self, key):
+        return self.objects.get(key)
+
+
+class CatalogImporter:
+    """Import rows in chunks, reporting rejected rows to rejects (a RowWriter) and counts to progress"""
+
+    def __init__(self, chunk_size=1000, rejects=None, progress=None):
+        self.chunk_size = chunk_size
+        self.rejects = rejects
+        self.progress = progress
+        self.stats = {'read': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+        self.brands = SlugCache(Brand.objects.only('id', 'name', 'slug'))
+        self.categories = SlugCache(Category.objects.only('id', 'name', 'slug'))
+        self.subcategories = SlugCache(
+            SubCategory.objects.select_related('category').only('id', 'slug', 'category__slug'),
+            key_fields=('category__slug', 'slug'),
+        )
+
+    def run(self, rows):
+        """Import (line number, row) pairs; returns the stats"""
+        chunk = []
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        suggestion_index.clear() #Rebuilt from the database on the next lookup
+        facet_index.clear()
+        return self.stats
+
+    def clean(self, chunk):
+        """Check the chunk column by column; returns the cleaned values and the errors of each row"""
+        cleaned = [{} for _ in chunk]
+        errors = defaultdict(list)
+        for index, (_, row) in enumerate(chunk):
+            if 'errors' in row and set(row) == {'errors'}:
+                errors[index].append(row['errors']) #Unreadable line
+        for column, check in CHECKS.items():
+            for index, (_, row) in enumerate(chunk):
+                value = row.get(column)
+                if value is None or (value == '' and column not in TEXT_COLUMNS):
+                    continue #Not given: keep the current value or the default
+                try:
+                    cleaned[index][column] = check(value)
+                except ValidationError as error:
+                    errors[index].append(f"{column}: {' '.join(error.messages)}")
+        self.resolve(cleaned, errors)
+        return cleaned, errors
+
+    def resolve(self, cleaned, errors):
+        # Turn brand, category and subcategory slugs into objects, one query per batch of unseen slugs.
+        # Subcategory slugs are only unique within a category, so they are looked up by (category slug, slug).
+        self.brands.load(values['brand'] for values in cleaned if 'brand' in values)
+        self.categories.load(values['category'] for values in cleaned if 'category' in values)
+        for values in cleaned:
+            if '/' in values.get('subcategory', ''):
+                values['subcategory'] = tuple(values['subcategory'].split('/', 1)) #Qualified with its own category
+            elif 'subcategory' in values and 'category' in values:
+                values['subcategory'] = (values['category'], values['subcategory'])
+        self.subcategories.load(values['subcategory'] for values in cleaned if isinstance(values.get('subcategory'), tuple))
+        for index, values in enumerate(cleaned):
+            if 'subcategory' in values:
+                if not isinstance(values['subcategory'], tuple):
+                    errors[index].append('subcategory: needs the category column too.')
+                    continue
+                values['subcategory'] = self.subcategories.get(values['subcategory']) or '/'.join(values['subcategory'])
+            for column, cache in (('brand', self.brands), ('category', self.categories)):
+                if column in values:
+                    values[column] = cache.get(values[column]) or values[column]
+            for column in ('brand', 'category', 'subcategory'):
+                if isinstance(values.get(column), str):
+                    errors[index].append(f'{column}: no {column} with slug {values[column]!r}.')
+
+    def import_chunk(self, chunk):
+        cleaned, errors = self.clean(chunk)
+        skus = [values['sku'] for index, values in enumerate(cleaned) if 'sku' in values and index not in errors]
+        existing = {product.sku: product for product in Product.objects.filter(sku__in=skus)}
+
+        to_create, to_update, seen = [], defaultdict(list), set()
+        for index, values in enumerate(cleaned):
+            if index in errors:
+                continue
+            sku = values.get('sku')
+            if sku and sku in seen:
+                errors[index].append('sku: appears twice in the same chunk.')
+                continue
+            seen.add(sku)
+            product = existing.get(sku)
+            if product is None:
+                missing = [column for column in REQUIRED_COLUMNS if column not in values]
+                if missing:
+                    errors[index].append(f"missing {', '.join(missing)}.")
+                    continue
+                product = Product()
+                to_create.append(product)
+            else:
+                fields = tuple(sorted(set(values) - {'sku'}))
+                to_update[fields].append(product) #bulk_update needs the same fields for every row
+            for column, value in values.items():
+                setattr(product, column, value)
+            product.fill_derived_fields()
+
+        now = timezone.now()
+        with transaction.atomic():
+            Product.allocate_skus(to_create) #Moves the counters past the given SKUs, then one reservation per prefix
+            Product.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            for fields, products in to_update.items():
+                for product in products:
+                    product.updated_at = now #bulk_update skips auto_now
+                Product.objects.bulk_update(products, [*fields, 'sale_price', 'effective_price', 'updated_at'], batch_size=self.chunk_size)
+
+        # Bulk writes send no signals; refresh what save() would have refreshed
+        written = [product.sku for product in to_create] + [p.sku for products in to_update.values() for p in products]
+        if written:
+            search.index_products(Product.objects.filter(sku__in=written))
+        for products in to_update.values():
+            for product in products:
+                card_cache.invalidate('product', product.pk)
+
+        for index, messages in sorted(errors.items()):
+            line_number, row = chunk[index]
+            if self.rejects is not None:
+                self.rejects.write({**row, 'line': line_number, 'errors': ' '.join(messages)})
+        self.stats['read'] += len(chunk)
+        self.stats['created'] += len(to_create)
+        self.stats['updated'] += sum(len(products) for products in to_update.values())
+        self.stats['rejected'] += len(errors)
+        if self.progress:
+            self.progress(self.stats)
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield a row dict per product in the import format, streaming from the database"""
+    queryset = Product.objects.all() if queryset is None else queryset
+    lookups = [EXPORT_LOOKUPS.get(column, column) for column in COLUMNS] + ['subcategory__category__slug']
+    for values in queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=chunk_size):
+        row = {
+            column: str(value) if isinstance(value, Decimal) else value
+            for column, value in zip(COLUMNS, values)
+        }
+        if values[-1] != row['category']:
+            row['subcategory'] = f"{values[-1]}/{row['subcategory']}"
+        yield row
@@ -0,0 +1,545 @@
+"""
+In-process columnar index of the catalog behind the product list.
+
+Every active product gets a position, and every facet value (a brand, a
+category, a price band, the featured flag, ...) a bitset of the positions
+holding it, kept as a Python int. A selection ORs the bitsets of the values
+picked within a facet and ANDs the facets together; the count shown next to
+a value is the popcount of its bitset ANDed with the selection of every
+other facet, so all counts come from memory however the filters combine.
+
+The columns the list sorts by are kept too, with the positions of each in
+sorted order, so a filtered, sorted page is found without SQL and only its
+rows are read from the database, by id.
+
+The index is built from one query over the active products plus one per
+facet label table. Product and rating signals patch the changed product in
+place, brand and category changes drop the index to be rebuilt on next use,
+and other worker processes rebuild when their copy is older than
+FACET_INDEX_MAX_AGE seconds: one thread builds the new snapshot while the
+rest keep reading the old one. differences() checks it against the database
+(see the check_facet_index command).
+"""
+import bisect
+import math
+import threading
+import time
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+PRICE_BANDS = ( #(low, high) bounds of effective_price, high excluded; None is open-ended
+    (Decimal('0'), Decimal('50')),
+    (Decimal('50'), Decimal('100')),
+    (Decimal('100'), Decimal('250')),
+    (Decimal('250'), Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), None),
+)
+STOCK_LEVELS = (('in_stock', 'In stock'), ('low_stock', 'Low stock'), ('out_of_stock', 'Out of stock'))
+
+FACETS = ( #(query parameter, title), in display order
+    ('category', 'Category'),
+    ('subcategory', 'Subcategory'),
+    ('brand', 'Brand'),
+    ('price_band', 'Price'),
+    ('stock', 'Availability'),
+    ('on_sale', 'Offers'),
+    ('authentic', 'Authenticity'),
+    ('featured', 'Featured'),
+    ('bestseller', 'Bestsellers'),
+)
+FACET_NAMES = tuple(name for name, _ in FACETS)
+FLAG_FACETS = {'on_sale': 'On sale', 'authentic': 'Authentic F1 part', 'featured': 'Featured', 'bestseller': 'Bestseller'} #Single-value facets, selected with =1
+
+SORT_COLUMNS = ('name', 'effective_price', 'rating_avg', 'rating_score', 'created_at') #Columns kept in sorted order, one per product list sort
+SPARSE = 8 #Selections holding under 1/SPARSE of the catalog are sorted directly instead of walked in order
+
+Row = namedtuple('Row', (
+    'id', 'category_id', 'subcategory_id', 'brand_id', 'price', 'effective_price', 'stock_quantity', 'min_stock_level',
+    'is_authentic_f1_part', 'is_featured', 'is_bestseller', 'name', 'rating_avg', 'rating_score', 'created_at',
+))
+
+def band_value(low, high):
+    return f'{low:f}-{high:f}' if high is not None else f'{low:f}-'
+
+
+def band_label(low, high):
+    return f'${low:,.0f} – ${high:,.0f}' if high is not None else f'${low:,.0f}+'
+
+
+BAND_VALUES = {band_value(low, high): (low, high) for low, high in PRICE_BANDS}
+
+
+def price_band(price):
+    """Value of the price band holding price"""
+    for low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return band_value(low, high)
+    return None #Negative prices fall in no band
+
+
+def stock_level(quantity, min_level):
+    # Same rules as Product.stock_status
+    if quantity == 0:
+        return 'out_of_stock'
+    if quantity <= min_level:
+        return 'low_stock'
+    return 'in_stock'
+
+
+def parse_selection(params):
+    """The facet values picked in a query dict, {facet: [values]}; unknown bands, levels and flags are dropped"""
+    selection = {}
+    for name in FACET_NAMES:
+        values = [value for value in params.getlist(name) if value]
+        if name == 'price_band':
+            values = [value for value in values if value in BAND_VALUES]
+        elif name == 'stock':
+            values = [value for value in values if value in dict(STOCK_LEVELS)]
+        elif name in FLAG_FACETS:
+            values = ['1'] if '1' in values else []
+        if values:
+            selection[name] = list(dict.fromkeys(values)) #Drops repeats, keeps the order
+    return selection
+
+
+def selection_filter(selection):
+    """The Q matching the same products as the selection, for the listing query"""
+    condition = Q()
+    if 'category' in selection:
+        condition &= Q(category__slug__in=selection['category'])
+    if 'subcategory' in selection:
+        condition &= Q(subcategory__slug__in=selection['subcategory'])
+    if 'brand' in selection:
+        condition &= Q(brand__slug__in=selection['brand'])
+    if 'price_band' in selection:
+        bands = Q()
+        for value in selection['price_band']:
+            low, high = BAND_VALUES[value]
+            bands |= Q(effective_price__gte=low) & (Q(effective_price__lt=high) if high is not None else Q())
+        condition &= bands
+    if 'stock' in selection:
+        levels = {
+            'out_of_stock': Q(stock_quantity=0),
+            'low_stock': Q(stock_quantity__gt=0, stock_quantity__lte=F('min_stock_level')),
+            'in_stock': Q(stock_quantity__gt=0) & Q(stock_quantity__gt=F('min_stock_level')),
+        }
+        stock = Q()
+        for value in selection['stock']:
+            stock |= levels[value]
+        condition &= stock
+    if 'on_sale' in selection:
+        condition &= Q(effective_price__lt=F('price'))
+    if 'authentic' in selection:
+        condition &= Q(is_authentic_f1_part=True)
+    if 'featured' in selection:
+        condition &= Q(is_featured=True)
+    if 'bestseller' in selection:
+        condition &= Q(is_bestseller=True)
+    return condition
+
+
+def _bitset(positions, size):
+    # Set the bits in a bytearray first; ORing one bit at a time into an int copies the whole int every time
+    buffer = bytearray((size >> 3) + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _members(bits):
+    """Positions of the set bits, in increasing order"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield (index << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+def sort_key(value, pk):
+    # NULLs first, then the value, then the id: the ascending order SQLite gives for F(field).asc(nulls_first=True), 'id'
+    return (value is not None, value, pk)
+
+
+class FacetIndex:
+    """Columnar snapshot of the active products: facet bitsets, sort orders, counts and pages for any selection"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock() #Held by the one thread building a new snapshot
+        self._reset()
+
+    def _reset(self):
+        self._positions = {} #product id -> bit position
+        self._ids = [] #bit position -> product id, None once removed
+        self._all = 0 #Positions of the active products
+        self._bits = {name: {} for name in FACET_NAMES} #facet -> value -> bitset
+        self._columns = {field: [] for field in SORT_COLUMNS} #field -> value at each position
+        self._orders = {field: array('q') for field in SORT_COLUMNS} #field -> active positions in ascending sort_key order
+        self._slugs = {'category': {}, 'subcategory': {}, 'brand': {}} #facet -> id -> slug
+        self._labels = {'category': {}, 'subcategory': {}, 'brand': {}} #facet -> slug -> name
+        self._atomic = () #Transactions open when it was built
+        self.built_at = None #Monotonic time of the last full build
+
+    # Building
+
+    def build(self):
+        """Load every active product from the database"""
+        from .models import Brand, Category, Product, SubCategory
+        slugs, labels = {}, {}
+        for name, model in (('category', Category), ('subcategory', SubCategory), ('brand', Brand)):
+            rows = list(model.objects.values_list('id', 'slug', 'name'))
+            slugs[name] = {pk: slug for pk, slug, _ in rows}
+            labels[name] = {slug: label for _, slug, label in rows}
+        rows = [Row(*values) for values in Product.objects.filter(is_active=True).order_by('id').values_list(*Row._fields)]
+
+        members = {name: {} for name in FACET_NAMES} #facet -> value -> positions
+        for position, row in enumerate(rows):
+            for name, value in self._row_values(row, slugs):
+                members[name].setdefault(value, []).append(position)
+        size = len(rows)
+        ids = [row.id for row in rows]
+        bits = {name: {value: _bitset(positions, size) for value, positions in values.items()} for name, values in members.items()}
+        columns = {field: [getattr(row, field) for row in rows] for field in SORT_COLUMNS}
+        orders = {
+            field: array('q', sorted(range(size), key=lambda position, column=columns[field]: sort_key(column[position], ids[position])))
+            for field in SORT_COLUMNS
+        }
+        with self._lock:
+            self._positions = {pk: position for position, pk in enumerate(ids)}
+            self._ids = ids
+            self._all = (1 << size) - 1
+            self._bits = bits
+            self._columns = columns
+            self._orders = orders
+            self._slugs = slugs
+            self._labels = labels
+            self._atomic = tuple(connection.atomic_blocks)
+            self.built_at = time.monotonic()
+
+    def clear(self):
+        """Drop everything; the next lookup rebuilds from the database"""
+        with self._lock:
+            self._reset()
+
+    def ensure_fresh(self):
+        """
+        Build on first use and rebuild when older than the configured age.
+
+        Only one thread builds at a time. Without a usable index the others
+        wait for it; an index that is merely old keeps serving them until
+        the new snapshot is swapped in.
+        """
+        if self.built_at is None or not self._transaction_open():
+            with self._build_lock:
+                if self.built_at is None or not self._transaction_open(): #Built by the thread waited for
+                    self.build()
+        elif self._stale() and self._build_lock.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self.build()
+            finally:
+                self._build_lock.release()
+
+    def _stale(self):
+        max_age = getattr(settings, 'FACET_INDEX_MAX_AGE', 300)
+        built_at = self.built_at #May be cleared meanwhile
+        return bool(max_age) and built_at is not None and time.monotonic() - built_at > max_age
+
+    def _transaction_open(self):
+        # An index built from inside a transaction holds rows nobody else may ever see; it is only good while that transaction lasts (tests roll theirs back)
+        current = connection.atomic_blocks
+        return len(current) >= len(self._atomic) and all(built is open for built, open in zip(self._atomic, current))
+
+    @staticmethod
+    def _row_values(row, slugs):
+        """(facet, value) pairs of one product row"""
+        values = [
+            ('category', slugs['category'].get(row.category_id)),
+            ('subcategory', slugs['subcategory'].get(row.subcategory_id)),
+            ('brand', slugs['brand'].get(row.brand_id)),
+            ('price_band', price_band(row.effective_price)),
+            ('stock', stock_level(row.stock_quantity, row.min_stock_level)),
+        ]
+        for name, flag in (('on_sale', row.effective_price < row.price), ('authentic', row.is_authentic_f1_part),
+                           ('featured', row.is_featured), ('bestseller', row.is_bestseller)):
+            if flag:
+                values.append((name, '1'))
+        return [(name, value) for name, value in values if value is not None]
+
+    def _key(self, field):
+        column, ids = self._columns[field], self._ids
+        return lambda position: sort_key(column[position], ids[position])
+
+    # Incremental updates
+
+    def remove(self, pk):
+        with self._lock:
+            position = self._positions.pop(pk, None)
+            if position is None:
+                return
+            self._clear_position(position)
+            self._ids[position] = None
+
+    def _clear_position(self, position):
+        bit = 1 << position
+        self._all &= ~bit
+        for values in self._bits.values():
+            for value, bits in values.items():
+                if bits & bit:
+                    values[value] = bits & ~bit
+        for field, order in self._orders.items():
+            key = self._key(field)
+            index = bisect.bisect_left(order, key(position), key=key)
+            if index < len(order) and order[index] == position:
+                del order[index]
+
+    def put(self, product):
+        """Insert or replace one product from its saved instance"""
+        row = Row(*[getattr(product, field) for field in Row._fields])
+        row = row._replace(price=Decimal(str(row.price)), effective_price=Decimal(str(row.effective_price))) #As loaded, even when the instance was given strings
+        with self._lock:
+            position = self._positions.get(row.id)
+            if position is None:
+                position = self._positions[row.id] = len(self._ids)
+                self._ids.append(row.id)
+                for column in self._columns.values():
+                    column.append(None)
+            else:
+                self._clear_position(position)
+            bit = 1 << position
+            self._all |= bit
+            for name, value in self._row_values(row, self._slugs):
+                values = self._bits[name]
+                values[value] = values.get(value, 0) | bit
+            for field, order in self._orders.items():
+                self._columns[field][position] = getattr(row, field)
+                bisect.insort(order, position, key=self._key(field))
+
+    def refresh(self, pks):
+        """Reload some products from the database, for changes made with update()"""
+        if self.built_at is None:
+            return
+        from .models import Product
+        found = set()
+        for product in Product.objects.filter(id__in=pks).only(*Row._fields):
+            found.add(product.pk)
+            if product.is_active:
+                self.put(product)
+            else:
+                self.remove(product.pk)
+        for pk in set(pks) - found:
+            self.remove(pk) #Deleted meanwhile
+
+    # Lookups
+
+    def _facet_mask(self, name, values):
+        # OR of the picked values of one facet
+        mask = 0
+        for value in values:
+            mask |= self._bits[name].get(value, 0)
+        return mask
+
+    def price_mask(self, min_price=None, max_price=None):
+        """Positions with min_price <= effective_price <= max_price"""
+        with self._lock:
+            order, key = self._orders['effective_price'], self._key('effective_price')
+            start = 0 if min_price is None else bisect.bisect_left(order, (True, min_price), key=key)
+            end = len(order) if max_price is None else bisect.bisect_right(order, (True, max_price, math.inf), key=key)
+            return _bitset(order[start:end], len(self._ids))
+
+    def matching(self, selection, mask=None):
+        """Bitset of the products matching the whole selection, within mask if given"""
+        with self._lock:
+            result = self._all if mask is None else self._all & mask
+            for name, values in selection.items():
+                result &= self._facet_mask(name, values)
+            return result
+
+    def count(self, selection, mask=None):
+        return self.matching(selection, mask).bit_count()
+
+    def ordered(self, matching, field, descending=False, after=None, offset=0, limit=12):
+        """
+        Ids of up to limit products of the matching bitset in sort order, and whether more follow.
+
+        Starts after the sort_key() given as after, or skips offset matches.
+        A large selection walks the kept order until the page is full; a small
+        one is sorted on its own.
+        """
+        with self._lock:
+            key = self._key(field)
+            if matching.bit_count() * SPARSE < len(self._positions):
+                order, member = sorted(_members(matching), key=key), None
+            else:
+                order = self._orders[field]
+                data = matching.to_bytes((len(self._ids) >> 3) + 1, 'little')
+                member = lambda position: data[position >> 3] >> (position & 7) & 1
+            if descending:
+                end = len(order) if after is None else bisect.bisect_left(order, after, key=key)
+                indexes = range(end - 1, -1, -1)
+            else:
+                start = 0 if after is None else bisect.bisect_right(order, after, key=key)
+                indexes = range(start, len(order))
+            ids = []
+            for index in indexes:
+                position = order[index]
+                if member is not None and not member(position):
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                if len(ids) == limit:
+                    return ids, True
+                ids.append(self._ids[position])
+            return ids, False
+
+    def counts(self, selection, mask=None):
+        """{facet: {value: count}} for every value, each counted against the selection of the other facets"""
+        with self._lock:
+            base = self._all if mask is None else self._all & mask
+            masks = {name: self._facet_mask(name, values) for name, values in selection.items()}
+            result = {}
+            for name in FACET_NAMES:
+                others = base
+                for other, other_mask in masks.items():
+                    if other != name:
+                        others &= other_mask
+                result[name] = {value: (bits & others).bit_count() for value, bits in self._bits[name].items()}
+            return result
+
+    def facets(self, selection, mask=None):
+        """Facets for the template: title and options with label, count and whether picked; empty options are left out"""
+        counts = self.counts(selection, mask)
+        facets = []
+        for name, title in FACETS:
+            picked = selection.get(name, [])
+            if name == 'price_band':
+                choices = [(band_value(low, high), band_label(low, high)) for low, high in PRICE_BANDS]
+            elif name == 'stock':
+                choices = list(STOCK_LEVELS)
+            elif name in FLAG_FACETS:
+                choices = [('1', FLAG_FACETS[name])]
+            else:
+                labels = self._labels[name]
+                choices = sorted(((slug, labels.get(slug, slug)) for slug in set(counts[name]) | set(picked)), key=lambda choice: choice[1].lower())
+            options = [
+                {'value': value, 'label': label, 'count': counts[name].get(value, 0), 'selected': value in picked}
+                for value, label in choices
+            ]
+            options = [option for option in options if option['count'] or option['selected']]
+            if options:
+                facets.append({'name': name, 'title': title, 'options': options})
+        return facets
+
+    # Consistency
+
+    def differences(self):
+        """
+        Compare the index with the database; a list of (product id or None, problem).
+
+        Checks the products held, each facet value, the sort columns, the
+        order of every sort against ORDER BY and every facet count against
+        COUNT(*) with selection_filter(). Writes made while it runs may show up.
+        """
+        from .models import Product
+        fresh = FacetIndex()
+        fresh.build()
+        with self._lock:
+            live_ids = list(self._ids)
+            live_bits = {name: dict(values) for name, values in self._bits.items()}
+            live_columns = {field: list(column) for field, column in self._columns.items()}
+            live_orders = {field: [live_ids[position] for position in order] for field, order in self._orders.items()}
+            live_positions = dict(self._positions)
+            live_labels = self._labels
+
+        problems = []
+        missing = fresh._positions.keys() - live_positions.keys()
+        extra = live_positions.keys() - fresh._positions.keys()
+        problems += [(pk, 'active in the database but not in the index') for pk in sorted(missing)]
+        problems += [(pk, 'in the index but not active in the database') for pk in sorted(extra)]
+        for name in FACET_NAMES:
+            for value in sorted(live_bits[name].keys() | fresh._bits[name].keys()):
+                held = {live_ids[position] for position in _members(live_bits[name].get(value, 0))}
+                wanted = {fresh._ids[position] for position in _members(fresh._bits[name].get(value, 0))}
+                problems += [(pk, f'{name}={value} in the index only') for pk in sorted(held - wanted - extra)]
+                problems += [(pk, f'{name}={value} missing from the index') for pk in sorted(wanted - held - missing)]
+                count = Product.objects.filter(is_active=True).filter(selection_filter({name: [value]})).count()
+                if count != len(wanted):
+                    problems.append((None, f'{name}={value}: the index counts {len(wanted)}, the database {count}'))
+        for pk in sorted(live_positions.keys() & fresh._positions.keys()):
+            for field in SORT_COLUMNS:
+                held, stored = live_columns[field][live_positions[pk]], fresh._columns[field][fresh._positions[pk]]
+                if held != stored:
+                    problems.append((pk, f'{field} is {held!r} in the index, {stored!r} in the database'))
+        for field in SORT_COLUMNS:
+            database = list(Product.objects.filter(is_active=True).order_by(F(field).asc(nulls_first=True), 'id').values_list('id', flat=True))
+            for label, order in (('index', live_orders[field]), ('rebuilt index', [fresh._ids[p] for p in fresh._orders[field]])):
+                if order != database:
+                    at = next((i for i, (a, b) in enumerate(zip(order, database)) if a != b), min(len(order), len(database)))
+                    problems.append((None, f'{field} order of the {label} differs from the database from row {at}'))
+        for name in self._labels:
+            if live_labels[name] != fresh._labels[name]:
+                problems.append((None, f'{name} names or slugs changed since the index was built'))
+        return problems
+
+    def __len__(self):
+        return len(self._positions)
+
+
+facet_index = FacetIndex() #Process-wide index
+
+
+def warm_up():
+    """Build the index at server startup; skipped if the database is not ready yet"""
+    try:
+        facet_index.build()
+    except DatabaseError:
+        pass #Built on first use instead
+
+
+# Keep this process's index in step with catalog changes, once they are committed:
+# on_commit() runs the update at once outside a transaction and drops it on a rollback
+@receiver(post_save, sender='products.Product')
+def refresh_product_facets(sender, instance, raw=False, **kwargs):
+    if raw or facet_index.built_at is None:
+        return #Nothing to refresh until the index is built
+    pk = instance.pk
+    if connection.in_atomic_block or instance.get_deferred_fields() & set(Row._fields):
+        transaction.on_commit(lambda: facet_index.refresh([pk])) #Read back as committed, not as the instance is by then
+    elif instance.is_active:
+        facet_index.put(instance)
+    else:
+        facet_index.remove(pk)
+
+
+@receiver(post_delete, sender='products.Product')
+def drop_product_facets(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: facet_index.remove(pk))
+
+
+@receiver(post_save, sender='products.ProductRating')
+@receiver(post_delete, sender='products.ProductRating')
+def refresh_rating_facets(sender, instance, raw=False, **kwargs):
+    if not raw:
+        product_id = instance.product_id
+        transaction.on_commit(lambda: facet_index.refresh([product_id])) #The summary is written with update(); rating_avg and rating_score are sort columns
+
+
+@receiver(post_save, sender='products.Brand')
+@receiver(post_save, sender='products.Category')
+@receiver(post_save, sender='products.SubCategory')
+@receiver(post_delete, sender='products.Brand')
+@receiver(post_delete, sender='products.Category')
+@receiver(post_delete, sender='products.SubCategory')
+def drop_facets(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(facet_index.clear) #Slugs and names are rare to change; rebuilt on the next lookup
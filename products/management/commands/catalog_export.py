@@ -0,0 +1,39 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products import catalog
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Export the product catalog as CSV or JSON Lines, in the format catalog_import reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, or - for standard output')
+        parser.add_argument('--format', choices=catalog.FORMATS, help='File format (default: from the file extension, else csv)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+        parser.add_argument('--active-only', action='store_true', help='Leave out inactive products')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = catalog.detect_format(path, options['format'])
+        products = Product.objects.filter(is_active=True) if options['active_only'] else Product.objects.all()
+        try:
+            target = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(f'Cannot write {path}: {error}')
+
+        started = time.perf_counter()
+        writer = catalog.RowWriter(target, format, fieldnames=catalog.COLUMNS)
+        try:
+            for row in catalog.export_rows(products, chunk_size=options['chunk_size']):
+                writer.write(row)
+        finally:
+            if target is not sys.stdout:
+                target.close()
+
+        elapsed = time.perf_counter() - started
+        report = self.stderr if path == '-' else self.stdout #Keeps standard output clean for the data
+        report.write(self.style.SUCCESS(
+            f'Exported {writer.count} products in {elapsed:.2f}s ({writer.count / max(elapsed, 1e-9):.0f} rows/s).'
+        ))
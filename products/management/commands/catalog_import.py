@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products import catalog
+
+
+class Command(BaseCommand):
+    help = 'Import products from a CSV or JSON Lines file, updating products whose SKU already exists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input')
+        parser.add_argument('--format', choices=catalog.FORMATS, help='File format (default: from the file extension, else csv)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows checked and written per transaction')
+        parser.add_argument('--rejects', help='File for rejected rows and their errors (default: <path>.rejects.<format>)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = catalog.detect_format(path, options['format'])
+        rejects_path = options['rejects'] or (f'rejects.{format}' if path == '-' else f'{path}.rejects.{format}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        try:
+            source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+
+        started = time.perf_counter()
+
+        def progress(stats):
+            # One line per chunk with the running totals and throughput
+            if options['verbosity'] >= 1:
+                rate = stats['read'] / max(time.perf_counter() - started, 1e-9)
+                self.stdout.write(
+                    f"{stats['read']} rows: {stats['created']} created, {stats['updated']} updated, "
+                    f"{stats['rejected']} rejected ({rate:.0f} rows/s)"
+                )
+
+        with source, open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file:
+            rejects = catalog.RowWriter(rejects_file, format)
+            importer = catalog.CatalogImporter(chunk_size=options['chunk_size'], rejects=rejects, progress=progress)
+            stats = importer.run(catalog.read_rows(source, format))
+        if not rejects.count:
+            os.remove(rejects_path) #Nothing was rejected
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['created'] + stats['updated']} of {stats['read']} rows in {elapsed:.2f}s "
+            f"({stats['read'] / max(elapsed, 1e-9):.0f} rows/s)."
+        ))
+        if rejects.count:
+            self.stdout.write(self.style.WARNING(f'{rejects.count} rejected rows written to {rejects_path}.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.facets import facet_index
+
+
+class Command(BaseCommand):
+    help = 'Build the in-memory catalog index and check its facets, counts and sort orders against the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help='Number of problems to show')
+
+    def handle(self, *args, **options):
+        facet_index.build()
+        problems = facet_index.differences()
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(f'The index of {len(facet_index)} products matches the database.'))
+            return
+        for pk, problem in problems[:options['limit']]:
+            self.stdout.write(f'product {pk}: {problem}' if pk is not None else problem)
+        if len(problems) > options['limit']:
+            self.stdout.write(f"... and {len(problems) - options['limit']} more")
+        raise CommandError(f'{len(problems)} differences between the index and the database.')
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import RatingPrior
+
+
+class Command(BaseCommand):
+    help = 'Recompute the catalog rating prior and every product\'s rating score; run periodically, e.g. nightly'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            prior = RatingPrior.recompute()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rescored the catalog with a prior of {prior.mean:.3f} over {prior.weight:g} ratings in {elapsed:.2f}s.'
+        ))
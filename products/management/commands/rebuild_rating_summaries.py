@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the stored rating summary (average, count, star histogram) on every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report products whose summary is out of date')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of products written per UPDATE batch')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            stale = Product.objects.all().rebuild_ratings(dry_run=True)
+            self.stdout.write(f'{stale} products have an out of date rating summary.')
+            return
+
+        with transaction.atomic():
+            stale = Product.objects.all().rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Repaired the rating summary of {stale} products.'))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from products import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Compute the "recommended for you" products shown on product pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only recompute products edited, rated, ordered or wishlisted since the last run',
+        )
+        parser.add_argument('--since', help='With --incremental, an ISO datetime to use instead of the last run')
+        parser.add_argument('--products', type=int, nargs='+', help='Recompute only these product ids')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows written per INSERT batch')
+
+    def handle(self, *args, **options):
+        product_ids = options['products']
+        if options['incremental']:
+            since = parse_datetime(options['since']) if options['since'] else recommendations.last_computed_at()
+            if options['since'] and since is None:
+                raise CommandError(f"Invalid --since datetime: {options['since']}")
+            if since is not None and timezone.is_naive(since):
+                since = timezone.make_aware(since) #Reads a bare datetime in the site time zone
+            if since is not None: #Nothing computed yet means a full rebuild
+                product_ids = sorted(recommendations.stale_product_ids(since))
+                self.stdout.write(f'{len(product_ids)} products changed since {since.isoformat()}.')
+
+        started = time.perf_counter()
+        computed = recommendations.rebuild_recommendations(product_ids, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Computed recommendations for {computed} products in {elapsed:.2f}s.'))
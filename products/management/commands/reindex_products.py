@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the product catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of documents written per batch')
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            raise CommandError('This database has no search index. Run migrate first (SQLite needs FTS5).')
+        started = time.perf_counter()
+        indexed = search.rebuild_index(batch_size=options['batch_size']) #Rebuilds the index
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products in {elapsed:.2f}s.'))
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products import seed
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic, realistically skewed data set for benchmarks (appends to existing data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Products to add')
+        parser.add_argument('--users', type=int, help='Users to add (default: products / 10, at least 50)')
+        parser.add_argument('--vendors', type=int, help='How many of the new users are F1 team vendors (default: 1%%)')
+        parser.add_argument('--brands', type=int, help='Brands in the catalog, not counting F1 teams (default: 40)')
+        parser.add_argument('--categories', type=int, help='Categories in the catalog (default: 10)')
+        parser.add_argument('--subcategories', type=int, help='Subcategories per category (default: 6)')
+        parser.add_argument('--ratings', type=int, help='Ratings to add (default: 2 per product)')
+        parser.add_argument('--wishlists', type=int, help='Wishlist entries to add (default: 1 per 2 products)')
+        parser.add_argument('--carts', type=int, help='Carts to fill (default: 1 per 4 users)')
+        parser.add_argument('--orders', type=int, help='Orders to add (default: 1 per 5 products)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed and counts give the same data')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk_create batch')
+        parser.add_argument('--no-index', action='store_true', help='Skip the full-text search index (run reindex_products later)')
+
+    def handle(self, *args, **options):
+        if options['products'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--products cannot be negative and --batch-size must be at least 1.')
+        counts = {name: options[name] for name in seed.default_counts(0)}
+        log = self.stdout.write if options['verbosity'] >= 1 else None
+        started = time.perf_counter()
+        created = seed.seed(
+            options['products'], seed=options['seed'], batch_size=options['batch_size'],
+            index=not options['no_index'], log=log, **counts,
+        )
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{count} {name}' for name, count in created.items() if name != 'indexed')
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {elapsed:.1f}s.'))
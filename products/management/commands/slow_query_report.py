@@ -0,0 +1,75 @@
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from revforge.slow_queries import read_records
+
+SORTS = {
+    'total': lambda group: group['total'],
+    'count': lambda group: group['count'],
+    'max': lambda group: group['max'],
+    'avg': lambda group: group['total'] / group['count'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow-query log: the query fingerprints that took the most time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Log file (default SLOW_QUERY_LOG_FILE; its rotated files are read too)')
+        parser.add_argument('--top', type=int, default=20, help='Number of fingerprints to show')
+        parser.add_argument('--sort', choices=sorted(SORTS), default='total', help='Order by total, count, max or average time')
+        parser.add_argument('--since', help='Only records at or after this ISO datetime')
+        parser.add_argument('--view', help='Only queries run from views whose name contains this')
+        parser.add_argument('--plans', action='store_true', help='Show the latest EXPLAIN QUERY PLAN of each fingerprint')
+
+    def handle(self, *args, **options):
+        path = options['path'] or getattr(settings, 'SLOW_QUERY_LOG_FILE', None)
+        if not path:
+            raise CommandError('No log file given and SLOW_QUERY_LOG_FILE is not set.')
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since datetime: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since) #Reads a bare datetime in the site time zone
+
+        groups = {}
+        for record in read_records(path):
+            if since is not None and parse_datetime(record['time']) < since:
+                continue
+            if options['view'] and options['view'] not in (record.get('view') or ''):
+                continue
+            group = groups.get(record['fingerprint'])
+            if group is None:
+                group = groups[record['fingerprint']] = {'count': 0, 'total': 0.0, 'max': 0.0, 'callers': Counter(), 'views': Counter()}
+            group['count'] += 1
+            group['total'] += record['ms']
+            group['max'] = max(group['max'], record['ms'])
+            group['callers'][record.get('caller')] += 1
+            group['views'][record.get('view')] += 1
+            group['sql'] = record['sql']
+            group['plan'] = record.get('plan')
+
+        if not groups:
+            self.stdout.write('No slow queries logged.')
+            return
+        ranked = sorted(groups.items(), key=lambda item: SORTS[options['sort']](item[1]), reverse=True)
+        total = sum(group['total'] for group in groups.values())
+        self.stdout.write(f"{sum(group['count'] for group in groups.values())} slow queries, {len(groups)} fingerprints, {total:.0f}ms in total.\n")
+        for fingerprint, group in ranked[:options['top']]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{fingerprint}  {group['count']}x  total {group['total']:.0f}ms ({group['total'] / total:.0%})  "
+                f"avg {group['total'] / group['count']:.1f}ms  max {group['max']:.1f}ms"
+            ))
+            self.stdout.write(f"  {group['sql'][:300]}")
+            for caller, count in group['callers'].most_common(3):
+                self.stdout.write(f'  caller: {caller} ({count}x)')
+            for view, count in group['views'].most_common(3):
+                if view:
+                    self.stdout.write(f'  view: {view} ({count}x)')
+            if options['plans'] and group['plan']:
+                for line in group['plan']:
+                    self.stdout.write(f'  plan: {line}')
@@ -0,0 +1,75 @@
+from django.db import DatabaseError, migrations, transaction
+
+# The index as it was first created; kept here so later changes to products/search.py cannot change this migration
+
+DOCUMENTS = (  # One row per active product: id, name, brand, category, subcategory, description, keywords
+    'FROM products_product product '
+    'JOIN products_brand brand ON brand.id = product.brand_id '
+    'JOIN products_category category ON category.id = product.category_id '
+    'JOIN products_subcategory subcategory ON subcategory.id = product.subcategory_id '
+    'WHERE product.is_active'
+)
+
+CREATE = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_search USING fts5("
+        "name, brand, category, subcategory, description, keywords, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    ],
+    'postgresql': [
+        'CREATE TABLE IF NOT EXISTS products_search (product_id bigint PRIMARY KEY, document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS products_search_document_idx ON products_search USING GIN (document)',
+    ],
+}
+
+FILL = {
+    'sqlite': (
+        'INSERT INTO products_search (rowid, name, brand, category, subcategory, description, keywords) '
+        'SELECT product.id, product.name, brand.name, category.name, subcategory.name, product.description, product.keywords '
+        + DOCUMENTS
+    ),
+    'postgresql': (
+        'INSERT INTO products_search (product_id, document) '
+        "SELECT product.id, "
+        "setweight(to_tsvector('english', coalesce(product.name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(brand.name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(category.name, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(subcategory.name, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(product.description, '')), 'D') || "
+        "setweight(to_tsvector('english', coalesce(product.keywords, '')), 'C') "
+        + DOCUMENTS
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    # Create the full-text index table for this backend and fill it
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE:
+        return
+    with transaction.atomic(using=schema_editor.connection.alias), schema_editor.connection.cursor() as cursor:
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for statement in CREATE[vendor]:
+                    cursor.execute(statement)
+        except DatabaseError:
+            return  # SQLite built without FTS5, search keeps using the ORM fallback
+        cursor.execute(FILL[vendor])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in CREATE:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS products_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:56
+
+from django.db import migrations, models
+from django.db.models import Case, F, When
+
+
+def backfill_effective_price(apps, schema_editor):
+    # The same rule as Product.current_price, in one UPDATE
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(effective_price=Case(
+        When(sale_price__lt=F('price'), then=F('sale_price')),
+        default=F('price'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_product_listing_indexes'),
+        ('users', '0009_user_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['effective_price', 'id'], name='product_active_price_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Round
+
+
+def round_sale_prices(apps, schema_editor):
+    # Sale prices used to be stored unrounded (19.327), which sorts apart from what the ORM reads back (19.33)
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(sale_price__isnull=False).update(sale_price=Round(F('sale_price'), 2))
+    Product.objects.update(effective_price=Round(F('effective_price'), 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0023_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(round_sale_prices, migrations.RunPython.noop),
+    ]
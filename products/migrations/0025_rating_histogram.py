@@ -0,0 +1,90 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:19
+
+from collections import defaultdict
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+STAR_FIELDS = {5: 'five_star_count', 4: 'four_star_count', 3: 'three_star_count', 2: 'two_star_count', 1: 'one_star_count'}
+
+
+def merge_reviews(apps, schema_editor):
+    # The retired reviews app kept its own ratings; copy the ones the user has not also given here
+    connection = schema_editor.connection
+    if 'reviews_review' not in connection.introspection.table_names():
+        return
+    ProductRating = apps.get_model('products', 'ProductRating')
+    Product = apps.get_model('products', 'Product')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    ratings, products, users = (connection.ops.quote_name(model._meta.db_table) for model in (ProductRating, Product, User))
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {ratings} (product_id, user_id, rating, created_at)
+            SELECT review.product_id, review.user_id, review.rating, review.created_at
+            FROM reviews_review review
+            WHERE review.rating BETWEEN 1 AND 5
+              AND review.product_id IN (SELECT id FROM {products})
+              AND review.user_id IN (SELECT id FROM {users})
+              AND NOT EXISTS (
+                  SELECT 1 FROM {ratings} rating
+                  WHERE rating.product_id = review.product_id AND rating.user_id = review.user_id
+              )
+        """)
+
+
+def fill_rating_summaries(apps, schema_editor):
+    # Recompute every product's summary with its star histogram in one grouped query
+    Product = apps.get_model('products', 'Product')
+    ProductRating = apps.get_model('products', 'ProductRating')
+    histograms = defaultdict(dict)
+    for product_id, stars, count in ProductRating.objects.values_list('product', 'rating').annotate(count=Count('id')).order_by():
+        histograms[product_id][stars] = count
+    products = []
+    for product_id, histogram in histograms.items():
+        total = sum(stars * count for stars, count in histogram.items())
+        count = sum(histogram.values())
+        product = Product(pk=product_id, rating_sum=total, rating_count=count, rating_avg=total / count)
+        for stars, field in STAR_FIELDS.items():
+            setattr(product, field, histogram.get(stars, 0))
+        products.append(product)
+    Product.objects.bulk_update(
+        products, ['rating_sum', 'rating_count', 'rating_avg', *STAR_FIELDS.values()], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0024_round_sale_prices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='five_star_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='four_star_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='one_star_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='three_star_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='two_star_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(merge_reviews, migrations.RunPython.noop),
+        migrations.RunPython(fill_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+
+def score_products(apps, schema_editor):
+    # Store the catalog prior and score every rated product under it in one UPDATE
+    Product = apps.get_model('products', 'Product')
+    RatingPrior = apps.get_model('products', 'RatingPrior')
+    totals = Product.objects.aggregate(total=Sum('rating_sum'), count=Sum('rating_count'))
+    mean = totals['total'] / totals['count'] if totals['count'] else 3.0
+    weight = float(settings.RATING_SCORE_PRIOR_WEIGHT)
+    RatingPrior.objects.create(pk=1, mean=mean, weight=weight, computed_at=timezone.now())
+    Product.objects.filter(rating_count__gt=0).update( #Unrated products keep the default score of 0
+        rating_score=(Value(weight * mean) + Cast(F('rating_sum'), FloatField())) / (Value(weight) + Cast(F('rating_count'), FloatField())),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_rating_histogram'),
+        ('users', '0009_user_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField()),
+                ('weight', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['rating_score', 'id'], name='product_active_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'rating_score', 'id'], name='product_category_score_idx'),
+        ),
+        migrations.RunPython(score_products, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,17 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.utils.text import slugify
 from django.urls import reverse
 from django.conf import settings
 from django.core.exceptions import ValidationError
 import os
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import re
-import random
-import string
+from collections import defaultdict, namedtuple
 
 
 def validate_file_size(value): #Validates the file size
@@ -168,6 +171,227 @@ class Brand(models.Model):
         super().save(*args, **kwargs) #Saves the brand
 
 
+# Columns read by products/_product_card.html (plus created_at and effective_price for keyset cursors)
+CARD_FIELDS = (
+    'id', 'name', 'slug', 'main_image', 'price', 'sale_price', 'effective_price', 'stock_quantity', 'min_stock_level',
+    'is_authentic_f1_part', 'rating_count', 'rating_avg', 'created_at', 'brand__name', 'category__name',
+)
+
+
+STAR_FIELDS = { #Star histogram column of each rating value
+    5: 'five_star_count',
+    4: 'four_star_count',
+    3: 'three_star_count',
+    2: 'two_star_count',
+    1: 'one_star_count',
+}
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_avg', *STAR_FIELDS.values()) #The stored rating summary
+
+COUNTER_FIELDS = (*RATING_FIELDS, 'rating_score', 'stock_quantity') #Kept by single UPDATEs (rating writes, checkout); save() leaves them alone unless changed
+
+DEFAULT_PRIOR_MEAN = 3.0 #Catalog mean the rating score assumes until rebuild_rating_scores has run
+
+RatingSummary = namedtuple('RatingSummary', ['average', 'count', 'histogram']) #Product.rating_summary; histogram rows are (stars, count, percent)
+
+SKU_NUMBER = re.compile(r'^(?P<prefix>.+)-(?P<number>\d+)$') #A SKU ending in a number, e.g. BRA-CAT-0042
+
+
+class SkuCounter(models.Model):
+    # Last SKU number handed out for each prefix
+    prefix = models.CharField(max_length=40, unique=True) #BRA-CAT or VENDOR-BRA-CAT
+    last_number = models.PositiveIntegerField(default=0) #Last number used with the prefix
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_number}" #Returns the prefix and the last number
+
+    @classmethod
+    def reserve(cls, prefix, count=1, used=0):
+        """
+        Reserve count consecutive numbers of a prefix and return the first.
+
+        The counter row is bumped with a single UPDATE, so concurrent saves
+        and imports never get the same number and never need to retry. A
+        prefix's row is created on first use, starting after the highest
+        number its existing SKUs (or the not yet saved number used) carry.
+        """
+        with transaction.atomic(savepoint=False):
+            if not cls.objects.filter(prefix=prefix).update(last_number=F('last_number') + count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(prefix=prefix, last_number=max(cls.highest_used(prefix), used) + count) #First use of the prefix
+                except IntegrityError:
+                    cls.objects.filter(prefix=prefix).update(last_number=F('last_number') + count) #Another save created the row first
+            last_number = cls.objects.filter(prefix=prefix).values_list('last_number', flat=True).get()
+        return last_number - count + 1
+
+    @staticmethod
+    def highest_used(prefix):
+        """Highest number among the existing SKUs of a prefix"""
+        numbers = [0]
+        for sku in Product.objects.filter(sku__startswith=f"{prefix}-").values_list('sku', flat=True).iterator():
+            match = SKU_NUMBER.match(sku)
+            if match and match['prefix'] == prefix:
+                numbers.append(int(match['number']))
+        return max(numbers)
+
+    @classmethod
+    def claim(cls, sku):
+        """Move a prefix's counter past a SKU that was entered by hand"""
+        cls.claim_many([sku])
+
+    @classmethod
+    def claim_many(cls, skus):
+        """
+        Move the counters past SKUs given explicitly, e.g. in an import.
+
+        One conditional UPDATE per prefix raises its counter to the highest
+        of the numbers; returns {prefix: highest number} for reserve().
+        """
+        highest = {}
+        for sku in skus:
+            match = SKU_NUMBER.match(sku)
+            if match and len(match['number']) <= 9: #Longer numbers are not from a counter (and would not fit it)
+                highest[match['prefix']] = max(highest.get(match['prefix'], 0), int(match['number']))
+        for prefix, number in highest.items():
+            cls.objects.filter(prefix=prefix, last_number__lt=number).update(last_number=number)
+        return highest
+
+
+class RatingPrior(models.Model):
+    # Catalog-wide prior of the rating score; a single row, rewritten by the rebuild_rating_scores command
+    PK = 1
+
+    mean = models.FloatField() #Sets the average of every rating in the catalog
+    weight = models.FloatField() #Sets how many ratings' worth of the mean every score starts from
+    computed_at = models.DateTimeField() #Sets when the prior was computed
+
+    def __str__(self):
+        return f"{self.mean:.3f} x {self.weight:g}" #Returns the mean and its weight
+
+    @classmethod
+    def current(cls):
+        """The stored prior, or the default one before the first batch run"""
+        prior = cls.objects.filter(pk=cls.PK).first()
+        if prior is None:
+            prior = cls(pk=cls.PK, mean=DEFAULT_PRIOR_MEAN, weight=settings.RATING_SCORE_PRIOR_WEIGHT)
+        return prior
+
+    def score(self, rating_sum, rating_count):
+        """Rating score of a sum and count under this prior"""
+        if not rating_count:
+            return 0.0
+        return (self.weight * self.mean + rating_sum) / (self.weight + rating_count)
+
+    @classmethod
+    def recompute(cls):
+        """
+        Recompute the catalog mean and every product's rating score.
+
+        The periodic batch job behind rebuild_rating_scores: rating writes keep
+        scores current under the stored prior, this moves the prior itself.
+        """
+        from .facets import facet_index
+        totals = Product.objects.aggregate(total=models.Sum('rating_sum'), count=models.Sum('rating_count'))
+        prior, _ = cls.objects.update_or_create(pk=cls.PK, defaults={
+            'mean': totals['total'] / totals['count'] if totals['count'] else DEFAULT_PRIOR_MEAN,
+            'weight': settings.RATING_SCORE_PRIOR_WEIGHT,
+            'computed_at': timezone.now(),
+        })
+        Product.objects.update(rating_score=rating_score(F('rating_sum'), F('rating_count'), prior)) #One UPDATE for the catalog
+        facet_index.clear() #rating_score is a sort column; rebuilt on the next lookup
+        return prior
+
+
+def rating_score(rating_sum, rating_count, prior=None):
+    """
+    SQL expression of the Bayesian rating score of a sum and count.
+
+    The average is pulled towards the catalog mean as if every product had
+    prior.weight extra ratings of that mean, so one 5 star rating does not
+    outrank hundreds of 4.8s. Unrated products score 0 and rank last. Without
+    a prior the stored one is read inside the statement.
+    """
+    if prior is not None:
+        weight, mean = models.Value(prior.weight), models.Value(prior.mean)
+    else:
+        stored = RatingPrior.objects.filter(pk=RatingPrior.PK)
+        weight = Coalesce(models.Subquery(stored.values('weight')), models.Value(float(settings.RATING_SCORE_PRIOR_WEIGHT)))
+        mean = Coalesce(models.Subquery(stored.values('mean')), models.Value(DEFAULT_PRIOR_MEAN))
+    return models.Case(
+        models.When(
+            GreaterThan(rating_count, 0),
+            then=(weight * mean + Cast(rating_sum, models.FloatField())) / (weight + Cast(rating_count, models.FloatField())),
+        ),
+        default=models.Value(0.0),
+        output_field=models.FloatField(),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    # Reusable query building blocks for product listings
+
+    def for_cards(self):
+        """Load only what products/_product_card.html renders, brand and category joined in"""
+        return self.select_related('brand', 'category').only(*CARD_FIELDS)
+
+    def with_wishlist_status(self, user):
+        """Annotate is_in_wishlist for a whole page in a single query"""
+        if not user.is_authenticated: #Anonymous users have no wishlist
+            return self.annotate(is_in_wishlist=models.Value(False, output_field=models.BooleanField()))
+        from users.models import Wishlist
+        in_wishlist = Wishlist.objects.filter(user=user, product=models.OuterRef('pk')) #Correlated wishlist lookup
+        return self.annotate(is_in_wishlist=models.Exists(in_wishlist)) #Annotates the wishlist status as an EXISTS subquery
+
+    def apply_rating(self, added=None, removed=None):
+        """Add and/or remove one rating (1-5) in the stored summary with a single UPDATE"""
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+        changes = {
+            'rating_sum': models.F('rating_sum') + sum_delta, #Adjusts the rating sum
+            'rating_count': models.F('rating_count') + count_delta, #Adjusts the rating count
+        }
+        if count_delta or sum_delta:
+            new_avg = Cast(models.F('rating_sum') + sum_delta, models.FloatField()) / (models.F('rating_count') + count_delta)
+            changes['rating_avg'] = models.Case( #Recomputes the average from the pre-update values
+                models.When(rating_count=-count_delta, then=models.Value(None, output_field=models.FloatField())),
+                default=new_avg,
+                output_field=models.FloatField(),
+            )
+            changes['rating_score'] = rating_score(changes['rating_sum'], changes['rating_count']) #Rescored under the stored prior
+        for stars, delta in ((added, 1), (removed, -1)):
+            if stars is not None:
+                field = STAR_FIELDS[stars]
+                changes[field] = changes.get(field, models.F(field)) + delta #Moves the rating between star buckets
+        return self.update(**changes)
+
+    def rebuild_ratings(self, batch_size=500, dry_run=False):
+        """
+        Recompute the stored rating summary of these products from ProductRating.
+
+        Reads every rating count in one query grouped by product and star,
+        and writes only the products whose summary has drifted. Returns the
+        number of those products; their cards and the catalog index are
+        refreshed, as bulk_update() sends no signals.
+        """
+        from . import card_cache
+        from .facets import facet_index
+        prior = RatingPrior.current()
+        histograms = defaultdict(dict)
+        ratings = ProductRating.objects.filter(product__in=self.values('pk')).values_list('product_id', 'rating')
+        for product_id, stars, count in ratings.annotate(count=models.Count('id')).order_by():
+            histograms[product_id][stars] = count
+        stale = []
+        for product in self.select_related(None).only('id', *RATING_FIELDS, 'rating_score').iterator(chunk_size=2000):
+            if product.fill_ratings(histograms.get(product.pk, {}), prior):
+                stale.append(product)
+        if stale and not dry_run:
+            self.model.objects.bulk_update(stale, [*RATING_FIELDS, 'rating_score'], batch_size=batch_size)
+            for product in stale:
+                card_cache.invalidate('product', product.pk) #The card shows the average and count
+            facet_index.clear() #rating_avg is a sort column; rebuilt on the next lookup
+        return len(stale)
+
+
 class Product(models.Model):
     # Main product model
     # Basic Information
@@ -197,6 +421,7 @@ class Product(models.Model):
         validators=[validate_price]
     ) #Sets the price of the product
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True) #Sets the sale price of the product
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False) #Price paid now (current_price), stored so it can be sorted and filtered by index
     discount_percentage = models.PositiveIntegerField(default=0, validators=[MaxValueValidator(100)], help_text="Discount percentage (0-100)") #Sets the discount percentage of the product
 
     # Inventory
@@ -245,60 +470,133 @@ class Product(models.Model):
         help_text="Is this an authentic F1 part from a verified vendor?"
     )
 
+    # Rating summary (maintained incrementally from ProductRating by ProductQuerySet.apply_rating)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False) #Sets the sum of all ratings of the product
+    rating_count = models.PositiveIntegerField(default=0, editable=False) #Sets the number of ratings of the product
+    rating_avg = models.FloatField(blank=True, null=True, editable=False) #Sets the average rating of the product
+    rating_score = models.FloatField(default=0.0, editable=False) #Sets the Bayesian rating score used for ranking, 0 when unrated
+    five_star_count = models.PositiveIntegerField(default=0, editable=False) #Sets the number of 5 star ratings
+    four_star_count = models.PositiveIntegerField(default=0, editable=False) #Sets the number of 4 star ratings
+    three_star_count = models.PositiveIntegerField(default=0, editable=False) #Sets the number of 3 star ratings
+    two_star_count = models.PositiveIntegerField(default=0, editable=False) #Sets the number of 2 star ratings
+    one_star_count = models.PositiveIntegerField(default=0, editable=False) #Sets the number of 1 star ratings
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True) #Sets the created at of the product
     updated_at = models.DateTimeField(auto_now=True) #Sets the updated at of the product
 
+    objects = ProductQuerySet.as_manager() #Sets the manager of the product
+
     class Meta:
         ordering = ['-created_at'] #Sets the ordering of the product
+        indexes = [
+            # Partial indexes: SQLite renders is_active=True as a bare WHERE "is_active", which only a matching condition can use
+            models.Index(fields=['rating_avg', 'id'], condition=models.Q(is_active=True), name='product_active_rating_idx'), #Index for paging by rating
+            models.Index(fields=['rating_score', 'id'], condition=models.Q(is_active=True), name='product_active_score_idx'), #Index for paging by top rated
+            models.Index(fields=['name', 'id'], condition=models.Q(is_active=True), name='product_active_name_idx'), #Index for paging by name
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True), name='product_active_created_idx'), #Index for paging by newest
+            models.Index(fields=['effective_price', 'id'], condition=models.Q(is_active=True), name='product_active_price_idx'), #Index for paging and filtering by price
+            # Category, subcategory and brand pages and filters, in the default name order
+            models.Index(fields=['category', 'name', 'id'], condition=models.Q(is_active=True), name='product_active_category_idx'),
+            models.Index(fields=['subcategory', 'name', 'id'], condition=models.Q(is_active=True), name='product_active_subcat_idx'),
+            models.Index(fields=['brand', 'name', 'id'], condition=models.Q(is_active=True), name='product_active_brand_idx'),
+            # Best rated products of a category, the fallback recommendations
+            models.Index(fields=['category', 'rating_score', 'id'], condition=models.Q(is_active=True), name='product_category_score_idx'),
+            # Newest featured products and bestsellers on the home page; only the flagged few are indexed
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True, is_featured=True), name='product_featured_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True, is_bestseller=True), name='product_bestseller_idx'),
+        ]
 
     def __str__(self):
         return f"{self.brand.name} - {self.name}" #Returns the name of the product
 
+    def sku_prefix(self):
+        """Return the BRA-CAT (or VENDOR-BRA-CAT) part of the product's SKU"""
+        brand_prefix = re.sub(r'[^A-Za-z0-9]', '', self.brand.name)[:3].upper() #First 3 letters of the brand name
+        category_prefix = re.sub(r'[^A-Za-z0-9]', '', self.category.name)[:3].upper() #First 3 letters of the category name
+        prefix = f"{brand_prefix}-{category_prefix}"
+        return f"VENDOR-{prefix}" if self.vendor_id else prefix #Vendor products have their own numbers
+
     def generate_sku(self):
-        """Generate SKU based on brand, category, and random numbers"""
-        # Get first 3 letters of brand name (uppercase)
-        brand_prefix = self.brand.name[:3].upper()
-        
-        # Get first 3 letters of category name (uppercase)
-        category_prefix = self.category.name[:3].upper()
-        
-        # Generate 4 random digits
-        random_digits = ''.join(random.choices(string.digits, k=4))
-        
-        # Check if product is created by a vendor
-        if self.vendor:
-            sku = f"VENDOR-{brand_prefix}-{category_prefix}-{random_digits}"
-        else:
-            sku = f"{brand_prefix}-{category_prefix}-{random_digits}"
-        
-        return sku
+        """Allocate the next BRA-CAT-NNNN SKU of the product's prefix"""
+        prefix = self.sku_prefix()
+        return f"{prefix}-{SkuCounter.reserve(prefix):04d}"
+
+    @classmethod
+    def allocate_skus(cls, products):
+        """
+        Give every product without a SKU the next number of its prefix, one reservation per prefix (for bulk_create).
+
+        The counters are first moved past the SKUs the other products already
+        carry, as save() does for one product, so later numbers never collide
+        with them.
+        """
+        by_prefix = defaultdict(list)
+        for product in products:
+            if not product.sku:
+                by_prefix[product.sku_prefix()].append(product)
+        used = SkuCounter.claim_many([product.sku for product in products if product.sku])
+        for prefix, group in by_prefix.items():
+            first = SkuCounter.reserve(prefix, len(group), used.get(prefix, 0)) #Reserves a block of numbers for the whole group
+            for number, product in enumerate(group, first):
+                product.sku = f"{prefix}-{number:04d}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the counter columns as loaded, so save() can tell which ones were changed
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_counters = {field: instance.__dict__[field] for field in COUNTER_FIELDS if field in instance.__dict__}
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        refreshed = COUNTER_FIELDS if fields is None else [field for field in fields if field in COUNTER_FIELDS]
+        self._loaded_counters = {
+            **getattr(self, '_loaded_counters', {}),
+            **{field: self.__dict__[field] for field in refreshed if field in self.__dict__},
+        }
 
     def save(self, *args, **kwargs):
-        # Auto-generate SKU if not provided
         if not self.sku:
-            # Generate SKU and ensure it's unique
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                generated_sku = self.generate_sku()
-                if not Product.objects.filter(sku=generated_sku).exists():
-                    self.sku = generated_sku
-                    break
-                if attempt == max_attempts - 1:
-                    # If we can't generate a unique SKU, add a random suffix
-                    random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=2))
-                    self.sku = f"{generated_sku}-{random_suffix}"
-        
+            self.sku = self.generate_sku() #Auto-generates the SKU
+        elif self._state.adding:
+            SkuCounter.claim(self.sku) #Keeps generated SKUs clear of one entered by hand
+        self.fill_derived_fields()
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = self._fields_to_save() #A full save of a loaded product
+        super().save(*args, **kwargs) #Saves the product
+
+    def _fields_to_save(self):
+        """
+        Every loaded field but the counter columns still as loaded.
+
+        Rating writes and checkout move those with atomic UPDATEs; writing
+        back the loaded values (from the admin or the vendor form) would undo
+        one that ran in between. They are dropped from the instance instead,
+        so the next read, e.g. by the index signals, gets them fresh.
+        """
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_counters', {})
+        untouched = {field for field, value in loaded.items() if field in self.__dict__ and self.__dict__[field] == value}
+        for field in untouched:
+            del self.__dict__[field]
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred and field.name not in untouched
+        ]
+
+    def fill_derived_fields(self):
+        """Set the fields computed from others; save() does this, bulk writes must call it themselves"""
         # Auto-calculate sale_price from price and discount_percentage
         if self.discount_percentage: #Checks if the discount percentage is set
-            self.sale_price = self.price * (Decimal('1') - Decimal(self.discount_percentage) / Decimal('100')) #Calculates the sale price
+            self.sale_price = (self.price * (Decimal('1') - Decimal(self.discount_percentage) / Decimal('100'))).quantize(Decimal('0.01'), ROUND_HALF_UP) #Calculates the sale price, in cents like the column
             if self.discount_percentage == 0: #Checks if the discount percentage is 0
                 self.sale_price = None #Sets the sale price to None
         else: #If the discount percentage is not set
             self.sale_price = None #Sets the sale price to None
+        self.effective_price = self.current_price #Sale price when on sale, otherwise the price
         if not self.slug: #Checks if the slug is not set
             self.slug = slugify(self.name) #Sets the slug of the product
-        super().save(*args, **kwargs) #Saves the product
 
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'slug': self.slug}) #Returns the absolute url of the product
@@ -325,12 +623,40 @@ class Product(models.Model):
 
     @property
     def average_rating(self):
-        # Get average rating
-        ratings = self.ratings.all() #Gets all the ratings for the product
-        if ratings.exists(): #Checks if the ratings exist
-            return round(ratings.aggregate(models.Avg('rating'))['rating__avg'], 1) #Returns the average rating
+        # Get average rating from the stored aggregates
+        if self.rating_count and self.rating_avg is not None: #Checks if the product has ratings
+            return round(self.rating_avg, 1) #Returns the average rating
         return None #Returns None
 
+    @property
+    def rating_summary(self):
+        """Average, count and star histogram from the stored summary, without querying the ratings"""
+        histogram = []
+        for stars, field in STAR_FIELDS.items():
+            count = getattr(self, field)
+            histogram.append((stars, count, round(100 * count / self.rating_count) if self.rating_count else 0))
+        return RatingSummary(self.average_rating, self.rating_count, histogram)
+
+    def fill_ratings(self, histogram, prior=None):
+        """Set the stored rating summary (and the score, given a prior) from a {stars: count} histogram; returns whether anything changed"""
+        values = {field: histogram.get(stars, 0) for stars, field in STAR_FIELDS.items()}
+        values['rating_count'] = sum(histogram.values())
+        values['rating_sum'] = sum(stars * count for stars, count in histogram.items())
+        values['rating_avg'] = values['rating_sum'] / values['rating_count'] if values['rating_count'] else None
+        if prior is not None:
+            values['rating_score'] = prior.score(values['rating_sum'], values['rating_count'])
+        changed = False
+        for field, value in values.items():
+            current = getattr(self, field)
+            if field in ('rating_avg', 'rating_score') and current is not None and value is not None:
+                drifted = abs(current - value) > 1e-9 #Float averages from SQL and Python may differ in the last bit
+            else:
+                drifted = current != value
+            if drifted:
+                setattr(self, field, value)
+                changed = True
+        return changed
+
 
 class ProductRating(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='ratings') #Sets the product of the rating
@@ -344,5 +670,67 @@ class ProductRating(models.Model):
     def __str__(self):
         return f"{self.user.username} rated {self.product.name} {self.rating}/5" #Returns the rating of the product
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the stored values so saves can apply a delta
+        instance = super().from_db(db, field_names, values)
+        instance._stored_rating = instance.__dict__.get('rating') #Stores the loaded rating
+        instance._stored_product_id = instance.__dict__.get('product_id') #Stores the loaded product
+        return instance
+
 
+class ProductRecommendation(models.Model):
+    # Precomputed "recommended for you" neighbours, written by the rebuild_recommendations command
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='recommendations') #Sets the product being viewed
+    recommended = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='recommended_for') #Sets the recommended product
+    rank = models.PositiveSmallIntegerField() #Sets the position of the recommendation, 1 is best
+    score = models.FloatField() #Sets the score the rank was computed from
+    computed_at = models.DateTimeField() #Sets when the recommendation was computed
 
+    class Meta:
+        ordering = ['product', 'rank'] #Sets the ordering of the recommendations
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='product_recommendation_rank_unique'), #Also serves the view's lookup
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} (#{self.rank})" #Returns the recommendation
+
+
+# Keep Product rating aggregates in step with ProductRating writes
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+@receiver(pre_save, sender=ProductRating)
+@receiver(pre_delete, sender=ProductRating)
+def load_stored_rating(sender, instance, **kwargs):
+    # A rating that was not loaded from the database (e.g. ProductRating(pk=...)) reads its stored values first
+    if instance.pk is None or getattr(instance, '_stored_rating', None) is not None:
+        return
+    stored = ProductRating.objects.filter(pk=instance.pk).values_list('rating', 'product_id').first()
+    if stored is not None: #None: the save inserts a new row
+        instance._stored_rating, instance._stored_product_id = stored
+
+@receiver(post_save, sender=ProductRating)
+def apply_rating_save(sender, instance, created, **kwargs):
+    # Add a new rating, or apply the difference for a changed one
+    previous_rating = getattr(instance, '_stored_rating', None)
+    previous_product_id = getattr(instance, '_stored_product_id', None)
+    if created:
+        Product.objects.filter(pk=instance.product_id).apply_rating(added=instance.rating) #Adds the new rating
+    elif previous_product_id != instance.product_id:
+        Product.objects.filter(pk=previous_product_id).apply_rating(removed=previous_rating) #Removes the rating from the old product
+        Product.objects.filter(pk=instance.product_id).apply_rating(added=instance.rating) #Adds the rating to the new product
+    elif previous_rating != instance.rating:
+        Product.objects.filter(pk=instance.product_id).apply_rating(added=instance.rating, removed=previous_rating) #Applies the change
+    instance._stored_rating = instance.rating
+    instance._stored_product_id = instance.product_id
+
+@receiver(post_delete, sender=ProductRating)
+def apply_rating_delete(sender, instance, **kwargs):
+    # Remove a deleted rating from the summary
+    rating = getattr(instance, '_stored_rating', None)
+    product_id = getattr(instance, '_stored_product_id', None)
+    if rating is None:
+        rating, product_id = instance.rating, instance.product_id
+    Product.objects.filter(pk=product_id).apply_rating(removed=rating) #Removes the rating
@@ -0,0 +1,242 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Paginator pages with COUNT(*) and OFFSET, so every page after the first
+reads and throws away all the rows before it. KeysetPaginator instead
+remembers the sort values of the last row on the page in a signed cursor
+and asks for the rows after it, which an index answers at the same speed
+on page 1 and page 5000. Plain ?page=N links still work for jumping to a
+page, and the total count is cached so the page number UI stays cheap.
+"""
+import datetime
+import decimal
+import hashlib
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from .facets import sort_key
+
+CURSOR_SALT = 'products.pagination' #Salt for signing cursors
+
+
+def cached_count(queryset):
+    """Return queryset.count(), cached for PAGINATION_COUNT_TIMEOUT seconds"""
+    timeout = getattr(settings, 'PAGINATION_COUNT_TIMEOUT', 60)
+    if not timeout:
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params() #Same filters give the same key, whatever is annotated
+    key = 'product-count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def _encode(value):
+    # Cursor values must survive a JSON round trip; the field parses them back
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _after(keys, values):
+    """
+    Return (seek, spill) Q objects for the rows that sort after the given values.
+
+    NULLs sort first ascending and last descending, like SQLite and the
+    orderings below. seek covers the rest of the current NULL or non-NULL
+    run as a single index range; spill is the run that follows it (or None)
+    and is only read when seek comes up short. Only the first key may be NULL.
+    """
+    (field, descending), value = keys[0], values[0]
+    rest = _after(keys[1:], values[1:])[0] if len(keys) > 1 else None
+    if value is None:
+        seek = Q(**{f'{field}__isnull': True}) #Rows sharing the NULL
+        spill = None if descending else Q(**{f'{field}__isnull': False}) #Ascending moves on to the values
+    else:
+        seek = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+        spill = Q(**{f'{field}__isnull': True}) if descending else None #Descending ends with the NULLs
+    if rest is not None:
+        if value is None:
+            seek &= rest
+        else:
+            # The redundant >= (or <=) bound lets the database seek the index even when the values are bound parameters
+            bound = Q(**{f"{field}__{'lte' if descending else 'gte'}": value})
+            seek = bound & (seek | (Q(**{field: value}) & rest))
+    return seek, spill
+
+
+class KeysetPage:
+    """A page with the attributes templates use from django.core.paginator.Page"""
+
+    def __init__(self, object_list, number, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def nearby_pages(self):
+        # The page links shown around the current page, without walking the whole page_range
+        return range(max(1, self.number - 2), min(max(self.paginator.num_pages, self.number), self.number + 2) + 1)
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset ordered by (field, descending) keys ending in a unique one.
+
+    get_page() follows a cursor when one is given and falls back to an
+    OFFSET page for ?page=N jumps, so both link styles keep working.
+    """
+
+    def __init__(self, queryset, per_page, keys, count=None):
+        self.keys = list(keys)
+        self.per_page = per_page
+        self.queryset = queryset.order_by(*[self._order(field, descending) for field, descending in self.keys])
+        self._count = count #Known total, e.g. from the facet index; counted on first use otherwise
+
+    @staticmethod
+    def _order(field, descending, reverse=False):
+        # Spell NULL placement out so every database orders the same way
+        if descending != reverse:
+            return F(field).desc(nulls_last=True)
+        return F(field).asc(nulls_first=True)
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = cached_count(self.queryset)
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+    def make_cursor(self, obj, number, direction):
+        values = [_encode(getattr(obj, field)) for field, _ in self.keys]
+        return signing.dumps({'v': values, 'n': number, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+    def get_page(self, cursor=None, number=None):
+        if cursor:
+            try:
+                data = signing.loads(cursor, salt=CURSOR_SALT)
+                return self._keyset_page(data['v'], max(1, int(data['n'])), data['d'])
+            except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+                pass #Forged or outdated cursor, start from a page number instead
+        return self._offset_page(number)
+
+    def _offset_page(self, number):
+        # First page or a direct ?page=N jump, clamped like Paginator.get_page()
+        try:
+            number = max(1, int(number or 1))
+        except (TypeError, ValueError):
+            number = 1
+        if number > 1:
+            number = min(number, self.num_pages)
+        start = (number - 1) * self.per_page
+        rows = list(self.queryset[start:start + self.per_page + 1]) #One extra row tells if there is a next page
+        return self._build(rows[:self.per_page], number, len(rows) > self.per_page, number > 1)
+
+    def _rows_after(self, keys, values, reverse=False):
+        # Seek within the current run, then read into the next run if the page is not full
+        ordering = [self._order(field, descending, reverse) for field, descending in self.keys]
+        seek, spill = _after(keys, values)
+        rows = list(self.queryset.filter(seek).order_by(*ordering)[:self.per_page + 1])
+        if spill is not None and len(rows) <= self.per_page:
+            rows += list(self.queryset.filter(spill).order_by(*ordering)[:self.per_page + 1 - len(rows)])
+        return rows
+
+    def _keyset_page(self, values, number, direction):
+        if len(values) != len(self.keys):
+            raise ValueError('Cursor does not match the ordering')
+        if direction == 'previous':
+            reversed_keys = [(field, not descending) for field, descending in self.keys]
+            rows = self._rows_after(reversed_keys, values, reverse=True)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return self._build(rows, number if has_previous else 1, True, has_previous)
+        rows = self._rows_after(self.keys, values)
+        return self._build(rows[:self.per_page], number, len(rows) > self.per_page, True)
+
+    def _build(self, rows, number, has_next, has_previous):
+        next_cursor = self.make_cursor(rows[-1], number + 1, 'next') if has_next and rows else None
+        previous_cursor = self.make_cursor(rows[0], number - 1, 'previous') if has_previous and rows else None
+        return KeysetPage(rows, number, self, has_next and bool(rows), has_previous, next_cursor, previous_cursor)
+
+
+class IndexPaginator(KeysetPaginator):
+    """
+    KeysetPaginator over the products of a facet index bitset.
+
+    The index finds the ids of the page in memory; the queryset is only
+    asked for those rows. Cursors are the same as KeysetPaginator's.
+    """
+
+    def __init__(self, queryset, per_page, keys, index, matching):
+        super().__init__(queryset, per_page, keys, count=matching.bit_count())
+        self.index = index
+        self.matching = matching
+        self.field, self.descending = self.keys[0]
+
+    def _rows(self, ids):
+        # The page rows in the index order; products gone from the database meanwhile are skipped
+        rows = {row.pk: row for row in self.queryset.order_by().filter(pk__in=ids)}
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def _offset_page(self, number):
+        try:
+            number = max(1, int(number or 1))
+        except (TypeError, ValueError):
+            number = 1
+        if number > 1:
+            number = min(number, self.num_pages)
+        ids, more = self.index.ordered(self.matching, self.field, self.descending, offset=(number - 1) * self.per_page, limit=self.per_page)
+        return self._build(self._rows(ids), number, more, number > 1)
+
+    def _keyset_page(self, values, number, direction):
+        if len(values) != len(self.keys):
+            raise ValueError('Cursor does not match the ordering')
+        value = self.queryset.model._meta.get_field(self.field).to_python(values[0])
+        after = sort_key(value, int(values[-1]))
+        if direction == 'previous':
+            ids, more = self.index.ordered(self.matching, self.field, not self.descending, after=after, limit=self.per_page)
+            return self._build(self._rows(ids[::-1]), number if more else 1, True, more)
+        ids, more = self.index.ordered(self.matching, self.field, self.descending, after=after, limit=self.per_page)
+        return self._build(self._rows(ids), number, more, True)
+
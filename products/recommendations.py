@@ -0,0 +1,147 @@
+"""
+Offline "recommended for you" scoring.
+
+Each product is scored against a short list of candidates: the best scored
+products of its category (and category plus brand), the best scored products
+overall, and every product it shares an order or a wishlist with. Ratings
+count through the Bayesian rating score, so a single 5 star rating does not
+outweigh many good ones. The top
+MAX_RECOMMENDATIONS per product are written to ProductRecommendation, so
+product_detail reads them with one indexed lookup. Run from the
+rebuild_recommendations management command.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+MAX_RECOMMENDATIONS = 6 #Neighbours stored per product (product_detail shows 3)
+CANDIDATES_PER_GROUP = 20 #Best rated products taken from each group as candidates
+MAX_BASKET = 50 #Larger orders and wishlists are skipped, their pairs say little
+
+# Score weights
+SAME_CATEGORY = 2.0
+SAME_BRAND = 1.0
+SAME_SUBCATEGORY = 0.5
+CO_PURCHASE = 1.5 #Multiplied by log(1 + orders containing both products)
+CO_WISHLIST = 1.0 #Multiplied by log(1 + users wishlisting both products)
+RATING = 0.2 #Multiplied by the rating score (0-5)
+
+
+def co_occurrences(rows):
+    """Count how often two products share a basket, from (basket, product) rows"""
+    baskets = defaultdict(set)
+    for basket, product in rows:
+        baskets[basket].add(product)
+    pairs = defaultdict(Counter)
+    for products in baskets.values():
+        if len(products) < 2 or len(products) > MAX_BASKET:
+            continue
+        for product in products:
+            for other in products:
+                if other != product:
+                    pairs[product][other] += 1
+    return pairs
+
+
+class Recommender:
+    """In-memory catalog snapshot that scores products against their candidates"""
+
+    def __init__(self):
+        from orders.models import OrderItem
+        from users.models import Wishlist
+        from .models import Product
+
+        products = Product.objects.filter(is_active=True).order_by().values_list(
+            'id', 'category_id', 'subcategory_id', 'brand_id', 'rating_score'
+        )
+        self.products = {row[0]: row for row in products} #id -> (id, category, subcategory, brand, rating score)
+        self.co_purchase = co_occurrences(OrderItem.objects.order_by().values_list('order_id', 'product_id'))
+        self.co_wishlist = co_occurrences(Wishlist.objects.order_by().values_list('user_id', 'product_id'))
+
+        by_rating = sorted(self.products.values(), key=lambda row: (-row[4], row[0])) #Best scored first
+        groups = defaultdict(list)
+        for row in by_rating:
+            for key in (('category', row[1]), ('category_brand', row[1], row[3])):
+                if len(groups[key]) <= CANDIDATES_PER_GROUP: #One spare in case it is the product itself
+                    groups[key].append(row[0])
+        self.groups = groups
+        self.top_rated = [row[0] for row in by_rating[:CANDIDATES_PER_GROUP + 1]]
+
+    def score(self, product, other, bought_with, wished_with):
+        _, category, subcategory, brand, _ = self.products[product]
+        _, other_category, other_subcategory, other_brand, other_rating = self.products[other]
+        score = RATING * other_rating
+        if category == other_category:
+            score += SAME_CATEGORY
+            if brand == other_brand:
+                score += SAME_BRAND
+            if subcategory == other_subcategory:
+                score += SAME_SUBCATEGORY
+        score += CO_PURCHASE * math.log1p(bought_with.get(other, 0))
+        score += CO_WISHLIST * math.log1p(wished_with.get(other, 0))
+        return score
+
+    def recommend(self, product):
+        """Return the best (score, id) neighbours of an active product"""
+        _, category, _, brand, _ = self.products[product]
+        bought_with = self.co_purchase.get(product, {}) #Products sharing an order with this one
+        wished_with = self.co_wishlist.get(product, {}) #Products sharing a wishlist with this one
+        candidates = set(self.top_rated)
+        candidates.update(self.groups[('category', category)])
+        candidates.update(self.groups[('category_brand', category, brand)])
+        candidates.update(bought_with)
+        candidates.update(wished_with)
+        candidates.discard(product)
+        scored = (
+            (self.score(product, other, bought_with, wished_with), -other) #Lower id wins ties
+            for other in candidates if other in self.products
+        )
+        return [(score, -negative_id) for score, negative_id in heapq.nlargest(MAX_RECOMMENDATIONS, scored)]
+
+
+def stale_product_ids(since):
+    """Products whose recommendations may have changed since the given time"""
+    from orders.models import OrderItem
+    from users.models import Wishlist
+    from .models import Product, ProductRating
+
+    changed = set(Product.objects.filter(updated_at__gt=since).values_list('id', flat=True)) #Edited or new products
+    changed.update(ProductRating.objects.filter(created_at__gt=since).values_list('product_id', flat=True)) #Newly rated products
+    new_orders = OrderItem.objects.filter(order__created_at__gt=since).values('order_id')
+    changed.update(OrderItem.objects.filter(order_id__in=new_orders).values_list('product_id', flat=True)) #Every product in a new order
+    new_wishlists = Wishlist.objects.filter(added_at__gt=since).values('user_id')
+    changed.update(Wishlist.objects.filter(user_id__in=new_wishlists).values_list('product_id', flat=True)) #Every product of a changed wishlist
+    return changed
+
+
+def last_computed_at():
+    from .models import ProductRecommendation
+    return ProductRecommendation.objects.aggregate(latest=Max('computed_at'))['latest']
+
+
+def rebuild_recommendations(product_ids=None, batch_size=1000):
+    """Recompute and store recommendations for the given products (all when None); returns the number of products"""
+    from .models import ProductRecommendation
+
+    computed_at = timezone.now() #Taken before the snapshot, so later changes are picked up by the next incremental run
+    recommender = Recommender()
+    targets = list(recommender.products) if product_ids is None else [pk for pk in product_ids if pk in recommender.products]
+    rows = []
+    for product in targets:
+        for rank, (score, other) in enumerate(recommender.recommend(product), 1):
+            rows.append(ProductRecommendation(
+                product_id=product, recommended_id=other, rank=rank, score=score, computed_at=computed_at,
+            ))
+
+    with transaction.atomic():
+        if product_ids is None:
+            ProductRecommendation.objects.all().delete()
+        else:
+            product_ids = list(product_ids)
+            for start in range(0, len(product_ids), batch_size): #Also drops rows of products that are no longer active
+                ProductRecommendation.objects.filter(product_id__in=product_ids[start:start + batch_size]).delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=batch_size)
+    return len(targets)
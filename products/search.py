@@ -0,0 +1,261 @@
+"""
+Full-text search index for products.
+
+Each active product is stored as one document made of its name, brand,
+category, subcategory, description and keywords. On SQLite the index is an
+FTS5 virtual table ranked with BM25; on PostgreSQL it is a tsvector table
+with a GIN index ranked with ts_rank_cd. Any other backend falls back to
+the original icontains query.
+"""
+import re
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+SEARCH_TABLE = 'products_search' #Name of the search index table
+
+# Column weights used by bm25(): name, brand, category, subcategory, description, keywords
+SQLITE_WEIGHTS = (10.0, 6.0, 4.0, 4.0, 1.0, 3.0)
+
+# Postgres setweight() labels for the same columns
+POSTGRES_WEIGHTS = ('A', 'A', 'B', 'B', 'D', 'C')
+
+TERM_PATTERN = re.compile(r'"([^"]*)"|(\S+)') #Matches quoted phrases or single words
+WORD_PATTERN = re.compile(r'\w+') #Matches the searchable part of a word
+
+
+def parse_query(query):
+    """Split a query into ('phrase'|'prefix', [words]) terms, dropping search syntax"""
+    terms = []
+    for phrase, word in TERM_PATTERN.findall(query):
+        words = WORD_PATTERN.findall((phrase or word).lower()) #Keeps only word characters
+        if not words:
+            continue
+        if phrase:
+            terms.append(('phrase', words)) #Quoted text must match as a phrase
+        else:
+            terms.extend(('prefix', [w]) for w in words) #Bare words match by prefix
+    return terms
+
+
+def document_rows(products):
+    # Build (id, name, brand, category, subcategory, description, keywords) rows
+    products = products.select_related('brand', 'category', 'subcategory').filter(is_active=True)
+    for product in products.iterator(chunk_size=2000):
+        yield (
+            product.id,
+            product.name,
+            product.brand.name,
+            product.category.name,
+            product.subcategory.name,
+            product.description,
+            product.keywords,
+        )
+
+
+class SQLiteSearchBackend:
+    """FTS5 index ranked with BM25"""
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "name, brand, category, subcategory, description, keywords, "
+            "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def remove(self, cursor, product_ids):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def write(self, cursor, rows):
+        # FTS5 has no upsert, so replace documents by deleting first
+        self.remove(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, brand, category, subcategory, description, keywords) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def compile(self, terms):
+        # Quote every word so user input can never be read as FTS5 syntax
+        parts = []
+        for kind, words in terms:
+            if kind == 'phrase':
+                parts.append('"' + ' '.join(words) + '"')
+            else:
+                parts.append(f'"{words[0]}"*')
+        return ' '.join(parts) #Implicit AND between terms
+
+    def search(self, cursor, terms):
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid',
+            [self.compile(terms)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """tsvector table with a GIN index ranked with ts_rank_cd"""
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'product_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def remove(self, cursor, product_ids):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def write(self, cursor, rows):
+        document = ' || '.join(
+            f"setweight(to_tsvector('english', coalesce(%s, '')), '{weight}')" for weight in POSTGRES_WEIGHTS
+        )
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%s, {document}) '
+            'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+            rows,
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+
+    def compile(self, terms):
+        parts = []
+        for kind, words in terms:
+            if kind == 'phrase':
+                parts.append('(' + ' <-> '.join(words) + ')')
+            else:
+                parts.append(f'{words[0]}:*')
+        return ' & '.join(parts)
+
+    def search(self, cursor, terms):
+        cursor.execute(
+            f"SELECT product_id FROM {SEARCH_TABLE}, to_tsquery('english', %s) query "
+            'WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC, product_id',
+            [self.compile(terms)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend(),
+    'postgresql': PostgresSearchBackend(),
+}
+
+
+_indexed_databases = set() #Databases already known to have the index table
+
+
+def get_backend():
+    """Return the index backend for the default database, or None if it has no index"""
+    backend = BACKENDS.get(connection.vendor)
+    if backend is None:
+        return None
+    database = connection.settings_dict['NAME']
+    if database not in _indexed_databases:
+        if SEARCH_TABLE not in connection.introspection.table_names():
+            return None #Index not migrated yet (or FTS5 is unavailable)
+        _indexed_databases.add(database)
+    return backend
+
+
+def search_product_ids(query):
+    """Return ids of active products matching the query, best match first"""
+    from .models import Product
+    terms = parse_query(query)
+    if not terms:
+        return []
+    backend = get_backend()
+    if backend is None:
+        # No index on this database, use the original substring search
+        matches = Product.objects.filter(is_active=True).filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(brand__name__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(subcategory__name__icontains=query) |
+            Q(keywords__icontains=query)
+        ).distinct()
+        return list(matches.values_list('id', flat=True))
+    with connection.cursor() as cursor:
+        return backend.search(cursor, terms)
+
+
+def index_products(products, batch_size=500):
+    """(Re)index the given product queryset, dropping inactive products from the index"""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.remove(cursor, list(products.filter(is_active=False).values_list('id', flat=True)))
+        batch = []
+        for row in document_rows(products):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                backend.write(cursor, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            backend.write(cursor, batch)
+            indexed += len(batch)
+    return indexed
+
+
+def unindex_products(product_ids):
+    """Remove products from the index"""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, list(product_ids))
+
+
+def rebuild_index(batch_size=500):
+    """Drop every document and index all active products again"""
+    from .models import Product
+    backend = get_backend()
+    if backend is None:
+        return 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            backend.clear(cursor)
+        return index_products(Product.objects.all(), batch_size=batch_size)
+
+
+# Keep the index in step with catalog changes
+@receiver(post_save, sender='products.Product')
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    # Reindex a product after it is saved
+    if not raw:
+        index_products(sender.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender='products.Product')
+def unindex_deleted_product(sender, instance, **kwargs):
+    # Drop a deleted product from the index
+    unindex_products([instance.pk])
+
+
+@receiver(post_save, sender='products.Brand')
+@receiver(post_save, sender='products.Category')
+@receiver(post_save, sender='products.SubCategory')
+def reindex_related_products(sender, instance, raw=False, created=False, **kwargs):
+    # Brand and category names are part of every product document
+    from .models import Product
+    if raw or created:
+        return
+    lookup = {'products.brand': 'brand', 'products.category': 'category', 'products.subcategory': 'subcategory'}[sender._meta.label_lower]
+    index_products(Product.objects.filter(**{lookup: instance}))
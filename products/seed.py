@@ -0,0 +1,413 @@
+"""
+Deterministic benchmark data: users, vendors, catalog, ratings, wishlists, carts and orders.
+
+The same seed and counts always produce the same data. Popularity is
+skewed the way shop traffic is: a few brands, categories and products get
+most of the ratings, wishlists and orders (Zipf over a shuffled order, so
+popularity does not follow the id), and a few users do most of the rating
+and buying. Everything is written in batches (bulk_create, or a plain
+executemany for the products), skipping save() and signals, so the derived
+data (SKUs, sale and effective prices, rating aggregates, order number
+counters and the search index) is filled in here.
+
+Running it again appends another batch on top of what is there, which is
+how the benchmarks grow a catalog from one size to the next. Used by the
+seed_bench command and the fixture in benchmarks/.
+"""
+import bisect
+import datetime
+import math
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.text import slugify
+from orders.models import Cart, CartItem, Order, OrderItem, OrderNumberCounter, OrderStatusHistory
+from users.models import UserPreference, UserProfile, Wishlist
+from . import search
+from .models import Brand, Category, Product, ProductRating, RatingPrior, SubCategory
+
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc) #Start of the generated history
+HISTORY_DAYS = 540 #Products, ratings and orders are spread over this many days
+PASSWORD = 'bench-password' #Password of every generated user
+
+BRAND_NAMES = [
+    'Brembo', 'Akrapovic', 'Bilstein', 'Garrett', 'Recaro', 'Ohlins', 'Sparco', 'OZ Racing', 'BBS', 'Eibach',
+    'KW', 'HKS', 'Remus', 'Milltek', 'Mishimoto', 'Wilwood', 'AP Racing', 'Alcon', 'Nismo', 'Mugen',
+]
+CATEGORY_NAMES = [
+    'Brakes', 'Exhaust', 'Suspension', 'Engine', 'Cooling', 'Aerodynamics', 'Wheels', 'Interior',
+    'Electronics', 'Drivetrain', 'Fuel System', 'Lighting',
+]
+SUBCATEGORY_NAMES = ['Kits', 'Upgrades', 'Replacement', 'Track', 'Street', 'Accessories', 'Hardware', 'Tools']
+F1_TEAMS = ['Ferrari', 'Mercedes', 'Red Bull Racing', 'McLaren', 'Aston Martin', 'Alpine', 'Williams', 'Haas']
+ADJECTIVES = ['Carbon', 'Titanium', 'Forged', 'Ceramic', 'Racing', 'Sport', 'Turbo', 'Billet', 'Alloy', 'Lightweight']
+PARTS = ['Exhaust', 'Brake Pads', 'Coilover', 'Intake', 'Radiator', 'Spoiler', 'Diffuser', 'Clutch', 'Manifold', 'Intercooler']
+WORDS = [word.lower() for word in ADJECTIVES + PARTS] + ['track', 'street', 'performance', 'precision', 'kit', 'set', 'race']
+ORDER_STATUSES = [('delivered', 60), ('shipped', 15), ('processing', 8), ('confirmed', 4), ('pending', 8), ('cancelled', 5)]
+STAR_WEIGHTS = [4, 5, 11, 30, 50] #Share of 1 to 5 star ratings
+
+
+class Zipf:
+    """Draw items with a probability proportional to 1 / rank ** exponent"""
+
+    def __init__(self, items, rng, exponent=1.0):
+        self.items = items
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, len(items) + 1):
+            total += rank ** -exponent
+            self.cumulative.append(total)
+        self.total = total
+
+    def draw(self):
+        return self.items[bisect.bisect(self.cumulative, self.rng.random() * self.total)]
+
+    def distinct(self, count):
+        """Up to count different items; popular items come up first"""
+        count = min(count, len(self.items))
+        picked = {}
+        for _ in range(count * 4): #Gives up on the rare tail rather than loop forever
+            if len(picked) >= count:
+                break
+            item = self.draw()
+            picked[item] = None
+        return list(picked)
+
+
+def activity(rng, users, total, cap):
+    """Split total actions over users with a heavy tail (a few users do most of them)"""
+    weights = [rng.paretovariate(1.2) for _ in users]
+    scale = total / sum(weights) if weights else 0
+    return [(user, min(cap, int(round(weight * scale)))) for user, weight in zip(users, weights)]
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(model, objects):
+    """
+    INSERT objects with one executemany, for the big tables.
+
+    Does what bulk_create does for objects whose fields are all set, without
+    compiling SQL for every batch of rows; primary keys are not read back.
+    """
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(field.column) for field in fields), ', '.join(['%s'] * len(fields)),
+    )
+    rows = [[field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] for obj in objects]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created/updated times set on the objects instead of now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BenchSeeder:
+    """Generate one batch of benchmark data; see seed()"""
+
+    def __init__(self, seed=42, batch_size=2000, log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    def moment(self, days_ago_max=HISTORY_DAYS):
+        # A time in the last days_ago_max days of the generated history, more of them recent
+        days_ago = days_ago_max * self.rng.random() ** 1.6
+        return EPOCH + datetime.timedelta(days=HISTORY_DAYS - days_ago, seconds=self.rng.randrange(86400))
+
+    def stage(self, name, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        count = self.counts.get(name, 0)
+        self.log(f'{name}: {count} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f}/s)')
+        return result
+
+    def run(self, products, users, vendors, brands, categories, subcategories, ratings, wishlists, carts, orders, index=True):
+        with transaction.atomic(), explicit_timestamps(
+            User, UserProfile, Product, ProductRating, Wishlist, Cart, CartItem, Order, OrderStatusHistory,
+        ):
+            user_ids = self.stage('users', self.create_users, users, vendors)
+            brand_objects = self.stage('brands', self.create_brands, brands)
+            subcategory_objects = self.stage('categories', self.create_categories, categories, subcategories)
+            first_product = self.stage('products', self.create_products, products, brand_objects, subcategory_objects)
+            product_ids = list(Product.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+            self.rng.shuffle(product_ids) #Popularity does not follow the id
+            popular = Zipf(product_ids, self.rng)
+            buyers = Zipf(user_ids, self.rng, exponent=0.8)
+            self.stage('ratings', self.create_ratings, ratings, user_ids, popular)
+            self.stage('wishlists', self.create_wishlists, wishlists, user_ids, popular)
+            self.stage('carts', self.create_carts, carts, user_ids, popular)
+            self.stage('orders', self.create_orders, orders, buyers, popular)
+        if index and first_product is not None:
+            self.stage('indexed', self.index_products, first_product)
+        return self.counts
+
+    # Users
+
+    def create_users(self, count, vendor_count):
+        start = User.objects.filter(username__startswith='bench-user-').count()
+        password = make_password(PASSWORD) #Hashing once keeps a million users fast
+        created = []
+        for batch in batched(range(start, start + count), self.batch_size):
+            users = [
+                User(
+                    username=f'bench-user-{i}', email=f'bench-user-{i}@example.com', password=password,
+                    first_name='Bench', last_name=f'User {i}', date_joined=self.moment(),
+                )
+                for i in batch
+            ]
+            users = User.objects.bulk_create(users)
+            vendors = {user.pk for user in users[:max(0, vendor_count - len(created))]} #The first users are the vendors
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    user=user, created_at=user.date_joined, updated_at=user.date_joined,
+                    is_vendor=user.pk in vendors, vendor_status='approved' if user.pk in vendors else 'pending',
+                    vendor_team=F1_TEAMS[user.pk % len(F1_TEAMS)] if user.pk in vendors else '',
+                )
+                for user in users
+            ])
+            UserPreference.objects.bulk_create([UserPreference(user=user) for user in users])
+            created += [user.pk for user in users]
+        self.counts['users'] = len(created)
+        self.counts['vendors'] = min(vendor_count, len(created))
+        return list(User.objects.filter(username__startswith='bench-user-').order_by('pk').values_list('pk', flat=True))
+
+    # Catalog
+
+    def create_brands(self, count):
+        names = [BRAND_NAMES[i] if i < len(BRAND_NAMES) else f'Bench Brand {i}' for i in range(count)] + F1_TEAMS
+        existing = set(Brand.objects.filter(name__in=names).values_list('name', flat=True))
+        new = [
+            Brand(name=name, slug=slugify(name), is_f1_team=name in F1_TEAMS)
+            for name in names if name not in existing
+        ]
+        Brand.objects.bulk_create(new)
+        self.counts['brands'] = len(new)
+        return list(Brand.objects.filter(name__in=names).order_by('pk'))
+
+    def create_categories(self, count, per_category):
+        names = [CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f'Bench Category {i}' for i in range(count)]
+        existing = set(Category.objects.filter(name__in=names).values_list('name', flat=True))
+        Category.objects.bulk_create([
+            Category(name=name, slug=slugify(name)) for name in names if name not in existing
+        ])
+        categories = list(Category.objects.filter(name__in=names).order_by('pk'))
+        existing = set(SubCategory.objects.filter(category__in=categories).values_list('category_id', 'name'))
+        new = []
+        for category in categories:
+            for i in range(per_category):
+                name = f'{category.name} {SUBCATEGORY_NAMES[i % len(SUBCATEGORY_NAMES)]}' + (f' {i}' if i >= len(SUBCATEGORY_NAMES) else '')
+                if (category.pk, name) not in existing:
+                    new.append(SubCategory(name=name, slug=slugify(name), category=category))
+        SubCategory.objects.bulk_create(new)
+        self.counts['categories'] = len(categories)
+        self.counts['subcategories'] = len(new)
+        subcategories = {}
+        for subcategory in SubCategory.objects.filter(category__in=categories).select_related('category').order_by('pk'):
+            subcategories.setdefault(subcategory.category_id, []).append(subcategory)
+        return [subcategories[category.pk] for category in categories] #Subcategories of each category, biggest category first
+
+    def create_products(self, count, brands, subcategories):
+        start = Product.objects.filter(slug__startswith='bench-').count()
+        team_brands = {brand.name: brand for brand in brands if brand.name in F1_TEAMS}
+        plain_brands = Zipf([brand for brand in brands if brand.name not in F1_TEAMS], self.rng)
+        categories = Zipf(subcategories, self.rng, exponent=0.7)
+        vendors = list(UserProfile.objects.filter(is_vendor=True, user__username__startswith='bench-user-'))
+        last_pk = Product.objects.aggregate(last=Max('pk'))['last'] or 0 #The new products come after it
+        created = 0
+        for batch in batched(range(start, start + count), self.batch_size * 5): #Bigger batches mean fewer SKU reservations
+            products = [self.make_product(i, plain_brands, categories, vendors, team_brands) for i in batch]
+            Product.allocate_skus(products) #One counter reservation per prefix and batch
+            created += bulk_insert(Product, products)
+        self.counts['products'] = created
+        return last_pk + 1
+
+    def make_product(self, i, brands, categories, vendors, team_brands):
+        rng = self.rng
+        subcategory = rng.choice(categories.draw())
+        vendor = rng.choice(vendors) if vendors and rng.random() < 0.03 else None #A few products come from F1 team vendors
+        brand = team_brands.get(vendor.vendor_team) if vendor else None
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(PARTS)} {i}'
+        price = Decimal(str(round(min(25000, max(5, math.exp(rng.gauss(5.0, 1.1)))), 2)))
+        stock = rng.random()
+        created_at = self.moment()
+        product = Product(
+            name=name[:40],
+            slug=f'bench-{i}', #Unique without a query; fill_derived_fields keeps it
+            category=subcategory.category,
+            subcategory=subcategory,
+            brand=brand or brands.draw(),
+            vendor=vendor,
+            is_authentic_f1_part=vendor is not None,
+            price=price,
+            discount_percentage=rng.choice([5, 10, 15, 20, 25, 30, 40, 50]) if rng.random() < 0.15 else 0,
+            stock_quantity=0 if stock < 0.08 else rng.randint(1, 5) if stock < 0.2 else rng.randint(6, 250),
+            description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(15, 40))).capitalize() + '.',
+            features=', '.join(rng.sample(WORDS, 4)),
+            keywords=', '.join(rng.sample(WORDS, 3)),
+            is_active=rng.random() < 0.97,
+            is_featured=rng.random() < 0.01,
+            is_bestseller=rng.random() < 0.02,
+            created_at=created_at,
+            updated_at=created_at,
+        )
+        product.fill_derived_fields()
+        return product
+
+    # Activity
+
+    def create_ratings(self, total, user_ids, products):
+        created = 0
+        rows = (
+            ProductRating(product_id=product, user_id=user, rating=self.rng.choices(range(1, 6), STAR_WEIGHTS)[0], created_at=self.moment())
+            for user, count in activity(self.rng, user_ids, total, cap=500)
+            for product in products.distinct(count)
+        )
+        for batch in batched(rows, self.batch_size):
+            created += len(ProductRating.objects.bulk_create(batch, ignore_conflicts=True)) #Appended runs may repeat a pair
+        self.counts['ratings'] = created
+
+        # bulk_create skips the rating signals; recompute the stored summaries from one grouped query
+        Product.objects.all().rebuild_ratings(batch_size=self.batch_size)
+        RatingPrior.recompute() #The catalog mean moved; rescores every product in one UPDATE
+
+    def create_wishlists(self, total, user_ids, products):
+        rows = (
+            Wishlist(user_id=user, product_id=product, added_at=self.moment())
+            for user, count in activity(self.rng, user_ids, total, cap=200)
+            for product in products.distinct(count)
+        )
+        self.counts['wishlists'] = sum(
+            len(Wishlist.objects.bulk_create(batch, ignore_conflicts=True)) for batch in batched(rows, self.batch_size)
+        )
+
+    def create_carts(self, count, user_ids, products):
+        with_cart = set(Cart.objects.values_list('user_id', flat=True))
+        without_cart = [pk for pk in user_ids if pk not in with_cart]
+        owners = self.rng.sample(without_cart, min(count, len(without_cart)))
+        created = 0
+        for batch in batched(owners, self.batch_size):
+            moment = self.moment(days_ago_max=30) #Carts are recent
+            carts = Cart.objects.bulk_create([Cart(user_id=user, created_at=moment, updated_at=moment) for user in batch])
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product, quantity=self.rng.randint(1, 3), added_at=moment, updated_at=moment)
+                for cart in carts
+                for product in products.distinct(self.rng.randint(1, 4))
+            ])
+            created += len(carts)
+        self.counts['carts'] = created
+
+    def create_orders(self, count, buyers, products):
+        statuses, weights = zip(*ORDER_STATUSES)
+        counters = dict(OrderNumberCounter.objects.values_list('day', 'last_number'))
+        created = 0
+        for batch in batched(range(count), self.batch_size):
+            plans = [] #(order, [(product id, quantity)])
+            for _ in batch:
+                created_at = self.moment(days_ago_max=365)
+                day = created_at.date()
+                counters[day] = counters.get(day, 0) + 1
+                status = self.rng.choices(statuses, weights)[0]
+                order = Order(
+                    order_number=f'RF-{day:%Y%m%d}-{counters[day]:04d}',
+                    user_id=buyers.draw(),
+                    order_status=status,
+                    payment_status='pending' if status in ('pending', 'cancelled') else 'paid',
+                    subtotal=0, total_amount=0,
+                    shipping_address='1 Bench Street', shipping_city='Monza', shipping_state='MB',
+                    shipping_postal_code='20900', shipping_country='Italy', shipping_phone='+390000000000',
+                    created_at=created_at, updated_at=created_at,
+                )
+                lines = [(product, self.rng.choices([1, 2, 3], [80, 15, 5])[0]) for product in products.distinct(self.rng.choice([1, 1, 1, 2, 2, 3, 4, 5]))]
+                plans.append((order, lines))
+
+            # Prices and snapshots of the products in this batch, in one query
+            catalog = Product.objects.in_bulk({product for _, lines in plans for product, _ in lines})
+            items = []
+            for order, lines in plans:
+                subtotal = Decimal('0')
+                for product_id, quantity in lines:
+                    product = catalog[product_id]
+                    items.append(OrderItem(
+                        order=order, product=product, product_name=product.name, product_sku=product.sku,
+                        quantity=quantity, unit_price=product.current_price, total_price=product.current_price * quantity,
+                    ))
+                    subtotal += product.current_price * quantity
+                order.subtotal = subtotal
+                order.tax_amount = (subtotal * Decimal('0.24')).quantize(Decimal('0.01'))
+                order.total_amount = subtotal + order.tax_amount
+            Order.objects.bulk_create([order for order, _ in plans])
+            OrderItem.objects.bulk_create(items)
+            OrderStatusHistory.objects.bulk_create([
+                OrderStatusHistory(order=order, status=order.order_status, changed_at=order.created_at) for order, _ in plans
+            ])
+            created += len(plans)
+
+        # Later checkouts continue after the generated numbers
+        existing = set(OrderNumberCounter.objects.values_list('day', flat=True))
+        OrderNumberCounter.objects.bulk_create([
+            OrderNumberCounter(day=day, last_number=number) for day, number in counters.items() if day not in existing
+        ])
+        OrderNumberCounter.objects.bulk_update(
+            [OrderNumberCounter(pk=pk, day=day, last_number=counters[day]) for pk, day in OrderNumberCounter.objects.filter(day__in=existing).values_list('pk', 'day')],
+            ['last_number'], batch_size=self.batch_size,
+        )
+        self.counts['orders'] = created
+
+    def index_products(self, first_pk):
+        self.counts['indexed'] = search.index_products(Product.objects.filter(pk__gte=first_pk), batch_size=self.batch_size)
+
+
+def default_counts(products):
+    """Counts of everything else that go with a catalog of the given size"""
+    users = max(50, products // 10)
+    return {
+        'users': users,
+        'vendors': max(2, users // 100),
+        'brands': 40,
+        'categories': 10,
+        'subcategories': 6,
+        'ratings': products * 2,
+        'wishlists': products // 2,
+        'carts': users // 4,
+        'orders': products // 5,
+    }
+
+
+def seed(products, seed=42, batch_size=2000, index=True, log=None, **counts):
+    """Append a deterministic batch of benchmark data; counts not given follow default_counts(products)"""
+    options = {**default_counts(products), **{name: value for name, value in counts.items() if value is not None}}
+    return BenchSeeder(seed=seed, batch_size=batch_size, log=log).run(products=products, index=index, **options)
@@ -0,0 +1,10 @@
+from django import template
+from products.card_cache import render_card
+
+register = template.Library()
+
+
+@register.simple_tag
+def cached_card(product):
+    """Return the cached image and info sections of a product card"""
+    return render_card(product)
@@ -2,9 +2,77 @@ from django.test import TestCase, Client
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
-from .models import Product, Category, SubCategory, Brand
-from users.models import UserProfile
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F
+from .models import Product, Category, SubCategory, Brand, ProductRating, ProductRecommendation, RatingPrior, SkuCounter
+from .search import search_product_ids
+from .autocomplete import suggestion_index
+from .facets import facet_index
+from .pagination import KeysetPaginator
+from .card_cache import card_cache
+from .seed import seed
+from django.test.signals import template_rendered
+from .views import sort_products
+from django.conf import settings
+from django.core.cache import cache
+from django.apps import apps as django_apps
+from django.test import RequestFactory, override_settings
+from revforge import slow_queries
+from revforge.performance import PerformanceMiddleware, histograms
+from revforge.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware, query_budget
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from users.models import UserProfile, Wishlist
+from orders.models import Order, OrderItem, OrderNumberCounter
+from io import StringIO
+import csv
+import importlib
+from urllib.parse import quote
+import json
 import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from decimal import Decimal
+from types import SimpleNamespace
+
+class CatalogTestCase(TestCase):
+    """Base for tests that create products: one category, subcategory and brand, named by the class attributes"""
+
+    category_name = 'Engine'
+    subcategory_name = 'Turbos'
+    brand_name = 'Garrett'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name=cls.category_name) #Creates a test category
+        cls.subcategory = SubCategory.objects.create(name=cls.subcategory_name, category=cls.category) #Creates a test subcategory
+        cls.brand = Brand.objects.create(name=cls.brand_name) #Creates a test brand
+
+    def tearDown(self):
+        # The process-wide indexes may hold this test's rows; leave none behind for the next test
+        facet_index.clear()
+        suggestion_index.clear()
+        super().tearDown()
+
+    def _build_product(self, name='Test Part', **fields):
+        """An unsaved product; the category follows the subcategory, anything not given has a test default"""
+        subcategory = fields.setdefault('subcategory', self.subcategory)
+        fields.setdefault('category', subcategory.category)
+        fields.setdefault('brand', self.brand)
+        fields.setdefault('price', Decimal('100.00'))
+        fields.setdefault('stock_quantity', 10)
+        fields.setdefault('description', 'Test description for a performance part')
+        return Product(name=name, **fields)
+
+    def _product(self, name='Test Part', **fields):
+        product = self._build_product(name, **fields)
+        product.save()
+        return product
+
 
 class VendorProductFormTest(TestCase):
     def setUp(self):
@@ -115,3 +183,1355 @@ class VendorProductFormTest(TestCase):
         # Should redirect to dashboard (success)
         self.assertEqual(response.status_code, 302) #Checks if the response status code is 302
         self.assertRedirects(response, reverse('users:vendor_dashboard')) #Checks if the response redirects to the vendor dashboard
+
+
+class WishlistAnnotationQueryTest(CatalogTestCase):
+    """Wishlist status must cost a fixed number of queries per page, not one per product"""
+    category_name, subcategory_name, brand_name = 'Brakes', 'Pads', 'Brembo'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='testpass123') #Creates a test shopper
+        self.client = Client() #Creates a test client
+
+    def _create_products(self, count):
+        # Create products and put every other one in the shopper's wishlist
+        products = []
+        for i in range(Product.objects.count(), Product.objects.count() + count):
+            product = self._product(f'Brake Part {i}', slug=f'brake-part-{i}', is_featured=True) #Unique name and slug
+            if i % 2 == 0:
+                Wishlist.objects.create(user=self.user, product=product) #Adds the product to the wishlist
+            products.append(product)
+        return products
+
+    def _wishlist_queries(self, request):
+        # Run the request and return the number of queries touching the wishlist table
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertEqual(response.status_code, 200)
+        return len([q for q in ctx.captured_queries if 'users_wishlist' in q['sql']])
+
+    def _assert_fixed(self, request, small=2, large=12):
+        # The wishlist query count must not grow with the page size
+        self.client.login(username='shopper', password='testpass123')
+        self._create_products(small)
+        small_count = self._wishlist_queries(request)
+        self._create_products(large - small)
+        large_count = self._wishlist_queries(request)
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, 2) #Page fetch plus at most the paginator count
+
+    def test_home(self):
+        self._assert_fixed(lambda: self.client.get(reverse('products:home')), large=6)
+
+    def test_product_list(self):
+        self._assert_fixed(lambda: self.client.get(reverse('products:product_list')))
+
+    def test_search(self):
+        self._assert_fixed(lambda: self.client.get(reverse('products:search'), {'q': 'Brake'}))
+
+    def test_category_detail(self):
+        self._assert_fixed(lambda: self.client.get(reverse('products:category_detail', kwargs={'slug': self.category.slug})))
+
+    def test_subcategory_detail(self):
+        url = reverse('products:subcategory_detail', kwargs={'category_slug': self.category.slug, 'subcategory_slug': self.subcategory.slug})
+        self._assert_fixed(lambda: self.client.get(url))
+
+    def test_brand_detail(self):
+        self._assert_fixed(lambda: self.client.get(reverse('products:brand_detail', kwargs={'slug': self.brand.slug})))
+
+    def test_recently_viewed(self):
+        def request():
+            ids = list(Product.objects.values_list('id', flat=True)[:3]) #Gets up to three product ids
+            return self.client.post(reverse('products:recently_viewed'), json.dumps({'viewed': ids}), content_type='application/json')
+        self._assert_fixed(request, small=1, large=3)
+
+    def test_annotation_matches_wishlist(self):
+        products = self._create_products(4)
+        annotated = {p.id: p.is_in_wishlist for p in Product.objects.with_wishlist_status(self.user)} #Gets the annotated status
+        for product in products:
+            self.assertEqual(annotated[product.id], Wishlist.objects.filter(user=self.user, product=product).exists())
+
+    def test_anonymous_user_skips_wishlist(self):
+        self._create_products(3)
+        self.assertEqual(self._wishlist_queries(lambda: self.client.get(reverse('products:product_list'))), 0)
+
+
+class RatingAggregateTest(CatalogTestCase):
+    """Stored rating summary (average, count, star histogram) must match the ratings after every write"""
+
+    def setUp(self):
+        self.product = self._product('Turbo Kit', price=Decimal('999.00'))
+        self.users = [User.objects.create_user(username=f'rater{i}', password='testpass123') for i in range(3)]
+
+    def assertAggregates(self, total, count):
+        # Compare the stored aggregates against the expected values
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, total)
+        self.assertEqual(self.product.rating_count, count)
+        if count:
+            self.assertAlmostEqual(self.product.rating_avg, total / count)
+        else:
+            self.assertIsNone(self.product.rating_avg)
+            self.assertIsNone(self.product.average_rating)
+        self.assertHistogram(self.product)
+
+    def assertHistogram(self, product):
+        # The star buckets must count the product's actual ratings
+        product.refresh_from_db()
+        ratings = list(ProductRating.objects.filter(product=product).values_list('rating', flat=True))
+        self.assertEqual(
+            [(stars, count) for stars, count, percent in product.rating_summary.histogram],
+            [(stars, ratings.count(stars)) for stars in (5, 4, 3, 2, 1)],
+        )
+
+    def test_create_change_delete(self):
+        first = ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        ProductRating.objects.create(product=self.product, user=self.users[1], rating=2)
+        self.assertAggregates(7, 2)
+        first.rating = 3
+        first.save()
+        self.assertAggregates(5, 2)
+        reloaded = ProductRating.objects.get(pk=first.pk) #Changes a rating loaded from the database
+        reloaded.rating = 4
+        reloaded.save()
+        self.assertAggregates(6, 2)
+        reloaded.delete()
+        self.assertAggregates(2, 1)
+        ProductRating.objects.all().delete()
+        self.assertAggregates(0, 0)
+
+    def assertOneSummaryUpdate(self, queries):
+        # The product row is only touched by the summary UPDATE: no recount, no product.save()
+        product_queries = [q['sql'] for q in queries.captured_queries if 'products_product"' in q['sql'].split(' WHERE ')[0]]
+        self.assertEqual(len(product_queries), 1)
+        self.assertTrue(product_queries[0].startswith('UPDATE'))
+
+    def test_each_write_is_one_summary_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            rating = ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        self.assertOneSummaryUpdate(queries)
+        rating.rating = 3
+        with CaptureQueriesContext(connection) as queries:
+            rating.save()
+        self.assertOneSummaryUpdate(queries)
+        with CaptureQueriesContext(connection) as queries:
+            rating.delete()
+        self.assertOneSummaryUpdate(queries)
+        self.assertAggregates(0, 0)
+
+    def test_rebuild_reads_ratings_in_one_grouped_query(self):
+        for user, stars in zip(self.users, (5, 4, 4)):
+            ProductRating.objects.create(product=self.product, user=user, rating=stars)
+        Product.objects.filter(pk=self.product.pk).update(rating_count=0, four_star_count=0) #Corrupts the summary
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(Product.objects.rebuild_ratings(), 1)
+        rating_queries = [q['sql'] for q in ctx.captured_queries if ProductRating._meta.db_table in q['sql']]
+        self.assertEqual(len(rating_queries), 1)
+        self.assertIn('GROUP BY', rating_queries[0])
+        self.assertAggregates(13, 3)
+
+    def test_rating_saved_without_loading(self):
+        rating = ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        ProductRating(pk=rating.pk, product=self.product, user=self.users[0], rating=2, created_at=rating.created_at).save() #Updates the row, not a new rating
+        self.assertAggregates(2, 1)
+        ProductRating(pk=rating.pk, product=self.product, user=self.users[0], rating=4).delete()
+        self.assertAggregates(0, 0)
+
+    def test_product_save_keeps_concurrent_counts(self):
+        edited = Product.objects.get(pk=self.product.pk) #Loaded by the admin or vendor form
+        ProductRating.objects.create(product=self.product, user=self.users[0], rating=4)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=F('stock_quantity') - 3) #Checkout in between
+        edited.name = 'Turbo Kit Stage 2'
+        edited.save()
+        self.assertAggregates(4, 1)
+        self.assertEqual(self.product.stock_quantity, 7)
+        self.assertEqual(self.product.name, 'Turbo Kit Stage 2')
+        edited.stock_quantity = 20 #A stock level entered by hand is still written
+        edited.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 20)
+        self.assertEqual(self.product.rating_count, 1)
+
+    def test_move_rating_between_products(self):
+        other = self._product('Wastegate')
+        rating = ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        rating.product = other
+        rating.rating = 2
+        rating.save()
+        self.assertAggregates(0, 0)
+        self.assertHistogram(other)
+        self.assertEqual(other.rating_summary.count, 1)
+
+    def test_rating_summary(self):
+        for user, stars in zip(self.users, (5, 5, 2)):
+            ProductRating.objects.create(product=self.product, user=user, rating=stars)
+        self.product.refresh_from_db()
+        with self.assertNumQueries(0):
+            summary = self.product.rating_summary
+        self.assertEqual(summary.average, 4.0)
+        self.assertEqual(summary.count, 3)
+        self.assertEqual(summary.histogram[0], (5, 2, 67))
+        self.assertEqual(summary.histogram[3], (2, 1, 33))
+        response = self.client.get(reverse('products:product_detail', kwargs={'slug': self.product.slug}))
+        self.assertContains(response, 'rating-histogram-row', count=5)
+        self.assertContains(response, '3 ratings')
+
+    def test_cards_render_without_rating_queries(self):
+        ProductRating.objects.create(product=self.product, user=self.users[0], rating=4)
+        card_cache().clear() #Renders the cards cold
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('products:product_list'))
+        self.assertContains(response, '(4.0/5)')
+        self.assertFalse([q for q in ctx.captured_queries if ProductRating._meta.db_table in q['sql']])
+
+    def test_product_detail_rating_post(self):
+        self.client.login(username='rater0', password='testpass123')
+        url = reverse('products:product_detail', kwargs={'slug': self.product.slug})
+        self.client.post(url, {'rating': 4})
+        self.assertAggregates(4, 1)
+        self.client.post(url, {'rating': 2}) #Updates the existing rating
+        self.assertAggregates(2, 1)
+
+    def test_rating_sort_uses_stored_average(self):
+        ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('products:product_list'), {'sort_by': 'Rating', 'sort_order': 'desc'})
+        self.assertFalse([q for q in ctx.captured_queries if 'AVG(' in q['sql'].upper()])
+
+    def test_rebuild_command_repairs_drift(self):
+        ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        ProductRating.objects.create(product=self.product, user=self.users[1], rating=4)
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=1, rating_count=7, rating_avg=0.1, two_star_count=3) #Corrupts the summary
+        call_command('rebuild_rating_summaries', stdout=StringIO())
+        self.assertAggregates(9, 2)
+        out = StringIO()
+        call_command('rebuild_rating_summaries', '--dry-run', stdout=out)
+        self.assertIn('0 products', out.getvalue())
+
+    def test_migration_merges_reviews(self):
+        migration = importlib.import_module('products.migrations.0025_rating_histogram')
+        ProductRating.objects.create(product=self.product, user=self.users[0], rating=5)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE reviews_review (id integer PRIMARY KEY, rating integer, created_at datetime, '
+                'updated_at datetime, product_id integer, user_id integer)'
+            )
+            cursor.executemany(
+                'INSERT INTO reviews_review (rating, created_at, updated_at, product_id, user_id) VALUES (%s, %s, %s, %s, %s)',
+                [
+                    (1, '2025-03-01 10:00:00', '2025-03-01 10:00:00', self.product.pk, self.users[0].pk), #Already rated here, kept as is
+                    (3, '2025-03-02 10:00:00', '2025-03-02 10:00:00', self.product.pk, self.users[1].pk),
+                    (4, '2025-03-03 10:00:00', '2025-03-03 10:00:00', self.product.pk + 1000, self.users[2].pk), #Product gone
+                ],
+            )
+        editor = SimpleNamespace(connection=connection) #The functions only use the editor's connection; SQLite cannot open one inside a test transaction
+        migration.merge_reviews(django_apps, editor)
+        migration.fill_rating_summaries(django_apps, editor)
+        self.assertEqual(
+            sorted(ProductRating.objects.values_list('user__username', 'rating')),
+            [('rater0', 5), ('rater1', 3)],
+        )
+        self.assertAggregates(8, 2)
+
+
+class RatingScoreTest(CatalogTestCase):
+    """Bayesian rating score: many good ratings outrank one perfect one, unrated products rank last"""
+    category_name, subcategory_name, brand_name = 'Brakes', 'Pads', 'Brembo'
+
+    def setUp(self):
+        self.single, self.many, self.unrated = [self._product(name) for name in ('Single Pad', 'Many Pad', 'Unrated Pad')]
+        self.users = [User.objects.create_user(username=f'scorer{i}', password='testpass123') for i in range(5)]
+        ProductRating.objects.create(product=self.single, user=self.users[0], rating=5)
+        for user, stars in zip(self.users, (5, 5, 5, 5, 4)):
+            ProductRating.objects.create(product=self.many, user=user, rating=stars)
+
+    def assertScores(self):
+        # Every stored score must be the prior's score of the stored sum and count
+        prior = RatingPrior.current()
+        for product in Product.objects.all():
+            self.assertAlmostEqual(product.rating_score, prior.score(product.rating_sum, product.rating_count))
+
+    def test_writes_keep_scores_current(self):
+        self.assertScores()
+        rating = ProductRating.objects.get(product=self.single)
+        rating.rating = 1
+        rating.save()
+        self.assertScores()
+        rating.delete()
+        self.assertScores()
+        self.assertEqual(Product.objects.get(pk=self.single.pk).rating_score, 0)
+
+    def test_top_rated_sort(self):
+        response = self.client.get(reverse('products:product_list'), {'sort_by': 'top_rated', 'sort_order': 'desc'})
+        self.assertEqual([p.id for p in response.context['products']], [self.many.id, self.single.id, self.unrated.id])
+        response = self.client.get(reverse('products:product_list'), {'sort_by': 'Rating', 'sort_order': 'desc'})
+        self.assertEqual(response.context['products'][0].id, self.single.id) #The plain average still puts one 5 first
+
+    def test_batch_job_moves_the_prior(self):
+        out = StringIO()
+        call_command('rebuild_rating_scores', stdout=out)
+        prior = RatingPrior.objects.get()
+        self.assertAlmostEqual(prior.mean, 29 / 6)
+        self.assertAlmostEqual(prior.weight, settings.RATING_SCORE_PRIOR_WEIGHT)
+        self.assertScores()
+        ProductRating.objects.create(product=self.unrated, user=self.users[1], rating=3) #Scored under the stored prior
+        self.assertScores()
+        call_command('check_facet_index', stdout=StringIO()) #The index follows the rescored catalog
+
+    def test_repair_restores_scores(self):
+        Product.objects.update(rating_score=2.5) #Corrupts the scores
+        call_command('rebuild_rating_summaries', stdout=StringIO())
+        self.assertScores()
+
+    def test_recommendations_use_score(self):
+        response = self.client.get(reverse('products:product_detail', args=[self.unrated.slug]))
+        self.assertEqual([p.id for p in response.context['recommended_products']], [self.many.id, self.single.id])
+        call_command('rebuild_recommendations', stdout=StringIO())
+        recommended = list(ProductRecommendation.objects.filter(product=self.unrated).values_list('recommended_id', flat=True))
+        self.assertEqual(recommended, [self.many.id, self.single.id])
+
+    def test_sort_uses_score_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are SQLite specific')
+        plan = Product.objects.filter(is_active=True).order_by('-rating_score', '-id')[:13].explain()
+        self.assertIn('product_active_score_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ProductSearchIndexTest(CatalogTestCase):
+    """Full-text index stays in sync with the catalog and ranks matches"""
+    category_name, subcategory_name, brand_name = 'Exhaust', 'Mufflers', 'Akrapovic'
+
+    def test_name_match_ranks_above_description_match(self):
+        in_description = self._product('Slip-on Line', description='Pairs well with a titanium header')
+        in_name = self._product('Titanium Evolution Line')
+        self.assertEqual(search_product_ids('titanium'), [in_name.id, in_description.id])
+
+    def test_prefix_and_phrase_queries(self):
+        product = self._product('Carbon Fibre Tailpipe', keywords='race, track')
+        other = self._product('Fibre Carbon Heat Shield')
+        self.assertEqual(set(search_product_ids('carb tail')), {product.id}) #Prefixes of both words
+        self.assertEqual(search_product_ids('"carbon fibre"'), [product.id]) #Exact phrase only
+        self.assertEqual(set(search_product_ids('carbon fibre')), {product.id, other.id})
+
+    def test_joined_names_are_searchable_and_follow_renames(self):
+        product = self._product('Evolution Line')
+        self.assertEqual(search_product_ids('akrapovic'), [product.id])
+        self.brand.name = 'Remus' #Renames the brand
+        self.brand.save()
+        self.assertEqual(search_product_ids('akrapovic'), [])
+        self.assertEqual(search_product_ids('remus'), [product.id])
+        self.assertEqual(search_product_ids('mufflers'), [product.id]) #Subcategory name
+
+    def test_inactive_and_deleted_products_leave_the_index(self):
+        product = self._product('Valvetronic Exhaust')
+        product.is_active = False
+        product.save()
+        self.assertEqual(search_product_ids('valvetronic'), [])
+        product.is_active = True
+        product.save()
+        self.assertEqual(search_product_ids('valvetronic'), [product.id])
+        product.delete()
+        self.assertEqual(search_product_ids('valvetronic'), [])
+
+    def test_search_syntax_in_user_input_is_ignored(self):
+        product = self._product('Header Pipe')
+        self.assertEqual(search_product_ids('header AND ( NEAR "'), [])
+        self.assertEqual(search_product_ids('header*'), [product.id])
+        self.assertEqual(search_product_ids('!!!'), [])
+
+    def test_reindex_command_restores_bulk_updates(self):
+        product = self._product('Downpipe')
+        Product.objects.filter(pk=product.pk).update(name='Catless Downpipe') #Bypasses the signals
+        self.assertEqual(search_product_ids('catless'), [])
+        call_command('reindex_products', stdout=StringIO())
+        self.assertEqual(search_product_ids('catless'), [product.id])
+
+    def test_search_view_renders_ranked_page(self):
+        self._product('Slip-on Line', description='Pairs well with a titanium header')
+        self._product('Titanium Evolution Line')
+        response = self.client.get(reverse('products:search'), {'q': 'titanium'})
+        names = [p.name for p in response.context['products']]
+        self.assertEqual(names, ['Titanium Evolution Line', 'Slip-on Line'])
+
+    def test_migration_builds_the_index(self):
+        migration = importlib.import_module('products.migrations.0018_product_search_index')
+        product = self._product('Titanium Evolution Line', keywords='race')
+        self._product('Hidden Line', is_active=False)
+        editor = SimpleNamespace(connection=connection) #The functions only use the editor's connection
+        migration.drop_search_index(django_apps, editor)
+        migration.create_search_index(django_apps, editor)
+        self.assertEqual(search_product_ids('titanium'), [product.id])
+        self.assertEqual(search_product_ids('akrapovic race'), [product.id]) #Brand and keywords
+        self.assertEqual(search_product_ids('hidden'), [])
+
+
+class AutocompleteTest(CatalogTestCase):
+    """Suggestions come from the in-process prefix index"""
+    category_name, subcategory_name, brand_name = 'Suspension', 'Coilovers', 'Bilstein'
+
+    def _suggest(self, query, **params):
+        response = self.client.get(reverse('products:autocomplete'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(s['type'], s['label']) for s in response.json()['suggestions']]
+
+    def test_matches_word_starts_skus_and_groups(self):
+        product = self._product('B16 Damptronic Coilover', sku='BIL-SUS-0042')
+        suggestion_index.build()
+        self.assertIn(('product', 'B16 Damptronic Coilover'), self._suggest('damp'))
+        self.assertEqual(self._suggest('bil-sus'), [('product', product.name)])
+        self.assertIn(('brand', 'Bilstein'), self._suggest('bil'))
+        self.assertIn(('subcategory', 'Coilovers'), self._suggest('coilo'))
+        self.assertEqual(self._suggest('zzz'), [])
+
+    def test_ranked_by_popularity_and_limited(self):
+        self._product('Sport Spring Kit')
+        self._product('Sport Coilover Kit', is_bestseller=True)
+        for i in range(5):
+            self._product(f'Sport Sway Bar {i}')
+        suggestion_index.build()
+        suggestions = self._suggest('sport', limit=3)
+        self.assertEqual(len(suggestions), 3)
+        self.assertEqual(suggestions[0], ('product', 'Sport Coilover Kit'))
+
+    def test_answers_without_queries_once_built(self):
+        self._product('Air Suspension Kit')
+        suggestion_index.build()
+        with self.assertNumQueries(0):
+            self._suggest('air')
+
+    def test_signals_refresh_the_index(self):
+        product = self._product('Lowering Springs')
+        suggestion_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Race Springs'
+            product.save()
+        self.assertEqual(self._suggest('lowering'), [])
+        self.assertEqual(self._suggest('race'), [('product', 'Race Springs')])
+        with self.captureOnCommitCallbacks(execute=True):
+            self._product('Race Dampers') #New products appear once committed
+        self.assertEqual(len(self._suggest('race')), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self._suggest('race'), [('product', 'Race Dampers')])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.is_active = False
+            self.brand.save()
+        self.assertNotIn(('brand', 'Bilstein'), self._suggest('bil'))
+
+    def test_rolled_back_changes_stay_out(self):
+        product = self._product('Lowering Springs')
+        suggestion_index.build()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            product.name = 'Race Springs'
+            product.save()
+            self.brand.delete()
+            raise RuntimeError
+        self.assertEqual(self._suggest('lowering'), [('product', 'Lowering Springs')])
+        self.assertIn(('brand', 'Bilstein'), self._suggest('bil'))
+
+    def test_one_thread_rebuilds_an_old_index(self):
+        self._product('Adjustable Top Mount')
+        suggestion_index.build()
+        suggestion_index.built_at = time.monotonic() - settings.AUTOCOMPLETE_MAX_AGE - 1
+        started, finish, builds = threading.Event(), threading.Event(), []
+
+        def slow_build():
+            builds.append(threading.current_thread())
+            started.set()
+            finish.wait(5)
+
+        with mock.patch.object(suggestion_index, 'build', side_effect=slow_build):
+            builder = threading.Thread(target=suggestion_index.ensure_fresh)
+            builder.start()
+            self.assertTrue(started.wait(5))
+            self.assertEqual(self._suggest('adjust'), [('product', 'Adjustable Top Mount')]) #Old index, no second build
+            finish.set()
+            builder.join(5)
+        self.assertEqual(builds, [builder])
+
+
+class KeysetPaginationTest(CatalogTestCase):
+    """Cursor pages match the offset pages for every sort"""
+    category_name, subcategory_name, brand_name = 'Aero', 'Wings', 'Voltex'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rater', password='testpass123') #Creates a test user
+        for i in range(29):
+            product = self._product(
+                f'Wing {i % 7}', #Repeats names so the id has to break ties
+                price=Decimal(f'{100 + i % 5}.00'),
+                sale_price=Decimal('90.00') if i % 6 == 0 else None,
+                stock_quantity=2,
+            )
+            if i % 3:
+                ProductRating.objects.create(product=product, user=self.user, rating=1 + i % 5) #Leaves every third product unrated
+        self.addCleanup(cache.clear) #Drops cached counts
+
+    def _walk(self, paginator, direction='next'):
+        # Follow cursors from the first page to the last (and back)
+        page = paginator.get_page()
+        pages = [page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            pages.append(page)
+        if direction == 'previous':
+            while page.has_previous():
+                page = paginator.get_page(page.previous_cursor)
+                pages.append(page)
+        return pages
+
+    def test_cursor_pages_cover_every_sort_in_order(self):
+        for sort_by in ['name', 'price', 'Rating', 'newest']:
+            for sort_order in ['asc', 'desc']:
+                with self.subTest(sort_by=sort_by, sort_order=sort_order):
+                    products, keys = sort_products(Product.objects.filter(is_active=True), sort_by, sort_order)
+                    paginator = KeysetPaginator(products, 12, keys)
+                    expected = list(paginator.queryset.values_list('id', flat=True)) #The full ordering
+                    pages = self._walk(paginator)
+                    self.assertEqual([p.id for page in pages for p in page], expected)
+                    self.assertEqual([page.number for page in pages], [1, 2, 3])
+                    for number, page in enumerate(pages, 1):
+                        offset_page = paginator.get_page(number=number)
+                        self.assertEqual([p.id for p in page], [p.id for p in offset_page])
+
+    def test_previous_cursors_walk_back(self):
+        products, keys = sort_products(Product.objects.all(), 'Rating', 'desc')
+        pages = self._walk(KeysetPaginator(products, 12, keys), direction='previous')
+        self.assertEqual([page.number for page in pages], [1, 2, 3, 2, 1])
+        self.assertEqual([p.id for p in pages[1]], [p.id for p in pages[3]])
+        self.assertEqual([p.id for p in pages[0]], [p.id for p in pages[4]])
+        self.assertFalse(pages[4].has_previous())
+
+    def test_forged_cursor_falls_back_to_page_number(self):
+        products, keys = sort_products(Product.objects.all(), 'name', 'asc')
+        paginator = KeysetPaginator(products, 12, keys)
+        self.assertEqual(paginator.get_page('not-a-cursor', '2').number, 2)
+        self.assertEqual(paginator.get_page('not-a-cursor').number, 1)
+
+    def test_deep_page_skips_offset_and_count(self):
+        products, keys = sort_products(Product.objects.all(), 'price', 'asc')
+        paginator = KeysetPaginator(products, 12, keys)
+        cursor = paginator.get_page(number=2).next_cursor
+        paginator.count #Caches the count
+        with CaptureQueriesContext(connection) as queries:
+            page = KeysetPaginator(products, 12, keys).get_page(cursor)
+            page.paginator.num_pages
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(queries), 1) #Only the page itself
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_views_link_pages_with_cursors(self):
+        urls = [
+            reverse('products:product_list') + '?sort_by=price&sort_order=desc',
+            reverse('products:category_detail', args=[self.category.slug]),
+            reverse('products:brand_detail', args=[self.brand.slug]),
+            reverse('products:subcategory_detail', args=[self.category.slug, self.subcategory.slug]),
+            reverse('products:search'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['products']
+                separator = '&' if '?' in url else '?'
+                second = self.client.get(f'{url}{separator}cursor={quote(first.next_cursor)}') #Follows the next link
+                self.assertEqual(second.context['products'].number, 2)
+                self.assertContains(second, 'cursor=')
+                first_ids = {p.id for p in first}
+                self.assertFalse(first_ids & {p.id for p in second.context['products']})
+
+
+class CardQueryBudgetTest(CatalogTestCase):
+    """Card pages run a fixed number of queries, within their declared budgets"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='collector', password='testpass123') #Creates a test user
+        self.brands = [Brand.objects.create(name=f'Brand {i}') for i in range(4)] #Gives every card a different brand to load
+        self.addCleanup(cache.clear) #Drops cached counts
+        self.client.login(username='collector', password='testpass123')
+
+    def _create_products(self, count):
+        for i in range(Product.objects.count(), Product.objects.count() + count):
+            product = self._product(f'Turbo Kit {i}', brand=self.brands[i % len(self.brands)], is_featured=True, is_bestseller=True)
+            Wishlist.objects.create(user=self.user, product=product) #Fills the wishlist page too
+
+    def _queries(self, request):
+        cache.clear() #Counts the paginator COUNT every time
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_card_pages_do_not_grow_with_page_size(self):
+        first = Product.objects.none()
+        requests = {
+            'home': lambda: self.client.get(reverse('products:home')),
+            'product_list': lambda: self.client.get(reverse('products:product_list'), {'category': self.category.slug}),
+            'product_detail': lambda: self.client.get(reverse('products:product_detail', args=[first.slug])),
+            'category_detail': lambda: self.client.get(reverse('products:category_detail', args=[self.category.slug])),
+            'subcategory_detail': lambda: self.client.get(reverse('products:subcategory_detail', args=[self.category.slug, self.subcategory.slug])),
+            'brand_detail': lambda: self.client.get(reverse('products:brand_detail', args=[self.brands[0].slug])),
+            'search': lambda: self.client.get(reverse('products:search'), {'q': 'turbo'}),
+            'search_all': lambda: self.client.get(reverse('products:search')),
+            'recently_viewed': lambda: self.client.post(
+                reverse('products:recently_viewed'),
+                json.dumps({'viewed': list(Product.objects.values_list('id', flat=True)[:3])}),
+                content_type='application/json',
+            ),
+            'wishlist': lambda: self.client.get(reverse('users:wishlist')),
+        }
+        self._create_products(2)
+        first = Product.objects.order_by('id').first()
+        small = {name: self._queries(request) for name, request in requests.items()}
+        self._create_products(22) #Fills every page and the recommendations
+        large = {name: self._queries(request) for name, request in requests.items()}
+        for name in requests:
+            with self.subTest(view=name):
+                self.assertLessEqual(large[name], small[name] + 1) #Only the page count is added once there is a second page
+
+    def test_for_cards_loads_brand_and_category_together(self):
+        self._create_products(5)
+        with self.assertNumQueries(1):
+            for product in Product.objects.for_cards():
+                str(product), product.category.name, product.average_rating, product.stock_status, product.is_on_sale
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    """The middleware fails requests that run more queries than their view declares"""
+
+    def _run(self, budget, queries):
+        @query_budget(budget)
+        def view(request):
+            pass
+
+        def get_response(request):
+            for _ in range(queries):
+                Product.objects.exists() #One query each
+            return 'response'
+
+        request = RequestFactory().get('/')
+        request.resolver_match = type('Match', (), {'view_name': 'test-view'})()
+        with override_settings(QUERY_BUDGET_CHECKS=True):
+            middleware = QueryBudgetMiddleware(get_response)
+        middleware.process_view(request, view, (), {})
+        return middleware(request)
+
+    def test_within_budget(self):
+        self.assertEqual(self._run(budget=3, queries=3), 'response')
+
+    def test_over_budget_raises(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'test-view ran 4 queries, budget is 3'):
+            self._run(budget=3, queries=4)
+
+
+class PerformanceMiddlewareTest(TestCase):
+    """Measured requests get a Server-Timing header, a log line and a place in the per-view histograms"""
+
+    def setUp(self):
+        histograms.reset()
+
+    def _middleware(self, get_response, **options):
+        with override_settings(**{'PERFORMANCE_SAMPLE_RATE': 1, 'PERFORMANCE_SERVER_TIMING': True, **options}):
+            return PerformanceMiddleware(get_response)
+
+    def test_measures_queries_templates_and_cache(self):
+        def get_response(request):
+            Product.objects.exists()
+            cache.get('performance-test') #Miss
+            cache.set('performance-test', 1)
+            cache.get('performance-test') #Hit
+            return HttpResponse(render_to_string('products/_pagination.html', {}))
+
+        request = RequestFactory().get('/')
+        request.resolver_match = type('Match', (), {'view_name': 'test-view'})()
+        with self.assertLogs('revforge.performance', 'INFO') as logs:
+            response = self._middleware(get_response)(request)
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('cache;desc="1 hits, 1 misses"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['queries'], record['cache_hits'], record['cache_misses']), ('test-view', 1, 1, 1))
+        self.assertGreater(record['template_ms'], 0)
+        self.assertEqual([row['count'] for row in histograms.rows() if row['view'] == 'test-view'], [1])
+
+    def test_unsampled_requests_are_left_alone(self):
+        with override_settings(PERFORMANCE_SAMPLE_RATE=0):
+            response = self.client.get(reverse('products:about'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(histograms.rows(), [])
+
+    def test_stats_page_is_for_staff(self):
+        with override_settings(PERFORMANCE_SAMPLE_RATE=1):
+            self.client.get(reverse('products:about'))
+            self.assertEqual(self.client.get(reverse('performance_stats')).status_code, 302) #To the admin login
+            staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+            self.client.force_login(staff)
+            response = self.client.get(reverse('performance_stats'))
+            self.assertContains(response, 'products:about')
+            self.client.post(reverse('performance_stats'))
+        self.assertEqual([row['view'] for row in histograms.rows()], ['performance_stats']) #Only the reset itself is left
+
+
+class RecommendationTest(CatalogTestCase):
+    """Recommendations are computed offline and read with one lookup"""
+    category_name, subcategory_name, brand_name = 'Brakes', 'Pads', 'Brembo'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='testpass123') #Creates a test buyer
+        self.wheels = Category.objects.create(name='Wheels') #Creates a second test category
+        rims = SubCategory.objects.create(name='Rims', category=self.wheels)
+        bbs = Brand.objects.create(name='BBS')
+        self.pads = [self._product(f'Brake Pad {i}') for i in range(4)]
+        self.rims = [self._product(f'Forged Rim {i}', subcategory=rims, brand=bbs) for i in range(3)]
+
+    def _order(self, *products):
+        order = Order.objects.create(
+            user=self.user, subtotal='0', total_amount='0', shipping_address='1 Test Street', shipping_city='Athens',
+            shipping_state='Attica', shipping_postal_code='10558', shipping_country='Greece', shipping_phone='2100000000',
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+        return order
+
+    def _recommended(self, product):
+        return list(ProductRecommendation.objects.filter(product=product).values_list('recommended_id', flat=True))
+
+    def test_same_category_first_then_co_purchases(self):
+        for _ in range(3):
+            self._order(self.pads[0], self.rims[2]) #Bought together three times
+        call_command('rebuild_recommendations', stdout=StringIO())
+        recommended = self._recommended(self.pads[0])
+        self.assertEqual(recommended[:3], [p.id for p in self.pads[1:]])
+        self.assertNotIn(self.pads[0].id, recommended)
+        self.assertLess(recommended.index(self.rims[2].id), recommended.index(self.rims[0].id))
+
+    def test_co_wishlist_counts(self):
+        shoppers = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(2)]
+        for shopper in shoppers:
+            Wishlist.objects.create(user=shopper, product=self.rims[0])
+            Wishlist.objects.create(user=shopper, product=self.pads[3])
+        call_command('rebuild_recommendations', stdout=StringIO())
+        recommended = self._recommended(self.rims[0])
+        self.assertLess(recommended.index(self.pads[3].id), recommended.index(self.pads[0].id)) #Outranks the other pads
+
+    def test_view_reads_precomputed_rows(self):
+        call_command('rebuild_recommendations', stdout=StringIO())
+        ProductRecommendation.objects.filter(product=self.pads[0], rank=1).update(recommended=self.rims[1]) #Only the table can say this
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('products:product_detail', args=[self.pads[0].slug]))
+        recommended = [p.id for p in response.context['recommended_products']]
+        self.assertEqual(recommended[0], self.rims[1].id)
+        self.assertEqual(len(recommended), 3)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'products_product' in q['sql'] and 'recommend' in q['sql']]), 1)
+
+    def test_view_falls_back_without_rows(self):
+        response = self.client.get(reverse('products:product_detail', args=[self.pads[0].slug]))
+        self.assertEqual({p.id for p in response.context['recommended_products']}, {p.id for p in self.pads[1:]})
+
+    def test_incremental_rebuild_only_touches_changed_products(self):
+        call_command('rebuild_recommendations', stdout=StringIO())
+        first_run = dict(ProductRecommendation.objects.filter(rank=1).values_list('product_id', 'computed_at'))
+        self._order(self.pads[1], self.rims[1])
+        output = StringIO()
+        call_command('rebuild_recommendations', '--incremental', stdout=output)
+        self.assertIn('2 products changed', output.getvalue())
+        second_run = dict(ProductRecommendation.objects.filter(rank=1).values_list('product_id', 'computed_at'))
+        changed = {pk for pk in second_run if second_run[pk] != first_run[pk]}
+        self.assertEqual(changed, {self.pads[1].id, self.rims[1].id})
+
+    def test_inactive_products_are_dropped(self):
+        call_command('rebuild_recommendations', stdout=StringIO())
+        self.pads[1].is_active = False
+        self.pads[1].save()
+        response = self.client.get(reverse('products:product_detail', args=[self.pads[0].slug]))
+        self.assertNotIn(self.pads[1].id, [p.id for p in response.context['recommended_products']])
+        call_command('rebuild_recommendations', '--incremental', stdout=StringIO())
+        self.assertFalse(ProductRecommendation.objects.filter(product=self.pads[1]).exists())
+
+
+class CardCacheTest(CatalogTestCase):
+    """Rendered card sections are cached per product and retired when the product changes"""
+    category_name, subcategory_name, brand_name = 'Exhaust', 'Mufflers', 'Akrapovic'
+
+    def setUp(self):
+        self.product = self._product('Titanium Muffler', price=Decimal('1500.00'))
+        self.user = User.objects.create_user(username='driver', password='testpass123') #Creates a test user
+        card_cache().clear()
+        self.addCleanup(card_cache().clear)
+
+    def _render(self):
+        # Return the brand page and how many card sections were rendered for it
+        rendered = []
+
+        def record(sender, template, **kwargs):
+            if template.name in ('products/_product_card_image.html', 'products/_product_card_info.html'):
+                rendered.append(template.name)
+
+        template_rendered.connect(record)
+        try:
+            response = self.client.get(reverse('products:brand_detail', args=[self.brand.slug]))
+        finally:
+            template_rendered.disconnect(record)
+        return response.content.decode(), len(rendered)
+
+    def test_second_request_uses_the_cache(self):
+        _, first = self._render()
+        content, second = self._render()
+        self.assertEqual(first, 2)
+        self.assertEqual(second, 0)
+        self.assertIn('Titanium Muffler', content)
+
+    def test_changes_retire_the_cached_card(self):
+        self._render()
+        self.product.name = 'Carbon Muffler'
+        self.product.save()
+        self.assertIn('Carbon Muffler', self._render()[0])
+        self.brand.name = 'Remus'
+        self.brand.save()
+        self.assertIn('Remus', self._render()[0])
+        self.category.name = 'Exhaust Systems'
+        self.category.save()
+        self.assertIn('Exhaust Systems', self._render()[0])
+        ProductRating.objects.create(product=self.product, user=self.user, rating=4)
+        self.assertIn('(4.0/5)', self._render()[0])
+
+    def test_wishlist_heart_stays_per_user(self):
+        fan = User.objects.create_user(username='fan', password='testpass123') #Creates a user with the product in the wishlist
+        Wishlist.objects.create(user=fan, product=self.product)
+        self.client.login(username='fan', password='testpass123')
+        self.assertIn('Remove from Wishlist', self._render()[0])
+        self.client.login(username='driver', password='testpass123')
+        content, rendered = self._render()
+        self.assertEqual(rendered, 0) #Same cached sections
+        self.assertIn('Add to Wishlist', content)
+        self.assertNotIn('Remove from Wishlist', content)
+
+
+class SkuAllocationTest(CatalogTestCase):
+    """SKUs come from a counter per brand/category prefix"""
+    category_name, subcategory_name, brand_name = 'Suspension', 'Dampers', 'Öhlins Racing'
+
+    def test_numbers_follow_the_prefix_counter(self):
+        first, second = self._build_product(), self._build_product()
+        first.save()
+        with CaptureQueriesContext(connection) as queries:
+            second.save()
+        counter_queries = [q['sql'] for q in queries.captured_queries if 'products_skucounter' in q['sql']]
+        self.assertEqual(len(counter_queries), 2) #Counter bumped and read back, no probing for free SKUs
+        self.assertEqual(first.sku, 'HLI-SUS-0001') #Letters and digits only
+        self.assertEqual(second.sku, 'HLI-SUS-0002')
+
+    def test_counter_starts_after_existing_skus(self):
+        Product.objects.bulk_create([self._build_product(sku='HLI-SUS-0731'), self._build_product(sku='HLI-SUS-0731-X7')]) #Made before the counter
+        product = self._build_product()
+        product.save()
+        self.assertEqual(product.sku, 'HLI-SUS-0732')
+
+    def test_sku_entered_by_hand_moves_the_counter(self):
+        self._build_product().save()
+        self._build_product(sku='HLI-SUS-0050').save()
+        product = self._build_product()
+        product.save()
+        self.assertEqual(product.sku, 'HLI-SUS-0051')
+
+    def test_bulk_allocation_reserves_one_block_per_prefix(self):
+        vendor = User.objects.create_user(username='team', password='testpass123').profile #Profile made by the signal
+        products = [self._build_product(f'Damper {i}') for i in range(3)] + [self._build_product(vendor=vendor)]
+        with self.assertNumQueries(2 * 6): #Per prefix: bump, find the highest used SKU, create the counter in a savepoint, read it back
+            Product.allocate_skus(products)
+        Product.objects.bulk_create(products)
+        self.assertEqual([p.sku for p in products], ['HLI-SUS-0001', 'HLI-SUS-0002', 'HLI-SUS-0003', 'VENDOR-HLI-SUS-0001'])
+        self.assertEqual(SkuCounter.objects.get(prefix='HLI-SUS').last_number, 3)
+
+
+class CatalogImportExportTest(CatalogTestCase):
+    """catalog_import and catalog_export stream products in chunks and report rejected rows"""
+    category_name, subcategory_name, brand_name = 'Aero', 'Wings', 'Voltex'
+
+    def setUp(self):
+        self.other_category = Category.objects.create(name='Body')
+        self.panels = SubCategory.objects.create(name='Panels', category=self.other_category)
+        self.product = self._product(
+            'Swan Neck Wing', sku='VOL-AER-0007', price=Decimal('1200.00'), stock_quantity=3,
+            category=self.category, subcategory=self.panels, #Subcategory from another category
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, text):
+        with open(self.path(name), 'w', encoding='utf-8') as file:
+            file.write(text)
+        return self.path(name)
+
+    def test_export_then_import_round_trips(self):
+        call_command('catalog_export', self.path('catalog.csv'), stdout=StringIO())
+        with open(self.path('catalog.csv'), encoding='utf-8') as file:
+            text = file.read()
+        self.assertIn('VOL-AER-0007,Swan Neck Wing,voltex,aero,body/panels,1200.00', text)
+        self.write('catalog.csv', text.replace('1200.00', '1100.00'))
+        call_command('catalog_import', self.path('catalog.csv'), stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, 1100)
+        self.assertEqual(self.product.subcategory, self.panels)
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertFalse(os.path.exists(self.path('catalog.csv.rejects.csv'))) #No side file without rejects
+
+    def test_import_creates_products_and_rejects_bad_rows(self):
+        header = 'sku,name,brand,category,subcategory,price,stock_quantity,description,is_featured\n'
+        rows = [
+            ',Gurney Flap,voltex,aero,wings,90,4,Test description for a gurney flap,yes',
+            ',Endplate Set,voltex,aero,wings,abc,4,Test description for endplates,no',
+            ',Dive Planes,nobrand,aero,wings,150,4,Test description for dive planes,no',
+            'VOL-AER-0007,,,,,1250,,,',
+        ]
+        path = self.write('new.csv', header + '\n'.join(rows) + '\n')
+        output = StringIO()
+        call_command('catalog_import', path, '--chunk-size', '2', stdout=output)
+
+        created = Product.objects.get(name='Gurney Flap')
+        self.assertEqual(created.sku, 'VOL-AER-0008') #Next number after the existing SKU
+        self.assertTrue(created.is_featured)
+        self.assertEqual(created.slug, 'gurney-flap')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, 1250) #Only the given columns change
+        self.assertEqual(self.product.stock_quantity, 3)
+        self.assertEqual(search_product_ids('gurney'), [created.pk]) #Indexed although bulk_create sends no signals
+        self.assertIn('rows/s', output.getvalue())
+
+        with open(path + '.rejects.csv', encoding='utf-8') as file:
+            rejects = {row['name']: row for row in csv.DictReader(file)}
+        self.assertEqual(set(rejects), {'Endplate Set', 'Dive Planes'})
+        self.assertEqual(rejects['Endplate Set']['line'], '3')
+        self.assertIn('price', rejects['Endplate Set']['errors'])
+        self.assertIn("no brand with slug 'nobrand'", rejects['Dive Planes']['errors'])
+
+    def test_imported_skus_move_the_counter(self):
+        SkuCounter.objects.create(prefix='VOL-AER', last_number=7) #In use, as after saving the product in setUp
+        header = 'sku,name,brand,category,subcategory,price,stock_quantity,description\n'
+        path = self.write('new.csv', header + 'VOL-AER-0008,Gurney Flap,voltex,aero,wings,90,4,Test description for a gurney flap\n')
+        call_command('catalog_import', path, stdout=StringIO())
+        self.assertEqual(SkuCounter.objects.get(prefix='VOL-AER').last_number, 8)
+        product = self._product('Canard')
+        self.assertEqual(product.sku, 'VOL-AER-0009') #Not the imported 0008
+
+    def test_skus_given_and_generated_in_one_batch_do_not_collide(self):
+        header = 'sku,name,brand,category,subcategory,price,stock_quantity,description\n'
+        rows = [
+            ',Gurney Flap,voltex,aero,wings,90,4,Test description for a gurney flap',
+            'VOL-AER-0008,Endplate Set,voltex,aero,wings,120,4,Test description for endplates',
+        ]
+        SkuCounter.objects.all().delete() #The counter of the prefix is created by this import
+        path = self.write('new.csv', header + '\n'.join(rows) + '\n')
+        call_command('catalog_import', path, stdout=StringIO())
+        self.assertEqual(Product.objects.get(name='Gurney Flap').sku, 'VOL-AER-0009')
+
+    def test_jsonl_import_looks_slugs_up_once(self):
+        lines = [
+            json.dumps({'name': f'Canard {i}', 'brand': 'voltex', 'category': 'aero', 'subcategory': 'wings',
+                        'price': '80.00', 'description': 'Test description for a canard'})
+            for i in range(6)
+        ]
+        path = self.write('new.jsonl', '\n'.join(lines + ['{not json']) + '\n')
+        with CaptureQueriesContext(connection) as queries:
+            call_command('catalog_import', path, '--chunk-size', '2', stdout=StringIO())
+        brand_lookups = [q for q in queries.captured_queries if 'FROM "products_brand"' in q['sql']]
+        self.assertEqual(len(brand_lookups), 1) #Cached after the first chunk
+        self.assertEqual(Product.objects.filter(name__startswith='Canard').count(), 6)
+        with open(path + '.rejects.jsonl', encoding='utf-8') as file:
+            self.assertEqual(json.loads(file.readline())['line'], 7)
+
+
+
+class SeedBenchTest(TestCase):
+    """seed_bench writes the same data for the same seed, with every derived field filled in"""
+
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by('sku').values_list('sku', 'name', 'price', 'sale_price', 'brand__name', 'rating_count')),
+            list(Order.objects.order_by('order_number').values_list('order_number', 'user__username', 'total_amount')),
+        )
+
+    def test_same_seed_same_data(self):
+        with transaction.atomic():
+            seed(120, seed=7, index=False)
+            first = self.snapshot()
+            transaction.set_rollback(True) #Back to an empty database
+        seed(120, seed=7, index=False)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_derived_data_is_consistent(self):
+        output = StringIO()
+        call_command('seed_bench', '--products', '150', '--orders', '40', stdout=output)
+        self.assertIn('150 products', output.getvalue())
+        self.assertEqual(Product.objects.filter(slug__startswith='bench-').count(), 150)
+
+        for product in Product.objects.filter(rating_count__gt=0)[:20]:
+            ratings = list(product.ratings.values_list('rating', flat=True))
+            self.assertEqual((product.rating_count, product.rating_sum), (len(ratings), sum(ratings)))
+        self.assertFalse(Product.objects.filter(discount_percentage__gt=0, sale_price__isnull=True).exists())
+
+        # Later SKUs and order numbers continue after the generated ones
+        seeded = Product.objects.first()
+        extra = Product.objects.create(
+            name='Extra Part', category=seeded.category, subcategory=seeded.subcategory,
+            brand=seeded.brand, price='10.00', description='Test description for an extra part',
+        )
+        self.assertEqual(Product.objects.filter(sku=extra.sku).count(), 1)
+        order = Order.objects.order_by('created_at').last()
+        self.assertEqual(
+            OrderNumberCounter.objects.get(day=order.created_at.date()).last_number,
+            Order.objects.filter(order_number__startswith=order.order_number[:12]).count(),
+        )
+        self.assertEqual(search_product_ids(seeded.name.split()[-1]), [seeded.pk]) #Indexed
+
+
+class SlowQueryLogTest(CatalogTestCase):
+    """Queries over SLOW_QUERY_LOG_MS are logged with a fingerprint, their caller and the SQLite plan"""
+    category_name, subcategory_name, brand_name = 'Brakes', 'Pads', 'Brembo'
+
+    def setUp(self):
+        self.product = self._product('Carbon Pads')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_fingerprint_ignores_parameters(self):
+        first = slow_queries.normalize('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'a\' LIMIT 21')
+        second = slow_queries.normalize('SELECT  *  FROM "t" WHERE "id" IN (%s) AND "name" = \'b\'\nLIMIT 5')
+        self.assertEqual(first, 'SELECT * FROM "t" WHERE "id" IN (...) AND "name" = ? LIMIT ?')
+        self.assertEqual(slow_queries.fingerprint(first), slow_queries.fingerprint(second))
+
+    def test_logs_view_caller_and_plan(self):
+        with self.assertLogs('revforge.slow_queries') as logs:
+            with connection.execute_wrapper(slow_queries.SlowQueryLogger(connection, 0)): #Every query is slow
+                self.client.get(reverse('products:product_detail', args=[self.product.slug]))
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        lookup = next(record for record in records if 'FROM "products_product"' in record['sql'] and record['view'])
+        self.assertEqual(lookup['view'], 'products.views.product_detail')
+        self.assertTrue(lookup['caller'].startswith('products/'))
+        self.assertTrue(lookup['plan']) #EXPLAIN QUERY PLAN lines
+        self.assertNotIn('Carbon', json.dumps(records)) #Parameters stay out of the log
+
+    def test_install_writes_log_and_report_summarizes_it(self):
+        path = os.path.join(self.directory.name, 'slow.jsonl')
+        with override_settings(SLOW_QUERY_LOG_MS=0.000001, SLOW_QUERY_LOG_FILE=path):
+            self.assertTrue(slow_queries.install())
+        self.addCleanup(self._uninstall)
+        Product.objects.filter(name='Carbon Pads').count()
+        Product.objects.filter(name='Other').count()
+        for handler in slow_queries.logger.handlers:
+            handler.flush()
+
+        output = StringIO()
+        call_command('slow_query_report', path, '--plans', stdout=output)
+        self.assertIn('slow queries', output.getvalue())
+        self.assertIn('caller: products/tests.py', output.getvalue())
+        self.assertIn('plan: ', output.getvalue())
+        self.assertIn('2x', output.getvalue()) #Both counts share a fingerprint
+
+    def test_report_since(self):
+        path = os.path.join(self.directory.name, 'slow.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            for time, fingerprint in (('2026-10-18T08:30:00.000+00:00', 'early'), ('2026-10-18T09:30:00.000+00:00', 'late')):
+                file.write(json.dumps({'time': time, 'ms': 150.0, 'fingerprint': fingerprint, 'sql': 'SELECT 1'}) + '\n')
+        with override_settings(TIME_ZONE='UTC'):
+            for since in ('2026-10-18T09:00', '2026-10-18T09:00:00+00:00'): #Bare datetimes are in the site time zone
+                output = StringIO()
+                call_command('slow_query_report', path, '--since', since, stdout=output)
+                self.assertIn('late', output.getvalue())
+                self.assertNotIn('early', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('slow_query_report', path, '--since', 'yesterday', stdout=StringIO())
+
+    def _uninstall(self):
+        connection.execute_wrappers[:] = [wrapper for wrapper in connection.execute_wrappers if not isinstance(wrapper, slow_queries.SlowQueryLogger)]
+        from django.db.backends.signals import connection_created
+        connection_created.disconnect(dispatch_uid='revforge.slow_queries')
+        for handler in list(slow_queries.logger.handlers):
+            handler.close()
+            slow_queries.logger.removeHandler(handler)
+        slow_queries.logger.propagate = True
+
+
+class ListingIndexTest(CatalogTestCase):
+    """The listing access paths are answered from an index, without sorting"""
+
+    def test_listing_plans_use_the_partial_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are SQLite specific')
+        user = User.objects.create_user(username='buyer', password='testpass123')
+        active = Product.objects.filter(is_active=True).for_cards()
+        plans = {
+            'product_active_category_idx': active.filter(category=self.category).order_by('name', 'id')[:13],
+            'product_active_subcat_idx': active.filter(subcategory=self.subcategory).order_by('name', 'id')[:13],
+            'product_active_brand_idx': active.filter(brand=self.brand).order_by('name', 'id')[:13],
+            'product_featured_idx': active.filter(is_featured=True)[:6],
+            'order_user_created_idx': Order.objects.filter(user=user)[:20],
+            'wishlist_user_added_idx': Wishlist.objects.filter(user=user)[:20],
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index=index):
+                plan = queryset.explain()
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class EffectivePriceTest(CatalogTestCase):
+    """effective_price stores the current price, so price order and price ranges come from an index"""
+    category_name, subcategory_name, brand_name = 'Aero', 'Wings', 'Voltex'
+
+    def setUp(self):
+        self.cheap = self._product('Gurney Flap', price=Decimal('90.00'))
+        self.discounted = self._product('Swan Neck Wing', price=Decimal('200.00'), discount_percentage=50) #100.00 now
+        self.dear = self._product('Endplate Set', price=Decimal('150.00'))
+
+    def _listed(self, **params):
+        response = self.client.get(reverse('products:product_list'), params)
+        return [product.name for product in response.context['products']]
+
+    def test_save_keeps_effective_price_current(self):
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, Decimal('100.00'))
+        self.discounted.discount_percentage = 0
+        self.discounted.save()
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.discounted.effective_price, Decimal('200.00'))
+
+    def test_price_sort_and_range(self):
+        self.assertEqual(self._listed(sort_by='price'), ['Gurney Flap', 'Swan Neck Wing', 'Endplate Set'])
+        self.assertEqual(self._listed(sort_by='price', sort_order='desc'), ['Endplate Set', 'Swan Neck Wing', 'Gurney Flap'])
+        self.assertEqual(self._listed(sort_by='price', min_price='95', max_price='120'), ['Swan Neck Wing']) #Its sale price, not the list price
+        self.assertEqual(len(self._listed(min_price='cheap', max_price='NaN')), 3) #Unreadable bounds are ignored
+
+    def test_price_order_uses_the_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are SQLite specific')
+        products, keys = sort_products(Product.objects.filter(is_active=True).for_cards(), 'price', 'asc')
+        plan = products.order_by(*[f for f, _ in keys])[:13].explain()
+        self.assertIn('product_active_price_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_catalog_import_updates_effective_price(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'prices.csv')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(f'sku,discount_percentage\n{self.dear.sku},20\n')
+            call_command('catalog_import', path, stdout=StringIO())
+        self.dear.refresh_from_db()
+        self.assertEqual(self.dear.effective_price, Decimal('120.00'))
+
+
+class FacetTest(CatalogTestCase):
+    """Facet counts come from the in-memory bitmap index and match the listing"""
+    category_name, subcategory_name, brand_name = 'Engine', 'Pistons', 'Mahle'
+
+    def setUp(self):
+        self.discs = SubCategory.objects.create(name='Discs', category=Category.objects.create(name='Brakes'))
+        self.brembo = Brand.objects.create(name='Brembo')
+        self.forged = self._product('Forged Piston', price=Decimal('80.00'), stock_quantity=20, is_authentic_f1_part=True)
+        self.cast = self._product('Cast Piston', price=Decimal('40.00'), stock_quantity=0)
+        self.carbon = self._product('Carbon Disc', subcategory=self.discs, brand=self.brembo, price=Decimal('600.00'), stock_quantity=20, discount_percentage=25) #450.00 now
+        self.steel = self._product('Steel Disc', subcategory=self.discs, brand=self.brembo, price=Decimal('120.00'), stock_quantity=3)
+        self.mahle_disc = self._product('Mahle Disc', subcategory=self.discs, price=Decimal('90.00'), stock_quantity=20)
+        facet_index.build()
+
+    def _counts(self, **selection):
+        return {name: {value: count for value, count in values.items() if count} for name, values in facet_index.counts(selection).items()}
+
+    def test_counts_ignore_their_own_facet(self):
+        counts = self._counts(brand=['mahle'])
+        self.assertEqual(counts['brand'], {'mahle': 3, 'brembo': 2}) #Other brands stay pickable
+        self.assertEqual(counts['category'], {'engine': 2, 'brakes': 1})
+        self.assertEqual(counts['stock'], {'in_stock': 2, 'out_of_stock': 1})
+        self.assertEqual(counts['authentic'], {'1': 1})
+        counts = self._counts(brand=['mahle', 'brembo'], category=['brakes'], price_band=['100-250', '250-500'])
+        self.assertEqual(counts['brand'], {'brembo': 2})
+        self.assertEqual(counts['price_band'], {'50-100': 1, '100-250': 1, '250-500': 1})
+        self.assertEqual(counts['on_sale'], {'1': 1})
+        self.assertEqual(counts['stock'], {'in_stock': 1, 'low_stock': 1})
+
+    def test_listing_matches_the_counts(self):
+        params = {'brand': ['mahle', 'brembo'], 'stock': ['in_stock', 'low_stock'], 'price_band': ['50-100', '100-250']}
+        response = self.client.get(reverse('products:product_list'), params)
+        self.assertEqual(sorted(p.name for p in response.context['products']), ['Forged Piston', 'Mahle Disc', 'Steel Disc'])
+        self.assertEqual(response.context['total'], 3)
+        brands = next(facet for facet in response.context['facets'] if facet['name'] == 'brand')
+        self.assertEqual([(o['value'], o['count'], o['selected']) for o in brands['options']], [('brembo', 1, True), ('mahle', 2, True)])
+        response = self.client.get(reverse('products:product_list'), {'on_sale': '1', 'max_price': '500'})
+        self.assertEqual([p.name for p in response.context['products']], ['Carbon Disc'])
+        self.assertEqual(response.context['total'], 1)
+        response = self.client.get(reverse('products:product_list'), {'price_band': 'cheap', 'stock': 'gone'}) #Unknown values are ignored
+        self.assertEqual(response.context['total'], 5)
+
+    def test_counts_without_queries(self):
+        with self.assertNumQueries(0):
+            facet_index.facets({'brand': ['mahle'], 'on_sale': ['1']}, facet_index.price_mask(Decimal('50'), Decimal('500')))
+
+    def test_catalog_changes_update_the_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cast.stock_quantity = 10
+            self.cast.save()
+        self.assertEqual(self._counts()['stock'], {'in_stock': 4, 'low_stock': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.steel.delete()
+            self._product('Ceramic Disc', subcategory=self.discs, brand=self.brembo, price=Decimal('900.00'))
+        self.assertEqual(self._counts(category=['brakes'])['brand'], {'brembo': 2, 'mahle': 1})
+        Product.objects.filter(pk=self.forged.pk).update(is_active=False) #update() sends no signal
+        facet_index.refresh([self.forged.pk])
+        self.assertEqual(len(facet_index), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = 'MAHLE Motorsport'
+            self.brand.save()
+        self.assertIsNone(facet_index.built_at) #Labels are rebuilt on the next lookup
+
+    def test_rolled_back_changes_stay_out(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.cast.stock_quantity = 10
+            self.cast.save()
+            self.steel.delete()
+            raise RuntimeError
+        self.assertEqual(self._counts()['stock'], {'in_stock': 3, 'low_stock': 1, 'out_of_stock': 1})
+        self.assertEqual(len(facet_index), 5)
+
+    def test_one_thread_rebuilds_an_old_index(self):
+        facet_index.built_at = time.monotonic() - settings.FACET_INDEX_MAX_AGE - 1
+        started, finish, builds = threading.Event(), threading.Event(), []
+
+        def slow_build():
+            builds.append(threading.current_thread())
+            started.set()
+            finish.wait(5)
+
+        with mock.patch.object(facet_index, 'build', side_effect=slow_build):
+            builder = threading.Thread(target=facet_index.ensure_fresh)
+            builder.start()
+            self.assertTrue(started.wait(5))
+            facet_index.ensure_fresh() #Does not wait for the rebuild, nor start another
+            self.assertEqual(self._counts()['brand'], {'mahle': 3, 'brembo': 2}) #Still served from the old snapshot
+            finish.set()
+            builder.join(5)
+        self.assertEqual(builds, [builder])
+
+
+class IndexListingTest(CatalogTestCase):
+    """product_list filters, sorts and pages in the facet index and reads only the page rows"""
+    category_name, subcategory_name, brand_name = 'Cooling', 'Radiators', 'Mishimoto'
+
+    def setUp(self):
+        for i in range(30):
+            product = self._product(
+                f'Radiator {i % 7}', price=Decimal(100 + i % 5), discount_percentage=10 * (i % 3), stock_quantity=i % 4,
+                is_featured=i % 2 == 0,
+            )
+            if i % 3:
+                ProductRating.objects.create(product=product, user=User.objects.create_user(f'rater{i}'), rating=1 + i % 5)
+
+    def _walk(self, **params):
+        # Follow the next links from the first page, then the previous links back
+        url = reverse('products:product_list')
+        response = self.client.get(url, params)
+        pages = [[p.pk for p in response.context['products']]]
+        while response.context['products'].has_next():
+            response = self.client.get(url, {**params, 'cursor': response.context['products'].next_cursor})
+            pages.append([p.pk for p in response.context['products']])
+        back = [pages[-1]]
+        while response.context['products'].has_previous():
+            response = self.client.get(url, {**params, 'cursor': response.context['products'].previous_cursor})
+            back.insert(0, [p.pk for p in response.context['products']])
+        self.assertEqual(back, pages)
+        return [pk for page in pages for pk in page]
+
+    def test_every_sort_matches_the_database(self):
+        for sort_by, field in (('name', 'name'), ('price', 'effective_price'), ('Rating', 'rating_avg'), ('newest', 'created_at')):
+            for sort_order in ('asc', 'desc'):
+                with self.subTest(sort_by=sort_by, sort_order=sort_order):
+                    products, keys = sort_products(Product.objects.filter(is_active=True, is_featured=True), sort_by, sort_order)
+                    expected = list(KeysetPaginator(products, 12, keys).queryset.values_list('id', flat=True))
+                    self.assertEqual(self._walk(sort_by=sort_by, sort_order=sort_order, featured='1'), expected)
+
+    def test_page_jumps(self):
+        expected = list(Product.objects.filter(is_active=True).order_by('effective_price', 'id').values_list('id', flat=True))
+        response = self.client.get(reverse('products:product_list'), {'sort_by': 'price', 'page': 3})
+        self.assertEqual([p.pk for p in response.context['products']], expected[24:])
+        self.assertEqual(response.context['products'].paginator.num_pages, 3)
+
+    def test_only_the_page_rows_are_queried(self):
+        self.client.get(reverse('products:product_list')) #Builds the index
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('products:product_list'), {'stock': ['in_stock', 'low_stock'], 'sort_by': 'Rating', 'page': 2})
+        self.assertEqual(response.context['total'], 22)
+
+    def test_rebuilt_for_each_transaction(self):
+        facet_index.build()
+        self.assertEqual(len(facet_index), 30)
+        facet_index._atomic = (object(),) #As if built in a transaction that has since ended
+        self.client.get(reverse('products:product_list'))
+        self.assertEqual(facet_index._atomic, tuple(connection.atomic_blocks))
+
+    def test_consistency_check(self):
+        facet_index.build()
+        self.assertEqual(facet_index.differences(), [])
+        product = Product.objects.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Aluminium Radiator'
+            product.save()
+            ProductRating.objects.create(product=product, user=User.objects.create_user('late_rater'), rating=5)
+        self.assertEqual(facet_index.differences(), []) #Signals kept it in step
+        Product.objects.filter(pk=product.pk).update(is_featured=False) #update() sends no signal
+        self.assertIn((product.pk, 'featured=1 in the index only'), facet_index.differences())
+        facet_index.refresh([product.pk])
+        self.assertEqual(facet_index.differences(), [])
+        out = StringIO()
+        call_command('check_facet_index', stdout=out)
+        self.assertIn('matches the database', out.getvalue())
+
+
+class ProductAdminActionTest(CatalogTestCase):
+    """The admin's bulk actions refresh the in-memory indexes their update() calls bypass"""
+    category_name, subcategory_name, brand_name = 'Exhaust', 'Silencers', 'Akrapovic'
+
+    def setUp(self):
+        self.products = [self._product(f'Titanium Silencer {i}') for i in range(3)]
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'testpass123'))
+        facet_index.build()
+        suggestion_index.build()
+
+    def _run(self, action, products):
+        response = self.client.post(reverse('admin:products_product_changelist'), {
+            'action': action, '_selected_action': [product.pk for product in products],
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def _labels(self, prefix):
+        return [suggestion['label'] for suggestion in suggestion_index.suggest(prefix)]
+
+    def test_mark_featured(self):
+        self._run('mark_featured', self.products[:2])
+        self.assertEqual(facet_index.count({'featured': ['1']}), 2)
+        self.assertEqual(facet_index.differences(), [])
+        self.assertEqual(sorted(self._labels('titanium')[:2]), ['Titanium Silencer 0', 'Titanium Silencer 1']) #Featured rank first, in either order
+
+    def test_mark_bestseller(self):
+        self._run('mark_bestseller', self.products[2:])
+        self.assertEqual(facet_index.count({'bestseller': ['1']}), 1)
+        self.assertEqual(facet_index.differences(), [])
+        self.assertEqual(self._labels('titanium')[0], 'Titanium Silencer 2')
+
+    def test_deactivate_products(self):
+        self._run('deactivate_products', self.products[:2])
+        self.assertEqual(len(facet_index), 1)
+        self.assertEqual(facet_index.differences(), [])
+        self.assertEqual(self._labels('titanium'), ['Titanium Silencer 2'])
+        response = self.client.get(reverse('products:product_list'))
+        self.assertEqual([p.name for p in response.context['products']], ['Titanium Silencer 2']) #No short page
+
+    def test_activate_products(self):
+        Product.objects.filter(pk=self.products[0].pk).update(is_active=False)
+        facet_index.refresh([self.products[0].pk])
+        suggestion_index.refresh([self.products[0].pk])
+        self._run('activate_products', self.products[:1])
+        self.assertEqual(len(facet_index), 3)
+        self.assertEqual(facet_index.differences(), [])
+        self.assertIn('Titanium Silencer 0', self._labels('titanium'))
@@ -15,4 +15,5 @@ urlpatterns = [
     path('contact/', views.contact, name='contact'), #Contact page
     path('recently-viewed/', views.recently_viewed, name='recently_viewed'), #Recently viewed page
     path('ajax/subcategories/', views.get_subcategories, name='get_subcategories'), #Ajax subcategories page
+    path('ajax/autocomplete/', views.autocomplete, name='autocomplete'), #Ajax search suggestions
 ] 
\ No newline at end of file
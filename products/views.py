@@ -1,29 +1,68 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
-from django.db.models import Q, Avg, Case, When, F, DecimalField
+from django.db import transaction
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Product, Category, SubCategory, Brand, ProductRating
 from .forms import ProductRatingForm
+from .search import search_product_ids
+from .pagination import IndexPaginator, KeysetPaginator
+from .autocomplete import suggestion_index, max_results
+from .facets import facet_index, parse_selection
 from users.models import Wishlist
 from django.template.loader import render_to_string
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
+from revforge.query_budget import query_budget
 import json
+from decimal import Decimal, InvalidOperation
 
 
+SORT_FIELDS = {
+    'name': 'name', #Sorts by name
+    'price': 'effective_price', #Sorts by the stored current price
+    'Rating': 'rating_avg', #Sorts by the stored average rating
+    'top_rated': 'rating_score', #Sorts by the Bayesian rating score, few ratings count for less
+    'newest': 'created_at', #Sorts by creation date
+}
+
+
+def sort_products(products, sort_by, sort_order):
+    """Return the products and the keyset ordering keys of the requested sort"""
+    descending = sort_order == 'desc' #Checks if the order is descending
+    field = SORT_FIELDS.get(sort_by, 'name') #Defaults to name sorting
+    return products, [(field, descending), ('id', descending)] #The id breaks ties so every row has a unique position
+
+
+def parse_price(value):
+    """Return a price filter value as a Decimal, or None when it is missing or not a price"""
+    try:
+        price = Decimal(value)
+    except (TypeError, InvalidOperation):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
+def paginate_products(request, products, keys):
+    """Return the requested page of products, following a cursor when the link has one"""
+    paginator = KeysetPaginator(products, 12, keys) #Creates a paginator with 12 products per page
+    return paginator.get_page(request.GET.get('cursor'), request.GET.get('page')) #Gets the page object
+
+
+def pagination_query(request):
+    # The current query string without the page position, for the pagination links
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+@query_budget(8)
 def home(request):
     # get featured products
-    featured_products = Product.objects.filter(is_featured=True, is_active=True)[:6] #Gets the featured products
-    bestsellers = Product.objects.filter(is_bestseller=True, is_active=True)[:6] #Gets the bestsellers
+    featured_products = Product.objects.filter(is_featured=True, is_active=True).for_cards().with_wishlist_status(request.user)[:6] #Gets the featured products with their wishlist status
+    bestsellers = Product.objects.filter(is_bestseller=True, is_active=True).for_cards().with_wishlist_status(request.user)[:6] #Gets the bestsellers with their wishlist status
     categories = Category.objects.filter(is_active=True)[:9] #Gets the categories
-    
-    # Add wishlist status for featured products
-    for product in featured_products:
-        if request.user.is_authenticated:
-            product.is_in_wishlist = Wishlist.objects.filter(user=request.user, product=product).exists() #Checks if the product is in the wishlist
-        else:
-            product.is_in_wishlist = False #Sets the is_in_wishlist to False
 
     # Dynamically set icon_url for each category
     for category in categories:
@@ -42,98 +81,53 @@ def home(request):
     return render(request, 'products/home.html', context) #Renders the home page
 
 
+@query_budget(11)
 def product_list(request):
-    # get all products
-    products = Product.objects.filter(is_active=True) #Gets the products
-
-    category = request.GET.get('category') #Gets the category
-    subcategory = request.GET.get('subcategory') #Gets the subcategory
-    brand = request.GET.get('brand') #Gets the brand
+    # filter, sort and page in the in-memory catalog index; only the page's rows come from the database
+    selection = parse_selection(request.GET) #Gets the picked facet values, e.g. several brands
     sort_by = request.GET.get('sort_by', 'name') #Gets the sort by
     sort_order = request.GET.get('sort_order', 'asc') #Gets the sort order
-
-    # filter by category
-    if category:
-        products = products.filter(category__slug=category) #Filters the products by category
-    if subcategory:
-        products = products.filter(subcategory__slug=subcategory) #Filters the products by subcategory
-    if brand:
-        products = products.filter(brand__slug=brand) #Filters the products by brand
-
-    # sort products
-    if sort_by == 'price':
-        # Sort by current price (sale_price if available, otherwise price)
-        products = products.annotate(
-            sort_price=Case(
-                When(sale_price__isnull=False, then=F('sale_price')), #When the sale price is not null, then set the sort price to the sale price
-                default=F('price'), #Default to the price
-                output_field=DecimalField(), #Set the output field to DecimalField
-            )
-        )
-        order = 'sort_price' if sort_order == 'asc' else '-sort_price' #Sets the order to the sort price
-    elif sort_by == 'Rating':
-        # Sort by average rating
-        products = products.annotate(avg_rating=Avg('ratings__rating')) #Annotates the products by average rating
-        order = 'avg_rating' if sort_order == 'asc' else '-avg_rating' #Sets the order to the average rating
-    elif sort_by == 'newest':
-        order = 'created_at' if sort_order == 'asc' else '-created_at' #Sets the order to the created at
-    else:
-        # Default to name sorting
-        order = 'name' if sort_order == 'asc' else '-name' #Sets the order to the name
-    products = products.order_by(order) #Orders the products by the order
-
-    # get subcategories
-    subcategories = []
-    if category:
-        try:
-            selected_category = Category.objects.get(slug=category) #Gets the selected category
-            subcategories = selected_category.subcategories.filter(is_active=True) #Filters the subcategories by active
-        except Category.DoesNotExist:
-            subcategories = [] #Sets the subcategories to an empty list
-
-    paginator = Paginator(products, 12) #Creates a paginator with 12 products per page
-    page_number = request.GET.get('page') #Gets the page number
-    page_obj = paginator.get_page(page_number) #Gets the page object
-
-    # Add star_rating property for each product (0-5 stars)
-    for product in page_obj:
-        # Add wishlist status for authenticated users
-        if request.user.is_authenticated:
-            product.is_in_wishlist = Wishlist.objects.filter(user=request.user, product=product).exists() #Checks if the product is in the wishlist
-        else:
-            product.is_in_wishlist = False #Sets the is_in_wishlist to False
-
-    # Get categories and brands for filters
-    categories = Category.objects.filter(is_active=True) #Gets the categories
-    brands = Brand.objects.filter(is_active=True) #Gets the brands
+    min_price = parse_price(request.GET.get('min_price')) #Gets the lowest price
+    max_price = parse_price(request.GET.get('max_price')) #Gets the highest price
+
+    facet_index.ensure_fresh() #Builds the index on first use or when stale
+    price_mask = None
+    if min_price is not None or max_price is not None:
+        price_mask = facet_index.price_mask(min_price, max_price) #Filters by the current price, not the list price
+    facets = facet_index.facets(selection, price_mask) #Gets the options of each facet with their counts
+    matching = facet_index.matching(selection, price_mask) #Values of one facet are alternatives, facets combine
+
+    products = Product.objects.filter(is_active=True).for_cards().with_wishlist_status(request.user) #Reads the page's cards and wishlist status
+    products, keys = sort_products(products, sort_by, sort_order) #Gets the ordering keys of the sort
+    paginator = IndexPaginator(products, 12, keys, facet_index, matching) #Pages of 12 products from the index
+    page_obj = paginator.get_page(request.GET.get('cursor'), request.GET.get('page')) #Gets the page object
+    total = paginator.count #Gets the number of matching products
 
     # Create current_filters dict for template
     current_filters = {
-        'category': category, #Sets the category to the current filters
-        'subcategory': subcategory, #Sets the subcategory to the current filters
-        'brand': brand, #Sets the brand to the current filters
+        'facets': selection, #Sets the picked facet values to the current filters
+        'min_price': min_price, #Sets the lowest price to the current filters
+        'max_price': max_price, #Sets the highest price to the current filters
         'sort_by': sort_by, #Sets the sort by to the current filters
         'sort_order': sort_order, #Sets the sort order to the current filters
     }
 
     context = {
         'products': page_obj, #Sets the products to the context
-        'categories': categories, #Sets the categories to the context
-        'brands': brands, #Sets the brands to the context
-        'subcategories': subcategories, #Sets the subcategories to the context
-        'selected_category': category, #Sets the selected category to the context
-        'selected_subcategory': subcategory, #Sets the selected subcategory to the context
-        'selected_brand': brand, #Sets the selected brand to the context
+        'facets': facets, #Sets the facets to the context
+        'total': total, #Sets the number of matching products to the context
         'sort_by': sort_by, #Sets the sort by to the context
         'sort_order': sort_order, #Sets the sort order to the context
         'current_filters': current_filters, #Sets the current filters to the context
+        'pagination_query': pagination_query(request), #Sets the query string for the page links
     }
     return render(request, 'products/product_list.html', context) #Renders the product list page
 
 
+@query_budget(10)
 def product_detail(request, slug):
     # get product by slug
-    product = get_object_or_404(Product, slug=slug, is_active=True)
+    product = get_object_or_404(Product.objects.select_related('brand', 'category', 'vendor'), slug=slug, is_active=True)
     user_rating = None
     is_in_wishlist = False
     
@@ -148,7 +142,8 @@ def product_detail(request, slug):
                 rating_obj = form.save(commit=False) #Saves the rating object
                 rating_obj.product = product #Sets the product to the rating object
                 rating_obj.user = request.user #Sets the user to the rating object
-                rating_obj.save() #Saves the rating object
+                with transaction.atomic(): #Saves the rating and its product aggregates together
+                    rating_obj.save() #Saves the rating object
                 messages.success(request, 'Your rating has been submitted!') #Displays a success message
                 return redirect('products:product_detail', slug=slug) #Redirects to the product detail page
         else:
@@ -156,26 +151,25 @@ def product_detail(request, slug):
     else:
         form = None #Sets the form to None
     
-    # Content-based recommender: prioritize same category and brand, then category, then any
-    recommended_qs = Product.objects.filter(
-        is_active=True
-    ).exclude(id=product.id)
-    same_cat_brand = recommended_qs.filter(category=product.category, brand=product.brand) #Filters the recommended products by category and brand
-    recommended_products = list(same_cat_brand.annotate(annotated_avg_rating=Avg('ratings__rating')).order_by('-annotated_avg_rating')[:3]) #Annotates the recommended products by average rating and orders them by the average rating
-    if len(recommended_products) < 3: #Checks if the recommended products are less than 3
-        needed = 3 - len(recommended_products) #Sets the needed to the difference between 3 and the length of the recommended products
-        same_cat = recommended_qs.filter(category=product.category).exclude(id__in=[p.id for p in recommended_products]) #Filters the recommended products by category and excludes the products in the recommended products
-        recommended_products += list(same_cat.annotate(annotated_avg_rating=Avg('ratings__rating')).order_by('-annotated_avg_rating')[:needed]) #Annotates the recommended products by average rating and orders them by the average rating
-    if len(recommended_products) < 3: #Checks if the recommended products are less than 3
-        needed = 3 - len(recommended_products) #Sets the needed to the difference between 3 and the length of the recommended products
-        any_products = recommended_qs.exclude(id__in=[p.id for p in recommended_products]) #Filters the recommended products by excluding the products in the recommended products
-        recommended_products += list(any_products.annotate(annotated_avg_rating=Avg('ratings__rating')).order_by('-annotated_avg_rating')[:needed]) #Annotates the recommended products by average rating and orders them by the average rating
+    # Precomputed by the rebuild_recommendations command: one lookup on (product, rank)
+    recommended_products = list(
+        Product.objects.filter(recommended_for__product=product, is_active=True)
+        .for_cards()
+        .order_by('recommended_for__rank')[:3]
+    ) #Gets the best ranked recommendations
+    if not recommended_products: #Not computed yet, e.g. a product added since the last run
+        recommended_products = list(
+            Product.objects.filter(category=product.category, is_active=True)
+            .exclude(id=product.id)
+            .for_cards()
+            .order_by('-rating_score', '-id')[:3]
+        ) #Falls back to the best scored products of the category
     context = {
         'product': product, #Sets the product to the context
         'related_products': Product.objects.filter(
             category=product.category, #Filters the related products by category
             is_active=True #Filters the related products by active
-        ).exclude(id=product.id)[:4], #Filters the related products by excluding the product
+        ).exclude(id=product.id).for_cards()[:4], #Filters the related products by excluding the product
         'form': form,
         'user_rating': user_rating, #Sets the user rating to the context
         'is_in_wishlist': is_in_wishlist, #Sets the is in wishlist to the context
@@ -184,22 +178,23 @@ def product_detail(request, slug):
     return render(request, 'products/product_detail.html', context)
 
 
+@query_budget(8)
 def category_detail(request, slug): #Category detail view
     # get category by slug
     category = get_object_or_404(Category, slug=slug, is_active=True) #Gets the category by slug
-    products = Product.objects.filter(category=category, is_active=True) #Gets the products by category and active
-    
-    paginator = Paginator(products, 12) #Creates a paginator with 12 products per page
-    page_number = request.GET.get('page') #Gets the page number
-    page_obj = paginator.get_page(page_number) #Gets the page object
+    products = Product.objects.filter(category=category, is_active=True).for_cards().with_wishlist_status(request.user) #Gets the products by category and active
+    products, keys = sort_products(products, request.GET.get('sort_by', 'name'), request.GET.get('sort_order', 'asc')) #Sorts the products
+    page_obj = paginate_products(request, products, keys) #Gets the page object
     
     context = {
         'category': category, #Sets the category to the context
         'products': page_obj, #Sets the products to the context
+        'pagination_query': pagination_query(request), #Sets the query string for the page links
     }
     return render(request, 'products/category_detail.html', context)
 
 
+@query_budget(9)
 def subcategory_detail(request, category_slug, subcategory_slug): #Subcategory detail view
     # get subcategory by slug
     subcategory = get_object_or_404(
@@ -208,39 +203,39 @@ def subcategory_detail(request, category_slug, subcategory_slug): #Subcategory d
         category__slug=category_slug,
         is_active=True
     )
-    products = Product.objects.filter(subcategory=subcategory, is_active=True) #Gets the products by subcategory and active
-    
-    paginator = Paginator(products, 12) #Creates a paginator with 12 products per page
-    page_number = request.GET.get('page') #Gets the page number
-    page_obj = paginator.get_page(page_number) #Gets the page object
+    products = Product.objects.filter(subcategory=subcategory, is_active=True).for_cards().with_wishlist_status(request.user) #Gets the products by subcategory and active
+    products, keys = sort_products(products, request.GET.get('sort_by', 'name'), request.GET.get('sort_order', 'asc')) #Sorts the products
+    page_obj = paginate_products(request, products, keys) #Gets the page object
     
     context = {
         'subcategory': subcategory, #Sets the subcategory to the context
         'products': page_obj, #Sets the products to the context
+        'pagination_query': pagination_query(request), #Sets the query string for the page links
     }
     return render(request, 'products/subcategory_detail.html', context)
 
 
+@query_budget(8)
 def brand_detail(request, slug):
     # get brand by slug
     brand = get_object_or_404(Brand, slug=slug, is_active=True) #Gets the brand by slug
-    products = Product.objects.filter(brand=brand, is_active=True) #Gets the products by brand and active
-    
-    paginator = Paginator(products, 12) #Creates a paginator with 12 products per page
-    page_number = request.GET.get('page') #Gets the page number
-    page_obj = paginator.get_page(page_number) #Gets the page object
+    products = Product.objects.filter(brand=brand, is_active=True).for_cards().with_wishlist_status(request.user) #Gets the products by brand and active
+    products, keys = sort_products(products, request.GET.get('sort_by', 'name'), request.GET.get('sort_order', 'asc')) #Sorts the products
+    page_obj = paginate_products(request, products, keys) #Gets the page object
     
     context = {
         'brand': brand, #Sets the brand to the context
         'products': page_obj, #Sets the products to the context
+        'pagination_query': pagination_query(request), #Sets the query string for the page links
     }
     return render(request, 'products/brand_detail.html', context)
 
 
+@query_budget(8)
 def search(request): #Search view
     # get search query
     query = request.GET.get('q', '').strip() #Gets the search query
-    products = Product.objects.filter(is_active=True) #Gets the products by active
+    products = Product.objects.filter(is_active=True).for_cards().with_wishlist_status(request.user) #Gets the products by active
 
     # Keywords that should redirect to contact page
     contact_keywords = [
@@ -249,20 +244,17 @@ def search(request): #Search view
     if query.lower() in contact_keywords: #Checks if the search query is in the contact keywords
         return redirect('products:contact') #Redirects to the contact page
 
-    if query:
-        # filter by search
-        products = products.filter(
-            Q(name__icontains=query) | #Filters the products by name
-            Q(description__icontains=query) | #Filters the products by description
-            Q(brand__name__icontains=query) | #Filters the products by brand
-            Q(category__name__icontains=query) | #Filters the products by category
-            Q(subcategory__name__icontains=query) |
-            Q(keywords__icontains=query)
-        ).distinct()
-
-    paginator = Paginator(products, 12) #Creates a paginator with 12 products per page
     page_number = request.GET.get('page') #Gets the page number
-    page_obj = paginator.get_page(page_number) #Gets the page object
+    if query:
+        # rank matches with the full-text index, then load only the current page
+        product_ids = search_product_ids(query) #Gets the matching product ids, best match first
+        paginator = Paginator(product_ids, 12) #Creates a paginator with 12 products per page
+        page_obj = paginator.get_page(page_number) #Gets the page object
+        page_products = products.filter(id__in=page_obj.object_list).in_bulk() #Loads the products on this page
+        page_obj.object_list = [page_products[pk] for pk in page_obj.object_list if pk in page_products] #Keeps the ranked order
+    else:
+        products, keys = sort_products(products, request.GET.get('sort_by', 'name'), request.GET.get('sort_order', 'asc')) #Sorts the products
+        page_obj = paginate_products(request, products, keys) #Gets the page object
 
     # For advanced search bar (dropdowns, etc.)
     categories = Category.objects.filter(is_active=True) #Gets the categories by active
@@ -275,6 +267,7 @@ def search(request): #Search view
         'categories': categories, #Sets the categories to the context
         'brands': brands, #Sets the brands to the context
         'subcategories': subcategories, #Sets the subcategories to the context
+        'pagination_query': pagination_query(request), #Sets the query string for the page links
     }
     return render(request, 'products/search_results.html', context)
 
@@ -315,13 +308,14 @@ def contact(request): #Contact view
     return render(request, 'products/contact.html')
 
 
+@query_budget(5)
 @csrf_exempt
 def recently_viewed(request): #Recently viewed view
     if request.method == "POST":
         # get recently viewed ids
         data = json.loads(request.body) #Loads the data
         ids = data.get('viewed', [])[:3] #Gets the viewed ids
-        products_qs = Product.objects.filter(id__in=ids) #Gets the products by ids
+        products_qs = Product.objects.filter(id__in=ids).for_cards().with_wishlist_status(request.user) #Gets the products by ids
         products_dict = {str(p.id): p for p in products_qs} #Gets the products by ids
         products = [products_dict[str(i)] for i in ids if str(i) in products_dict] #Gets the products by ids
         products_html = render_to_string('products/_recently_viewed.html', {'products': products}) #Renders the recently viewed products
@@ -349,3 +343,15 @@ def get_subcategories(request): #Get subcategories view
         data = {'subcategories': []} #Sets the subcategories to an empty list
     
     return JsonResponse(data) #Returns the data
+
+
+def autocomplete(request): #Search-as-you-type suggestions
+    # answered from the in-process prefix index, no database access once it is built
+    suggestion_index.ensure_fresh() #Builds the index on first use or when stale
+    query = request.GET.get('q', '').strip() #Gets the typed prefix
+    try:
+        limit = int(request.GET.get('limit', 8)) #Gets the number of suggestions
+    except ValueError:
+        limit = 8 #Falls back to the default
+    limit = max(1, min(limit, max_results())) #Clamps the number of suggestions
+    return JsonResponse({'query': query, 'suggestions': suggestion_index.suggest(query, limit)}) #Returns the suggestions
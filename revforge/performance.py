@@ -0,0 +1,264 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware measures a sample of requests (PERFORMANCE_SAMPLE_RATE,
+0 switches it off) and records for each: SQL query count and time (through
+connection.execute_wrapper), template rendering time, cache hits and misses,
+and the total time spent below the middleware. A measured request gets:
+
+- a Server-Timing header when PERFORMANCE_SERVER_TIMING is on (it tells
+  visitors how the time was spent), which browser dev tools show next to
+  the request;
+- one JSON log line on the 'revforge.performance' logger, at INFO, or at
+  WARNING when it took longer than PERFORMANCE_SLOW_MS;
+- a place in the latency histogram of its URL name, shown to staff on the
+  admin page at /admin/performance/.
+
+Histograms are kept in the memory of each worker process, so the page
+shows the worker that served it. Templates and caches have no
+instrumentation hooks, so Template.render and the get/get_many methods of
+each cache are wrapped; they only do extra work while a request is being
+measured.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.shortcuts import redirect, render
+from django.template import base as template_base
+from django.utils import timezone
+
+logger = logging.getLogger('revforge.performance')
+
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500) #Upper bounds in ms of the histogram buckets; one more bucket for anything slower
+
+_current = contextvars.ContextVar('performance_measurement', default=None) #Measurement of the request being served, if sampled
+_MISSING = object()
+
+
+class Measurement:
+    """What one request spent its time on"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total = 0.0
+        self.render_depth = 0 #Nesting of Template.render calls; included templates are part of the outermost one
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'template;dur={self.template * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+# Template and cache hooks
+
+_original_render = template_base.Template.render
+
+
+def _timed_render(template, context):
+    measurement = _current.get()
+    if measurement is None:
+        return _original_render(template, context)
+    measurement.render_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(template, context)
+    finally:
+        measurement.render_depth -= 1
+        if not measurement.render_depth:
+            measurement.template += time.perf_counter() - started
+
+
+def _count_cache_calls(cache):
+    """Wrap get() and get_many() of one cache instance to count hits and misses"""
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        measurement = _current.get()
+        if measurement is not None:
+            if value is _MISSING:
+                measurement.cache_misses += 1
+            else:
+                measurement.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        measurement = _current.get()
+        if measurement is not None:
+            measurement.cache_hits += len(found)
+            measurement.cache_misses += len(keys) - len(found)
+        return found
+
+    cache.get, cache.get_many = counted_get, counted_get_many
+    cache._performance_counted = True
+
+
+def _instrument_caches():
+    for alias in settings.CACHES:
+        cache = caches[alias] #One instance per thread, so this is checked per request
+        if not getattr(cache, '_performance_counted', False):
+            _count_cache_calls(cache)
+
+
+# Per URL name histograms
+
+class Histograms:
+    """Latency histograms and totals per URL name, for this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.since = timezone.now()
+
+    def add(self, view_name, measurement):
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = {'count': 0, 'buckets': [0] * (len(BUCKETS) + 1), 'total_ms': 0.0, 'db_ms': 0.0, 'template_ms': 0.0, 'queries': 0, 'max_queries': 0}
+            stats['count'] += 1
+            stats['buckets'][bisect.bisect_left(BUCKETS, measurement.total * 1000)] += 1
+            stats['total_ms'] += measurement.total * 1000
+            stats['db_ms'] += measurement.db * 1000
+            stats['template_ms'] += measurement.template * 1000
+            stats['queries'] += measurement.queries
+            stats['max_queries'] = max(stats['max_queries'], measurement.queries)
+
+    def rows(self):
+        """One summary per URL name, the one taking the most time in total first"""
+        with self.lock:
+            views = {name: {**stats, 'buckets': list(stats['buckets'])} for name, stats in self.views.items()}
+        rows = []
+        for name, stats in views.items():
+            count = stats['count']
+            rows.append({
+                'view': name,
+                'count': count,
+                'buckets': stats['buckets'],
+                'p50': _bucket_percentile(stats['buckets'], 0.5),
+                'p95': _bucket_percentile(stats['buckets'], 0.95),
+                'avg_ms': stats['total_ms'] / count,
+                'db_ms': stats['db_ms'] / count,
+                'template_ms': stats['template_ms'] / count,
+                'queries': stats['queries'] / count,
+                'max_queries': stats['max_queries'],
+                'total_ms': stats['total_ms'],
+            })
+        rows.sort(key=lambda row: -row['total_ms']) #Where the time goes
+        return rows
+
+
+def _bucket_percentile(buckets, fraction):
+    """Upper bound of the bucket holding the given percentile (None when it is the open-ended last bucket)"""
+    wanted = sum(buckets) * fraction
+    seen = 0
+    for bound, count in zip(BUCKETS + (None,), buckets):
+        seen += count
+        if seen >= wanted:
+            return bound
+    return None
+
+
+histograms = Histograms()
+
+
+class PerformanceMiddleware:
+    """Measure a sample of requests; report through Server-Timing, the log and the per-view histograms"""
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PERFORMANCE_SAMPLE_RATE', 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed #Costs nothing when switched off
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERFORMANCE_SERVER_TIMING', settings.DEBUG)
+        self.slow_ms = getattr(settings, 'PERFORMANCE_SLOW_MS', 1000)
+        template_base.Template.render = _timed_render
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        _instrument_caches()
+        measurement = Measurement()
+        token = _current.set(measurement)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(measurement):
+                response = self.get_response(request)
+        finally:
+            measurement.total = time.perf_counter() - started
+            _current.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '<unresolved>'
+        histograms.add(view_name, measurement)
+        if self.server_timing:
+            response['Server-Timing'] = measurement.server_timing()
+        self.log(request, response, view_name, measurement)
+        return response
+
+    def log(self, request, response, view_name, measurement):
+        total_ms = measurement.total * 1000
+        level = logging.WARNING if total_ms > self.slow_ms else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(measurement.db * 1000, 2),
+            'queries': measurement.queries,
+            'template_ms': round(measurement.template * 1000, 2),
+            'cache_hits': measurement.cache_hits,
+            'cache_misses': measurement.cache_misses,
+            'sample_rate': self.sample_rate,
+        }
+        logger.log(level, json.dumps(record), extra={'performance': record})
+
+
+@staff_member_required
+def stats_view(request):
+    """Admin page with the latency histogram of every URL name this worker has measured"""
+    if request.method == 'POST':
+        histograms.reset()
+        return redirect('performance_stats')
+    return render(request, 'admin/performance_stats.html', {
+        'title': 'Request performance',
+        'rows': histograms.rows(),
+        'buckets': [f'≤{bound}' for bound in BUCKETS] + [f'>{BUCKETS[-1]}'],
+        'since': histograms.since,
+        'pid': os.getpid(),
+        'sample_rate': getattr(settings, 'PERFORMANCE_SAMPLE_RATE', 0),
+    })
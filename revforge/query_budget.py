@@ -0,0 +1,64 @@
+"""
+Per-view SQL query budgets, enforced in debug mode and in tests.
+
+Views declare the most queries a request may run with @query_budget(n).
+QueryBudgetMiddleware counts every query the request runs (sessions, auth,
+the view and its template) and raises QueryBudgetExceeded when a view goes
+over, so an N+1 regression fails the test that renders the page instead
+of slipping into production. The check is switched on with the
+QUERY_BUDGET_CHECKS setting, which defaults to DEBUG.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than it declared"""
+
+
+def query_budget(limit):
+    """Declare the most SQL queries a request to this view may run"""
+    def decorator(view_func):
+        view_func.query_budget = limit #Read back by QueryBudgetMiddleware; functools.wraps copies it to outer decorators
+        return view_func
+    return decorator
+
+
+class QueryCounter:
+    """connection.execute_wrapper hook that counts and remembers queries"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+
+class QueryBudgetMiddleware:
+    """Fail requests to views that run more queries than their @query_budget"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_CHECKS', settings.DEBUG):
+            raise MiddlewareNotUsed #Costs nothing when switched off
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter): #Counts everything the request runs
+            response = self.get_response(request)
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and len(counter) > budget:
+            listing = '\n'.join(f'  {i}. {sql}' for i, sql in enumerate(counter.queries, 1))
+            raise QueryBudgetExceeded(
+                f'{request.resolver_match.view_name} ran {len(counter)} queries, budget is {budget}:\n{listing}'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = getattr(view_func, 'query_budget', None) #Remembers the budget of the matched view
+        return None
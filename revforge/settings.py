@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'revforge.performance.PerformanceMiddleware',  # Samples request timings: Server-Timing header, log line, /admin/performance/
+    'revforge.query_budget.QueryBudgetMiddleware',  # Fails views that exceed their @query_budget (debug and tests only)
     # Temporarily disabled for debugging - will re-enable with better patterns
     # 'revforge.security_middleware.SecurityMiddleware',
     # 'revforge.security_middleware.InputSanitizationMiddleware',
@@ -56,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'orders.guest_cart.GuestCartMiddleware',  # request.guest_cart: logged-out carts in a signed cookie
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'orders.context_processors.cart',
             ],
         },
     },
@@ -171,3 +175,77 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
 # Input Validation Settings
 MAX_FIELD_LENGTH = 10000  # Maximum length for any input field
+
+# Search autocomplete
+AUTOCOMPLETE_MAX_AGE = 300  # Rebuild each worker's suggestion index after 5 minutes (0 = only on startup and signals)
+AUTOCOMPLETE_MAX_RESULTS = 20  # Maximum suggestions per request
+
+# Faceted navigation
+FACET_INDEX_MAX_AGE = 300  # Rebuild each worker's facet index after 5 minutes (0 = only on startup and signals)
+
+# Rating score (Bayesian average used by the "Top rated" sort and the recommendations)
+RATING_SCORE_PRIOR_WEIGHT = 10  # Ratings' worth of the catalog mean each product's score starts from
+
+# Listing pagination
+PAGINATION_COUNT_TIMEOUT = 60  # Seconds a listing's total product count is cached (0 = count on every request)
+
+# Query budgets
+QUERY_BUDGET_CHECKS = DEBUG  # Enforce @query_budget on views; stays on under the test runner, which forces DEBUG off later
+
+# Request performance instrumentation (revforge/performance.py)
+PERFORMANCE_SAMPLE_RATE = float(os.environ.get('PERFORMANCE_SAMPLE_RATE', 1.0 if DEBUG else 0.05))  # Fraction of requests measured (0 = off)
+PERFORMANCE_SERVER_TIMING = DEBUG  # Send the Server-Timing header on measured requests
+PERFORMANCE_SLOW_MS = 1000  # Measured requests slower than this are logged as warnings
+
+# Slow-query log (revforge/slow_queries.py); summarize with: python manage.py slow_query_report
+SLOW_QUERY_LOG_MS = float(os.environ.get('SLOW_QUERY_LOG_MS', 0)) or None  # Log statements slower than this many ms (unset = off)
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', str(BASE_DIR / 'logs' / 'slow_queries.jsonl'))
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log at 10MB
+SLOW_QUERY_LOG_BACKUPS = 5  # Rotated files kept
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'revforge.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),  # INFO logs every measured request
+            'propagate': False,
+        },
+    },
+}
+
+# Caches
+# Rendered product cards live in their own cache. Local memory suits tests and a single process; with several
+# workers point it at a shared backend so invalidation reaches all of them, e.g.
+#   CARD_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CARD_CACHE_LOCATION=/var/tmp/revforge-cards
+#   CARD_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CARD_CACHE_LOCATION=redis://127.0.0.1:6379
+# Navbar cart summaries likewise (CART_SUMMARY_CACHE_BACKEND, CART_SUMMARY_CACHE_LOCATION); with several workers it
+# must be shared, or a cart change only reaches the badge of the worker that handled it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'cards': {
+        'BACKEND': os.environ.get('CARD_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CARD_CACHE_LOCATION', 'product-cards'),
+    },
+    'cart-summaries': {
+        'BACKEND': os.environ.get('CART_SUMMARY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CART_SUMMARY_CACHE_LOCATION', 'cart-summaries'),
+    },
+}
+if not CACHES['cards']['BACKEND'].endswith('RedisCache'):
+    CACHES['cards']['OPTIONS'] = {'MAX_ENTRIES': 20000}  # Room for every card and its version stamps (Redis evicts by itself)
+CARD_CACHE_ALIAS = 'cards'  # Cache holding rendered product cards
+CARD_CACHE_TIMEOUT = 86400  # Seconds a rendered card is kept (changes retire it earlier)
+CART_SUMMARY_CACHE_ALIAS = 'cart-summaries'  # Cache holding navbar cart summaries
+CART_SUMMARY_TIMEOUT = 300  # Seconds a cached navbar cart summary is kept (cart changes drop it earlier)
+
+# Guest carts (logged-out visitors, merged into their cart on login)
+GUEST_CART_COOKIE = 'guest_cart'  # Signed cookie holding the cart
+GUEST_CART_MAX_AGE = 30 * 24 * 60 * 60  # Seconds the cookie is kept (30 days)
+GUEST_CART_MAX_LINES = 50  # Products a guest cart may hold, keeps the cookie well under 4KB
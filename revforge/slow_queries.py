@@ -0,0 +1,168 @@
+"""
+Opt-in slow-query log.
+
+With SLOW_QUERY_LOG_MS set, every database connection gets an execute
+wrapper that times each statement. Statements slower than the threshold are
+written as one JSON line to SLOW_QUERY_LOG_FILE (rotated at
+SLOW_QUERY_LOG_MAX_BYTES, keeping SLOW_QUERY_LOG_BACKUPS old files) with:
+
+- a fingerprint of the SQL with literals and IN lists folded, so repeats of
+  the same query group together whatever their parameters;
+- the project function that ran it and the view it was called from
+  (innermost project frame, and the outermost one in a views module);
+- on SQLite, the EXPLAIN QUERY PLAN of the statement.
+
+Parameters are not logged. The slow_query_report command summarizes the
+log by fingerprint.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import time
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('revforge.slow_queries')
+
+MAX_SQL_LENGTH = 4000 #Longer statements are cut in the log
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bVALUES\s*\(.*?\)(?:\s*,\s*\(.*?\))*', re.IGNORECASE | re.DOTALL)
+_SPACE = re.compile(r'\s+')
+
+_PROJECT_ROOT = os.path.join(str(settings.BASE_DIR), '')
+_LIBRARY_PATHS = tuple(path for path in sys.path if 'site-packages' in path or 'dist-packages' in path)
+
+
+def normalize(sql):
+    """The SQL with literals, placeholders and IN/VALUES lists folded to ?, and whitespace collapsed"""
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_LIST.sub('VALUES (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+def callers():
+    """(caller, view) for the running statement: the innermost project frame, and the outermost one in a views module"""
+    caller = view = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_ROOT) and not filename.startswith(_LIBRARY_PATHS) and filename != __file__:
+            relative = os.path.relpath(filename, _PROJECT_ROOT)
+            where = f'{relative}:{frame.f_lineno} in {frame.f_code.co_name}'
+            if caller is None:
+                caller = where
+            if os.path.basename(filename) == 'views.py':
+                view = f"{relative[:-3].replace(os.sep, '.')}.{frame.f_code.co_name}" #Keeps going, the outermost wins
+        frame = frame.f_back
+    return caller, view
+
+
+def explain(connection, sql, params):
+    """SQLite's EXPLAIN QUERY PLAN of a SELECT, as a list of plan lines; None elsewhere"""
+    if connection.vendor != 'sqlite' or sql.split(None, 1)[0].upper() not in ('SELECT', 'WITH'):
+        return None
+    from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+    cursor = connection.connection.cursor(factory=SQLiteCursorWrapper) #Straight to SQLite, past the execute wrappers
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as error: #The plan is a bonus; never fail the query over it
+        return [f'EXPLAIN failed: {error}']
+    finally:
+        cursor.close()
+
+
+class SlowQueryLogger:
+    """Execute wrapper that logs the statements slower than the threshold"""
+
+    def __init__(self, connection, threshold_ms):
+        self.connection = connection
+        self.threshold = threshold_ms / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold:
+                self.log(sql, params, many, elapsed)
+
+    def log(self, sql, params, many, elapsed):
+        normalized = normalize(sql)
+        caller, view = callers()
+        record = {
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'ms': round(elapsed * 1000, 2),
+            'fingerprint': fingerprint(normalized),
+            'sql': normalized[:MAX_SQL_LENGTH],
+            'many': many,
+            'caller': caller,
+            'view': view,
+            'database': self.connection.alias,
+            'plan': None if many else explain(self.connection, sql, params),
+        }
+        logger.warning(json.dumps(record))
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if not any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers):
+        # First in the list: connection.execute_wrapper() blocks pop the last one, and a connection can open inside them
+        connection.execute_wrappers.insert(0, SlowQueryLogger(connection, settings.SLOW_QUERY_LOG_MS))
+
+
+def install():
+    """Log slow queries on every connection when SLOW_QUERY_LOG_MS is set; called from ProductsConfig.ready()"""
+    if not getattr(settings, 'SLOW_QUERY_LOG_MS', None):
+        return False
+    if not any(isinstance(handler, logging.handlers.RotatingFileHandler) for handler in logger.handlers):
+        path = settings.SLOW_QUERY_LOG_FILE
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=getattr(settings, 'SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5),
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s')) #The message is the JSON record
+        logger.addHandler(handler)
+        logger.propagate = False
+    connection_created.connect(_add_wrapper, dispatch_uid='revforge.slow_queries')
+    from django.db import connections
+    for connection in connections.all(initialized_only=True): #Connections opened before the signal was connected
+        _add_wrapper(None, connection)
+    return True
+
+
+def read_records(path):
+    """Records of the log and its rotated files (path.1 is the newest of those), oldest first; unreadable lines are skipped"""
+    directory, name = os.path.split(os.path.abspath(path))
+    numbers = sorted(
+        (int(other.rsplit('.', 1)[1]) for other in os.listdir(directory) if re.fullmatch(re.escape(name) + r'\.\d+', other)),
+        reverse=True,
+    ) if os.path.isdir(directory) else []
+    for filename in [f'{path}.{number}' for number in numbers] + [path]:
+        if not os.path.exists(filename):
+            continue
+        with open(filename, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
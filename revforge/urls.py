@@ -18,13 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from revforge.performance import stats_view
 
 urlpatterns = [
+    path('admin/performance/', stats_view, name='performance_stats'), #Request timings per URL name, staff only
     path('admin/', admin.site.urls), #Admin site
     path('', include('products.urls')), #Products site
     path('users/', include('users.urls')), #Users site
     path('orders/', include('orders.urls')), #Orders site
-    # path('reviews/', include('reviews.urls')),  # not in use
 ]
 
 if settings.DEBUG:
@@ -33,7 +33,7 @@ def validate_safe_text(value, field_name="Text"):
         r'\b(click here|buy now|free|discount|sale|offer|limited time)\b',
         r'\b(www\.|http://|https://)\b',
         # Only flag if entire field is all caps (not just individual words)
-        r'^[A-Z\s]{10,}$',  # Entire field in caps with 10+ chars
+        r'(?-i:^[A-Z\s]{10,}$)',  # Entire field in caps with 10+ chars (case-sensitive, unlike the other patterns)
     ]
     
     for pattern in spam_patterns:
@@ -72,7 +72,7 @@ def validate_product_name(value):
         r'\b(click here|buy now|free|discount|sale|offer|limited time)\b',
         r'\b(www\.|http://|https://)\b',
         # Only flag if entire field is all caps (not just individual words)
-        r'^[A-Z\s]{10,}$',  # Entire field in caps with 10+ chars
+        r'(?-i:^[A-Z\s]{10,}$)',  # Entire field in caps with 10+ chars (case-sensitive, unlike the other patterns)
     ]
     
     for pattern in spam_patterns:
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'revforge.settings')
 
 application = get_wsgi_application()
+
+# Build the in-process search suggestion and facet indexes before the first request
+from products.autocomplete import warm_up  # noqa: E402
+from products.facets import warm_up as warm_up_facets  # noqa: E402
+warm_up()
+warm_up_facets()
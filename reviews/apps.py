@@ -1,6 +0,0 @@
-from django.apps import AppConfig
-
-
-class ReviewsConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField' #Set the default auto field
-    name = 'reviews' #Set the name
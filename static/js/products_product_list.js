@@ -1,19 +1,3 @@
-function updateSubcategories() {
-    const category = document.getElementById('category-select').value; //Get the category
-    fetch(`/ajax/subcategories/?category=${encodeURIComponent(category)}`) //Fetch the subcategories
-        .then(response => response.json()) //Parse the response as JSON
-        .then(data => {
-            const subcatSelect = document.getElementById('subcategory-select'); //Get the subcategory select
-            subcatSelect.innerHTML = '<option value="">All</option>'; //Set the subcategory select to an empty option
-            data.subcategories.forEach(subcat => { //For each subcategory
-                const option = document.createElement('option'); //Create an option
-                option.value = subcat.slug; //Set the option value to the subcategory slug
-                option.textContent = subcat.name; //Set the option text to the subcategory name
-                subcatSelect.appendChild(option); //Append the option to the subcategory select
-            });
-        });
-}
-
 function handleProductCardClick(event, element) {
     // Check if the clicked element or its parent is a button or form
     let target = event.target; //Get the target
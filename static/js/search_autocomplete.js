@@ -0,0 +1,84 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const input = document.getElementById('navbar-search'); //Get the navbar search input
+    const menu = document.getElementById('search-suggestions'); //Get the suggestions menu
+    if (!input || !menu) { //If the page has no navbar search
+        return;
+    }
+    const url = input.dataset.autocompleteUrl; //Get the autocomplete url
+    let timer = null; //Debounce timer
+    let active = -1; //Index of the highlighted suggestion
+
+    function hide() {
+        menu.classList.remove('show'); //Hide the menu
+        menu.innerHTML = ''; //Clear the suggestions
+        active = -1;
+    }
+
+    function render(suggestions) {
+        menu.innerHTML = ''; //Clear the old suggestions
+        suggestions.forEach(suggestion => { //For each suggestion
+            const link = document.createElement('a'); //Create a link
+            link.className = 'dropdown-item d-flex justify-content-between';
+            link.href = suggestion.url; //Link to the suggestion page
+            const label = document.createElement('span');
+            label.textContent = suggestion.label; //Set the label as text so names cannot inject HTML
+            const type = document.createElement('span');
+            type.className = 'suggestion-type ms-2';
+            type.textContent = suggestion.type; //Show what kind of suggestion it is
+            link.appendChild(label);
+            link.appendChild(type);
+            menu.appendChild(link);
+        });
+        menu.classList.toggle('show', suggestions.length > 0); //Show the menu when there are suggestions
+        active = -1;
+    }
+
+    function highlight(items) {
+        items.forEach((item, index) => item.classList.toggle('active', index === active)); //Highlight the active suggestion
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = input.value.trim(); //Get the typed text
+        if (query.length < 2) { //Wait for at least two characters
+            hide();
+            return;
+        }
+        timer = setTimeout(() => {
+            fetch(`${url}?q=${encodeURIComponent(query)}`) //Fetch the suggestions
+                .then(response => response.json()) //Parse the response as JSON
+                .then(data => {
+                    if (input.value.trim() === data.query) { //Ignore answers for older input
+                        render(data.suggestions);
+                    }
+                });
+        }, 150);
+    });
+
+    input.addEventListener('keydown', function(e) {
+        const items = Array.from(menu.querySelectorAll('.dropdown-item')); //Get the suggestions
+        if (!items.length) {
+            return;
+        }
+        if (e.key === 'ArrowDown') { //Move down the list
+            e.preventDefault();
+            active = (active + 1) % items.length;
+            highlight(items);
+        } else if (e.key === 'ArrowUp') { //Move up the list
+            e.preventDefault();
+            active = (active - 1 + items.length) % items.length;
+            highlight(items);
+        } else if (e.key === 'Enter' && active >= 0) { //Open the highlighted suggestion
+            e.preventDefault();
+            window.location.href = items[active].href;
+        } else if (e.key === 'Escape') {
+            hide();
+        }
+    });
+
+    document.addEventListener('click', function(e) {
+        if (!menu.contains(e.target) && e.target !== input) { //Close when clicking elsewhere
+            hide();
+        }
+    });
+});
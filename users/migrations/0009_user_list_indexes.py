@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_product_listing_indexes'),
+        ('users', '0008_add_contact_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recentlyviewed',
+            index=models.Index(fields=['user', 'viewed_at'], name='viewed_user_viewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', 'added_at'], name='wishlist_user_added_idx'),
+        ),
+    ]
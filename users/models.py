@@ -196,6 +196,9 @@ class Wishlist(models.Model):
     class Meta:
         unique_together = ['user', 'product']
         ordering = ['-added_at']
+        indexes = [
+            models.Index(fields=['user', 'added_at'], name='wishlist_user_added_idx'), #A user's wishlist, newest first
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
@@ -211,6 +214,9 @@ class RecentlyViewed(models.Model):
     class Meta:
         unique_together = ['user', 'product'] # Unique together
         ordering = ['-viewed_at'] # Ordering
+        indexes = [
+            models.Index(fields=['user', 'viewed_at'], name='viewed_user_viewed_idx'), # A user's recently viewed products, newest first
+        ]
 
     def __str__(self):
         return f"{self.user.username} viewed {self.product.name}"
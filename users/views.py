@@ -4,12 +4,14 @@ from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.utils import timezone
+from django.db.models import Prefetch
 from .forms import UserRegistrationForm
 from .models import UserProfile, Wishlist, RecentlyViewed
 from products.models import Product
 from products.forms import VendorProductForm
 from django.http import JsonResponse
 from products.models import Category, Brand
+from revforge.query_budget import query_budget
 
 
 def register(request):
@@ -107,10 +109,13 @@ def change_password(request):
     return redirect('users:profile')
 
 
+@query_budget(8)
 @login_required
 def wishlist(request):
     # get wishlist items
-    wishlist_items = request.user.wishlist_items.all()
+    wishlist_items = request.user.wishlist_items.prefetch_related(
+        Prefetch('product', queryset=Product.objects.for_cards()) #Loads every card in one query
+    )
     # Mark all products as in wishlist for the template
     for item in wishlist_items:
         item.product.is_in_wishlist = True
@@ -211,8 +216,7 @@ def vendor_product_create(request):
                 if not product.subcategory:
                     product.subcategory = product.category.subcategories.first()
                 
-                product.sku = f"VENDOR-{request.user.id}-{timezone.now().strftime('%Y%m%d%H%M%S')}"
-                product.save()
+                product.save() #Allocates the next VENDOR-BRA-CAT-NNNN SKU
                 
                 messages.success(request, f'Product "{product.name}" created successfully!')
                 return redirect('users:vendor_dashboard')